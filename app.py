@@ -1,17 +1,21 @@
 import streamlit as st
 import os
-from process_management import process_manager
-from memory_management import memory_manager
+import process_management
+import memory_management
 from file_management import FileManager  # Only import the class
 from user_management import UserManager
 import logger
+from event_log import event_log, format_event
 
+@st.cache_resource
 def initialize_components():
+    # Built once per server, not on every rerun, so the file cache and
+    # encryption key survive between interactions
     # Initialize logger first
-    system_logger = logger.Logger()
+    system_logger = logger.system_logger
     
     # Initialize FileManager with absolute path and debug info
-    file_manager = FileManager(logger=system_logger)
+    file_manager = FileManager(logger=system_logger, cache_bytes=64 * 1024 * 1024)
     print(f"DEBUG: File storage location - {file_manager.base_dir}")  # Terminal confirmation
     
     # Initialize other components
@@ -29,14 +33,19 @@ def show_login():
         submitted = st.form_submit_button("Login")
         
         if submitted:
-            if user_manager.login(username, password):
+            token = user_manager.start_session(username, password)
+            if token:
                 st.session_state.logged_in = True
+                st.session_state.token = token
                 st.session_state.username = username
                 st.rerun()
             else:
                 st.error("Invalid credentials")
 
 def show_dashboard():
+    # Shared managers, built on the first dashboard render after login
+    process_manager = process_management.get_process_manager()
+    memory_manager = memory_management.get_memory_manager()
     st.title(f"Virtual OS Dashboard - Welcome {st.session_state.username}")
     
     tabs = st.tabs(["Process Management", "Memory Management", "File Management", "System"])
@@ -52,14 +61,20 @@ def show_dashboard():
             proc_priority = st.selectbox("Priority", [0, 1, 2], 
                                       format_func=lambda x: ["Low", "Normal", "High"][x],
                                       key="proc_priority")
+            parent_pid = st.number_input("Parent PID (0 = none)", min_value=0, step=1, key="proc_parent")
             if st.button("Create Process"):
-                pid = process_manager.create_process(proc_name, proc_priority)
-                st.success(f"Process created with PID: {pid}")
+                pid = process_manager.create_process(proc_name, proc_priority, parent_pid or None)
+                if pid is not None:
+                    st.success(f"Process created with PID: {pid}")
+                else:
+                    st.error(f"Parent process {parent_pid} not found")
                 
         with col2:
             st.subheader("Process Actions")
             pid = st.number_input("PID", min_value=1, step=1, key="proc_pid")
-            action = st.selectbox("Action", ["Terminate", "Block", "Unblock"], key="proc_action")
+            action = st.selectbox("Action", ["Terminate", "Block", "Unblock",
+                                             "Kill Subtree", "Block Group", "Unblock Group"],
+                                  key="proc_action")
             if st.button("Execute Action"):
                 if action == "Terminate":
                     process_manager.terminate_process(pid)
@@ -70,29 +85,58 @@ def show_dashboard():
                 elif action == "Unblock":
                     process_manager.unblock_process(pid)
                     st.success(f"Process {pid} unblocked")
+                elif action == "Kill Subtree":
+                    st.success(f"Terminated {process_manager.kill_subtree(pid)} processes")
+                elif action == "Block Group":
+                    st.success(f"Blocked {process_manager.block_group(pid)} processes")
+                elif action == "Unblock Group":
+                    st.success(f"Unblocked {process_manager.unblock_group(pid)} processes")
     
     # Memory Management Tab (unchanged)
     with tabs[1]:
         st.header("Memory Management")
         size = st.number_input("Memory Size (MB)", min_value=1, max_value=1024, value=128)
+        owner = st.number_input("Owner PID (0 = none)", min_value=0, step=1, key="mem_owner")
         
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Allocate Memory"):
-                if memory_manager.allocate_memory(size):
-                    st.success(f"Allocated {size}MB")
+                handle = memory_manager.allocate_memory(size, owner or None)
+                if handle:
+                    st.success(f"Allocated {size}MB (handle {handle})")
                 else:
                     st.error("Allocation failed")
         
         with col2:
             if st.button("Free Memory"):
-                if memory_manager.free_memory(size):
+                if memory_manager.free_memory(size, owner or None):
                     st.success(f"Freed {size}MB")
                 else:
                     st.error("Free failed")
+
+        handle = st.number_input("Allocation Handle", min_value=1, step=1, key="mem_handle")
+        if st.button("Free Allocation"):
+            if memory_manager.free_allocation(handle):
+                st.success(f"Freed allocation {handle}")
+            else:
+                st.error(f"Allocation {handle} not found")
         
         if st.button("Defragment Memory"):
             memory_manager.defragment()
+            st.write(memory_manager.fragmentation_report())
+
+        budget = st.number_input("Compaction budget (pages, 0 = full pass)", min_value=0, value=0, key="mem_budget")
+        if st.button("Compact Memory"):
+            report = memory_manager.compact(budget or None)
+            st.success(f"Moved {report['pages_moved']} pages in {report['seconds'] * 1000:.2f}ms")
+            st.write(memory_manager.compactor.stats())
+
+        st.subheader("Page Replacement")
+        policy = st.selectbox("Policy", ["lru", "clock", "lfu", "arc"], key="mem_policy",
+                              index=["lru", "clock", "lfu", "arc"].index(memory_manager.replacer.name))
+        if policy != memory_manager.replacer.name:
+            memory_manager.set_replacement_policy(policy)
+        st.write(memory_manager.replacement_stats())
     
     # File Management Tab (updated with debug info)
     with tabs[2]:
@@ -114,17 +158,48 @@ def show_dashboard():
             
             if action == "Write File":
                 content = st.text_area("Content", key="file_content")
+                encrypt = st.checkbox("Encrypt", key="file_encrypt")
                 if st.button("Write"):
-                    if file_manager.write_file(filename, content):
+                    if file_manager.write_file(filename, content, encrypt=encrypt):
                         st.success(f"File written to:\n{os.path.join(file_manager.base_dir, filename)}")
                     else:
                         st.error("Operation failed (check terminal for details)")
             
             elif action == "Read File":
+                mode = st.radio("Show", ["Whole file", "Head", "Tail", "Byte range"], horizontal=True,
+                                key="read_mode")
+                if mode in ("Head", "Tail"):
+                    lines = st.number_input("Lines", min_value=1, value=20, key="read_lines")
+                elif mode == "Byte range":
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        offset = st.number_input("Offset", min_value=0, value=0, key="read_offset")
+                    with col2:
+                        length = st.number_input("Length", min_value=1, value=4096, key="read_length")
                 if st.button("Read"):
-                    content = file_manager.read_file(filename)
-                    if content is not None:
-                        st.text_area("File Content", value=content, key="file_output")
+                    if mode == "Whole file":
+                        content = file_manager.read_file(filename)
+                        if content is not None:
+                            st.text_area("File Content", value=content, key="file_output")
+                    else:
+                        # Served from a memory map: only the slice shown is copied
+                        view = file_manager.open_view(filename)
+                        if view is not None:
+                            with view:
+                                if mode == "Head":
+                                    data = view.head(int(lines))
+                                elif mode == "Tail":
+                                    data = view.tail(int(lines))
+                                else:
+                                    data = view.read(int(offset), int(length))
+                                st.caption(f"{len(data)} of {view.size} bytes")
+                                st.text_area("File Content", value=bytes(data).decode("utf-8", errors="replace"),
+                                             key="file_output")
+                        else:
+                            st.error("File not found")
+                if file_manager.cache:
+                    st.caption("Read cache: {hits} hits, {misses} misses, {entries} files, {bytes} bytes"
+                               .format(**file_manager.cache_stats()))
             
             elif action in ["Create File", "Delete File"]:
                 if st.button(action):
@@ -147,29 +222,89 @@ def show_dashboard():
         
         elif action == "List Directory":
             dirname = st.text_input("Directory Path", ".", key="list_dir")
-            if st.button("List"):
-                contents = file_manager.list_directory(dirname)
-                if contents is not None:
-                    st.write(f"Contents of {os.path.join(file_manager.base_dir, dirname)}:")
-                    st.write(contents)
-                else:
-                    st.error("Failed to list directory")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                page_size = st.selectbox("Entries per page", [50, 100, 500], key="list_page_size")
+            with col2:
+                page = st.number_input("Page", min_value=1, value=1, key="list_page")
+            with col3:
+                refresh = st.checkbox("Re-read file sizes", key="list_refresh")
+            # Pages come from FileManager's cached directory index, so paging
+            # through a large directory does not re-stat it on every rerun
+            result = file_manager.list_page(dirname, int(page) - 1, page_size, refresh=refresh)
+            if result is not None:
+                entries, total = result
+                pages = max(1, -(-total // page_size))
+                st.write(f"Contents of {os.path.join(file_manager.base_dir, dirname)} "
+                         f"(page {int(page)} of {pages}, {total} entries):")
+                st.dataframe([entry._asdict() for entry in entries], use_container_width=True)
+            else:
+                st.error("Failed to list directory")
+
+            pattern = st.text_input("Find files (glob, e.g. **/*.txt)", key="file_glob")
+            if pattern:
+                matches = []
+                for match in file_manager.glob(pattern, dirname):
+                    matches.append(match)
+                    if len(matches) >= 1000:
+                        break
+                st.write(f"{len(matches)} matches" + (" (first 1000)" if len(matches) >= 1000 else ""))
+                st.write(matches)
     
     # System Tab (unchanged)
     with tabs[3]:
         st.header("System Information")
+
+        st.subheader("Event Log")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            event_pid = st.number_input("PID (0 = any)", min_value=0, value=0, key="event_pid")
+            event_type = st.text_input("Event type", key="event_type")
+        with col2:
+            event_since = st.text_input("Since (HH:MM or YYYY-MM-DD HH:MM)", key="event_since")
+            event_until = st.text_input("Until", key="event_until")
+        with col3:
+            event_user = st.text_input("User", key="event_user")
+            event_limit = st.number_input("Max events", min_value=1, value=200, key="event_limit")
+        if st.button("Search Events"):
+            try:
+                events = list(event_log.query(
+                    since=event_since or None,
+                    until=event_until or None,
+                    pid=int(event_pid) or None,
+                    event_type=event_type or None,
+                    user=event_user or None,
+                    limit=int(event_limit),
+                    newest_first=True,
+                ))
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.write(f"{len(events)} events, newest first")
+                st.text("\n".join(format_event(event) for event in events))
+        st.write(event_log.stats())
+
         if st.button("Logout"):
+            user_manager.end_session(st.session_state.get("token"))
             st.session_state.logged_in = False
             st.rerun()
 
 def main():
     if 'logged_in' not in st.session_state:
         st.session_state.logged_in = False
-    
+
+    # Every rerun re-checks the session token (an O(1) lookup, no hashing);
+    # an expired session goes back to the login form
+    if st.session_state.logged_in and not user_manager.validate_session(st.session_state.get("token")):
+        st.session_state.logged_in = False
+
     if not st.session_state.logged_in:
         show_login()
     else:
-        show_dashboard()
+        # The event log is shared by every session on the server, so the
+        # user goes with this script run rather than onto the event log
+        with event_log.user_context(st.session_state.username):
+            show_dashboard()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
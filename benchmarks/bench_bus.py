@@ -0,0 +1,101 @@
+# bench_bus.py - event bus fan-out: deliveries/s from 1 to 5000 subscribers
+# per overflow policy, against one asyncio.Queue per subscriber matched by a
+# regex scan of every pattern
+#
+# Usage: python benchmarks/bench_bus.py [deliveries]
+import asyncio
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger
+from event_bus import EventBus
+
+logger.set_level(logger.ERROR)  # one log line per subscribe
+
+PATTERNS = ("sensor.*.temp", "sensor.#", "sensor.{}.temp", "#")
+YIELD_EVERY = 1000  # publisher yields this often; more than maxsize, so queues overflow
+
+
+def topics(count):
+    return [f"sensor.{i % 100}.temp" for i in range(count)]
+
+
+async def consume(subscription, counts):
+    while True:
+        batch = await subscription.get_batch()
+        if not batch:
+            return
+        counts[0] += len(batch)
+
+
+async def bus_fanout(subscribers, messages, policy, maxsize=256):
+    bus = EventBus(maxsize=maxsize, policy=policy)
+    subscriptions = [bus.subscribe(PATTERNS[i % 4].format(i % 100)) for i in range(subscribers)]
+    counts = [0]
+    consumers = [asyncio.create_task(consume(subscription, counts)) for subscription in subscriptions]
+    payload = {"celsius": 21.5}
+    started = time.perf_counter()
+    for i, topic in enumerate(topics(messages)):
+        await bus.publish(topic, payload)
+        if i % YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+    for subscription in subscriptions:
+        subscription.close()
+    await asyncio.gather(*consumers)
+    elapsed = time.perf_counter() - started
+    dropped = sum(subscription.dropped for subscription in subscriptions)
+    return counts[0], dropped, elapsed
+
+
+async def naive_fanout(subscribers, messages, maxsize=256):
+    def compile_pattern(pattern):
+        # Good enough for PATTERNS against three-segment topics
+        segments = ["[^.]+" if s == "*" else ".*" if s == "#" else re.escape(s) for s in pattern.split(".")]
+        return re.compile(r"\.".join(segments) + "$")
+
+    queues = [(compile_pattern(PATTERNS[i % 4].format(i % 100)), asyncio.Queue(maxsize))
+              for i in range(subscribers)]
+    counts = [0]
+
+    async def consume_queue(queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            counts[0] += 1
+
+    consumers = [asyncio.create_task(consume_queue(queue)) for _, queue in queues]
+    payload = {"celsius": 21.5}
+    started = time.perf_counter()
+    for i, topic in enumerate(topics(messages)):
+        for regex, queue in queues:
+            if regex.match(topic):
+                await queue.put((topic, payload))
+        if i % YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+    for _, queue in queues:
+        await queue.put(None)
+    await asyncio.gather(*consumers)
+    return counts[0], 0, time.perf_counter() - started
+
+
+def run(deliveries):
+    print(f"~{deliveries:,} deliveries per row")
+    for subscribers in (1, 10, 100, 1000, 5000):
+        messages = max(20, deliveries // subscribers)
+        rows = [(policy, asyncio.run(bus_fanout(subscribers, messages, policy)))
+                for policy in ("block", "drop", "drop_oldest")]
+        rows.append(("asyncio.Queue", asyncio.run(naive_fanout(subscribers, messages))))
+        for label, (delivered, dropped, elapsed) in rows:
+            print(f"  {subscribers:>5} subs, {label:<13} {messages / elapsed:11,.0f} publishes/s"
+                  f" {delivered / elapsed:12,.0f} deliveries/s   {dropped:,} dropped")
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [500000]
+    for n in counts:
+        run(n)
@@ -0,0 +1,76 @@
+# bench_dedup.py - bytes on disk and MB/s for the deduplicating storage
+# backend, per codec, against plain files under base_dir
+#
+# Usage: python benchmarks/bench_dedup.py [revisions]
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_storage import DedupStorage
+from file_management import FileManager
+
+
+def quiet():
+    # FileManager reports every operation on stdout
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def disk_usage(directory):
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def revisions(count, lines=20000):
+    # A growing log edited in a few places per revision, the kind of
+    # near-duplicate content a versioned workspace accumulates
+    rng = random.Random(7)
+    text = [f"{i:06} INFO worker-{i % 16} handled request {rng.randrange(10**6)}\n" for i in range(lines)]
+    for _ in range(count):
+        for _ in range(5):
+            text[rng.randrange(len(text))] = f"EDIT {rng.random()}\n"
+        text.extend(f"{len(text):06} WARN retry {rng.randrange(100)}\n" for _ in range(50))
+        yield "".join(text)
+
+
+def run(count):
+    corpus = list(revisions(count))
+    logical = sum(len(text) for text in corpus)
+    mb = logical / (1 << 20)
+    print(f"{count} revisions, {mb:.1f} MB logical")
+    for codec in (None, "none", "zlib", "lzma"):
+        with tempfile.TemporaryDirectory() as directory:
+            storage = DedupStorage(os.path.join(directory, "store"), codec=codec) if codec else None
+            with quiet():
+                manager = FileManager(os.path.join(directory, "data"), storage=storage)
+                started = time.perf_counter()
+                for i, text in enumerate(corpus):
+                    manager.write_file(f"rev{i:04}.log", text)
+                write = time.perf_counter() - started
+                started = time.perf_counter()
+                for i in range(count):
+                    manager.read_file(f"rev{i:04}.log")
+                read = time.perf_counter() - started
+            used = disk_usage(directory)
+            label = f"dedup, {codec}" if codec else "host files"
+            print(f"  {label:<12} {used / (1 << 20):8.1f} MB on disk ({logical / used:5.1f}x)"
+                  f"   write {mb / write:7.1f} MB/s   read {mb / read:7.1f} MB/s")
+            if storage:
+                stats = storage.stats()
+                print(f"  {'':<12} dedup {stats['dedup_ratio']:.1f}x, compression"
+                      f" {stats['compression_ratio']:.1f}x, {stats['chunks']} chunks")
+                storage.close()
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [50]
+    for n in counts:
+        run(n)
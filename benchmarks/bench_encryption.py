@@ -0,0 +1,74 @@
+# bench_encryption.py - encrypted write/read MB/s by worker count, against
+# the old single-shot Fernet path, plus random-access range reads
+#
+# Usage: python benchmarks/bench_encryption.py [megabytes]
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_management import FileManager
+
+
+def quiet():
+    # FileManager reports every operation on stdout
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def blocks(data, size=1 << 20):
+    view = memoryview(data)
+    for start in range(0, len(view), size):
+        yield view[start:start + size]
+
+
+def run(megabytes):
+    data = os.urandom(megabytes << 20)
+    cores = os.cpu_count() or 1
+    print(f"{megabytes} MB, {cores} cores")
+    with tempfile.TemporaryDirectory() as directory:
+        with quiet():
+            manager = FileManager(directory, crypto_workers=1)
+        started = time.perf_counter()
+        manager.cipher.decrypt(manager.cipher.encrypt(data))
+        elapsed = time.perf_counter() - started
+        print(f"  fernet, whole buffer        encrypt+decrypt {megabytes / elapsed:8.1f} MB/s")
+
+        workers = 1
+        while True:
+            with quiet():
+                manager = FileManager(directory, crypto_workers=workers)
+                started = time.perf_counter()
+                manager.write_stream("bench.bin", blocks(data), encrypt=True)
+                write = time.perf_counter() - started
+                started = time.perf_counter()
+                for _ in manager.iter_read("bench.bin", binary=True):
+                    pass
+                read = time.perf_counter() - started
+            print(f"  aes-gcm, {workers:>2} workers         write {megabytes / write:8.1f} MB/s"
+                  f"   read {megabytes / read:8.1f} MB/s")
+            if workers >= max(cores, 4):
+                break
+            workers *= 2
+
+        rng = random.Random(3)
+        size = len(data)
+        started = time.perf_counter()
+        for _ in range(1000):
+            offset = rng.randrange(size)
+            with quiet():
+                assert manager.read_range("bench.bin", offset, 4096) == data[offset:offset + 4096]
+        elapsed = time.perf_counter() - started
+        print(f"  read_range 4 KB at random offsets: {elapsed:.3f}ms each")
+        if manager._pool:
+            manager._pool.shutdown()
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [256]
+    for mb in sizes:
+        run(mb)
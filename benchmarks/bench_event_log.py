@@ -0,0 +1,71 @@
+# bench_event_log.py - indexed event queries vs scanning the whole log
+#
+# Usage: python benchmarks/bench_event_log.py [events]
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_log import EventLog
+
+TYPES = ["process_created", "process_scheduled", "memory_allocated", "memory_freed", "message_sent"]
+
+
+def full_scan(path, since, until, pid):
+    matches = 0
+    with open(path, "rb") as f:
+        for line in f:
+            event = json.loads(line)
+            if since <= event["ts"] <= until and event["pid"] == pid:
+                matches += 1
+    return matches
+
+
+def run(count):
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        events = EventLog()
+        started = time.perf_counter()
+        for i in range(count):
+            events.record(rng.choice(TYPES), pid=rng.randint(1, 5000), size=rng.randint(1, 512))
+        events.backend.flush(timeout=600)
+        elapsed = time.perf_counter() - started
+        stats = events.stats()
+        print(f"{count:,} events, {stats['bytes'] / 2**20:.1f} MiB, {stats['indexed_blocks']} index blocks, "
+              f"written at {count / elapsed:,.0f} events/s")
+
+        with open(events.full_path, "rb") as f:
+            first = json.loads(f.readline())["ts"]
+            f.seek(-4096, os.SEEK_END)
+            last = json.loads(f.read().splitlines()[-1])["ts"]
+        # A window of 5% of the log in the middle, one PID
+        since = first + (last - first) * 0.50
+        until = first + (last - first) * 0.55
+        pid = 42
+
+        started = time.perf_counter()
+        matches = sum(1 for _ in events.query(since=since, until=until, pid=pid))
+        indexed = time.perf_counter() - started
+        started = time.perf_counter()
+        scanned = full_scan(events.full_path, since, until, pid)
+        scan = time.perf_counter() - started
+        assert matches == scanned
+        print(f"  pid + 5% window: {matches} matches, indexed {indexed * 1000:.1f}ms, "
+              f"full scan {scan * 1000:.1f}ms ({scan / indexed:.0f}x)")
+
+        started = time.perf_counter()
+        matches = sum(1 for _ in events.query(since=since, until=until))
+        print(f"  5% window, any pid: {matches:,} matches in {(time.perf_counter() - started) * 1000:.1f}ms")
+        events.backend.close()
+        os.chdir("/")
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [1_000_000]
+    for n in counts:
+        run(n)
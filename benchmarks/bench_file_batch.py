@@ -0,0 +1,60 @@
+# bench_file_batch.py - files per second, write_file loop vs FileManager.batch
+#
+# Usage: python benchmarks/bench_file_batch.py [files]
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_management import FileManager
+
+
+def measure(label, count, fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+    print(f"  {label:<38} {count / elapsed:>10,.0f} files/s ({elapsed:.2f}s)")
+
+
+def run(count, size=1024):
+    content = "x" * size
+    print(f"{count:,} files of {size} bytes")
+    with tempfile.TemporaryDirectory() as directory:
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager = FileManager(directory)
+        names = [f"file{i:06}.txt" for i in range(count)]
+
+        def loop_write():
+            for name in names:
+                manager.write_file(name, content)
+
+        def loop_delete():
+            for name in names:
+                manager.delete_file(name)
+
+        def loop_write_fsync():
+            # What durable writes cost one file at a time
+            for name in names:
+                manager._atomic_write(manager.get_full_path(name), content, False, True)
+
+        measure("write_file loop (no fsync)", count, loop_write)
+        measure("delete_file loop", count, loop_delete)
+        measure("batch write, durable=False", count,
+                lambda: manager.write_files(dict.fromkeys(names, content), durable=False))
+        measure("batch delete, durable=False", count, lambda: manager.delete_files(names, durable=False))
+        measure("atomic write + fsync loop", count, loop_write_fsync)
+        manager.delete_files(names, durable=False)
+        measure("batch write, durable=True", count, lambda: manager.write_files(dict.fromkeys(names, content)))
+        measure("batch write, encrypted, durable=True", count,
+                lambda: manager.write_files(dict.fromkeys(names, content), encrypt=True))
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [5000]
+    for n in counts:
+        run(n)
@@ -0,0 +1,91 @@
+# bench_ipc.py - mailbox messages/s with many sender threads, single vs
+# batched sends, and receive calls per message for polling vs blocking
+# simulated processes
+#
+# Usage: python benchmarks/bench_ipc.py [messages]
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger
+from ipc import IPC
+from process_management import ProcessManager
+
+logger.set_level(logger.ERROR)  # per-call log lines would dominate
+
+
+def threaded(total, senders, batch, capacity=1024):
+    ipc = IPC(capacity=capacity)
+    per_sender = total // senders
+    payload = list(range(batch))
+    peak = [0]
+
+    def send(pid):
+        if batch == 1:
+            for i in range(per_sender):
+                ipc.send(pid, 0, i, block=True)
+        else:
+            for _ in range(per_sender // batch):
+                ipc.send_batch(pid, 0, payload, block=True)
+
+    def receive(expected):
+        got = 0
+        mailbox = ipc.mailbox(0)
+        while got < expected:
+            peak[0] = max(peak[0], mailbox.count)
+            got += len(ipc.receive(0, 256, block=True, timeout=5))
+
+    expected = senders * (per_sender if batch == 1 else per_sender // batch * batch)
+    receiver = threading.Thread(target=receive, args=(expected,))
+    threads = [threading.Thread(target=send, args=(pid,)) for pid in range(1, senders + 1)]
+    started = time.perf_counter()
+    receiver.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    receiver.join()
+    elapsed = time.perf_counter() - started
+    label = "send" if batch == 1 else f"send_batch({batch})"
+    print(f"  {senders:>3} senders, {label:<15} {expected / elapsed:12,.0f} msgs/s"
+          f"   peak queued {peak[0]:,} of {capacity:,}")
+
+
+def simulated(messages, consumers=100):
+    # Every round, each consumer that is not blocked checks its mailbox
+    for mode in ("polling", "blocking"):
+        manager = ProcessManager()
+        ipc = IPC(process_manager=manager)
+        producer = manager.create_process("producer", 2)
+        pids = [manager.create_process(f"consumer{i}", 1) for i in range(consumers)]
+        rng = random.Random(1)
+        calls = delivered = 0
+        started = time.perf_counter()
+        for step in range(messages):
+            ipc.send(producer, rng.choice(pids), step)
+            for pid in pids:
+                if pid in manager.blocked_queue:
+                    continue
+                calls += 1
+                delivered += len(ipc.receive(pid, block=mode == "blocking"))
+        elapsed = time.perf_counter() - started
+        print(f"  {consumers} consumers, {mode:<9} {calls / delivered:8.1f} receive calls per message"
+              f"   {delivered / elapsed:10,.0f} msgs/s")
+
+
+def run(total):
+    print(f"{total:,} messages, {os.cpu_count() or 1} cores")
+    for senders in (1, 4, 16, 64):
+        threaded(total, senders, 1)
+        threaded(total, senders, 64)
+    simulated(total // 20)
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [200000]
+    for n in counts:
+        run(n)
@@ -0,0 +1,57 @@
+# bench_logger.py - log events per second, old synchronous logger vs the
+# buffered background writer
+#
+# Usage: python benchmarks/bench_logger.py [events]
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger
+
+
+class LegacyLogger:
+    # The previous logger: open, format, write and close on every event
+    def __init__(self, path):
+        self.full_path = path
+
+    def log(self, event):
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with open(self.full_path, "a") as log_file:
+            log_file.write(f"[{timestamp}] {event}\n")
+
+
+def measure(label, log, count, done=None):
+    started = time.perf_counter()
+    for i in range(count):
+        log(f"Process {i} created with priority 1")
+    if done:
+        done()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {count:>10,} events  {elapsed:8.3f}s  {count / elapsed:>12,.0f} events/s")
+
+
+def run(count):
+    with tempfile.TemporaryDirectory() as directory:
+        legacy = LegacyLogger(os.path.join(directory, "legacy.log"))
+        measure("legacy (open/write/close)", legacy.log, min(count, 200_000))
+
+        backend = logger.LogBackend(os.path.join(directory, "buffered.log"))
+        measure("buffered, enqueue only", lambda event: backend.submit(logger.INFO, event), count)
+        backend.flush(timeout=60)
+        measure("buffered, enqueue + flush to disk", lambda event: backend.submit(logger.INFO, event),
+                count, lambda: backend.flush(timeout=60))
+
+        logger.set_level(logger.INFO)
+        quiet = logger.Logger()
+        measure("disabled DEBUG events", lambda event: quiet.log(event, logger.DEBUG), count)
+        backend.close()
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]
+    for n in counts:
+        run(n)
@@ -0,0 +1,81 @@
+# bench_process.py - ProcessManager lifecycle throughput and table memory
+#
+# Usage: python benchmarks/bench_process.py [count ...]
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger
+import process_management
+from process_management import ProcessManager
+
+
+def _rate(count, seconds):
+    return f"{count / seconds:>12,.0f} ops/s ({seconds:.2f}s)"
+
+
+def run(count, compact):
+    pm = ProcessManager(compact=compact)
+    rng = random.Random(count)
+
+    start = time.perf_counter()
+    for i in range(count):
+        pm.create_process("worker", rng.randint(0, 9))
+    create_time = time.perf_counter() - start
+
+    # Cycle the running process through blocked and back
+    cycles = count // 2
+    start = time.perf_counter()
+    for _ in range(cycles):
+        pid = pm.running_pid
+        pm.block_process(pid)
+        pm.unblock_process(pid)
+    cycle_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ready = pm.table.count(process_management.ProcessState.READY)
+    ready_pids = pm.table.pids(process_management.ProcessState.READY)
+    filter_time = time.perf_counter() - start
+
+    pids = pm.table.pids()
+    rng.shuffle(pids)
+    start = time.perf_counter()
+    for pid in pids:
+        pm.terminate_process(pid)
+    terminate_time = time.perf_counter() - start
+
+    backend = "compact" if compact else "object"
+    print(f"{count:>9,} processes ({backend} table)")
+    print(f"  create          {_rate(count, create_time)}")
+    print(f"  block+unblock   {_rate(cycles, cycle_time)}")
+    print(f"  terminate       {_rate(count, terminate_time)}")
+    print(f"  count+filter    {ready:,} ready found in {filter_time * 1000:.1f}ms ({len(ready_pids):,} pids)")
+
+
+def table_memory(count, compact):
+    # Memory held by the process table alone, without scheduler queues
+    tracemalloc.start()
+    table = ProcessManager(compact=compact).table
+    for pid in range(1, count + 1):
+        table.add(pid, "worker", pid % 10, process_management.ProcessState.READY, None)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+if __name__ == "__main__":
+    # Keep logging out of the numbers; we are timing the data structures
+    logger.set_level(logger.ERROR)
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for n in counts:
+        run(n, compact=False)
+        run(n, compact=True)
+    n = min(counts[-1], 1_000_000)
+    for compact in (False, True):
+        size = table_memory(n, compact)
+        print(f"table memory, {n:,} processes, {'compact' if compact else 'object'}: "
+              f"{size / 2**20:.1f} MiB ({size / n:.0f} bytes/process)")
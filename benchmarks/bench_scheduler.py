@@ -0,0 +1,44 @@
+# bench_scheduler.py - scheduling events per second of wall time
+#
+# Usage: python benchmarks/bench_scheduler.py [processes]
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_management import Process
+from scheduler import Simulation
+
+CONFIGS = [
+    ("rr", {"quantum": 4}),
+    ("mlfq", {"boost_interval": 500}),
+    ("cfs", {}),
+    ("sjf", {}),
+    ("sjf", {"preemptive": True}),
+]
+
+
+def run(count):
+    rng = random.Random(42)
+    processes = [Process(pid, f"job{pid}", rng.randint(0, 2)) for pid in range(1, count + 1)]
+    bursts = [rng.randint(1, 100) for _ in range(count)]
+    # Poisson-ish arrivals keep the ready set a few hundred deep
+    arrivals = []
+    clock = 0
+    for _ in range(count):
+        clock += rng.randint(0, 100)
+        arrivals.append(clock)
+
+    print(f"{count:,} processes")
+    for name, args in CONFIGS:
+        sim = Simulation(name, **args)
+        sim.add_processes(processes, bursts, arrivals)
+        report = sim.run()
+        label = name + ("/preemptive" if args.get("preemptive") else "")
+        print(f"  {label:<15} {report.events:>10,} events  {report.events_per_second:>12,.0f} events/s  "
+              f"avg wait {report.avg_wait:>8.1f}  avg response {report.avg_response:>8.1f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
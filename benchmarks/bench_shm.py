@@ -0,0 +1,105 @@
+# bench_shm.py - handing a buffer to a worker process: pickled through a
+# multiprocessing.Queue vs written once to a SharedSegment the worker views,
+# plus in-process copy vs zero-copy segment reads
+#
+# Usage: python benchmarks/bench_shm.py [largest_MB]
+import multiprocessing
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger
+from ipc import IPC, SharedSegment
+
+logger.set_level(logger.ERROR)
+
+
+def pickled_worker(requests, replies):
+    while True:
+        data = requests.get()
+        if data is None:
+            return
+        replies.put(zlib.crc32(data))
+
+
+def segment_worker(name, requests, replies):
+    segment = SharedSegment.attach(name)
+    while requests.get() is not None:
+        while True:
+            view, version = segment.view()
+            crc = zlib.crc32(view)
+            view.release()
+            if not segment.changed(version):
+                break
+        replies.put(crc)
+    segment.close()
+
+
+def handoff(size, rounds):
+    data = os.urandom(size)
+    requests, replies = multiprocessing.Queue(), multiprocessing.Queue()
+    worker = multiprocessing.Process(target=pickled_worker, args=(requests, replies))
+    worker.start()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        requests.put(data)
+        replies.get()
+    pickled = time.perf_counter() - started
+    requests.put(None)
+    worker.join()
+
+    ipc = IPC()
+    segment = ipc.create_segment(f"bench_shm_{os.getpid()}", size)
+    worker = multiprocessing.Process(target=segment_worker, args=(segment.name, requests, replies))
+    worker.start()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        segment.write(data)
+        requests.put(True)
+        replies.get()
+    shared = time.perf_counter() - started
+    requests.put(None)
+    worker.join()
+    ipc.close()
+    mb = size * rounds / 1e6
+    print(f"  {size / 1e6:9.3f} MB  Queue (pickled) {rounds / pickled:9,.0f} handoffs/s {mb / pickled:8,.0f} MB/s"
+          f"   SharedSegment {rounds / shared:9,.0f} handoffs/s {mb / shared:8,.0f} MB/s")
+
+
+def reads(size, rounds):
+    ipc = IPC()
+    key = f"bench_shm_{os.getpid()}"
+    ipc.create_segment(key, size)
+    ipc.shared_memory_write(key, os.urandom(size))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        ipc.shared_memory_read(key)
+    copied = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(rounds):
+        view, version = ipc.shared_memory_view(key)
+        view.release()
+    viewed = time.perf_counter() - started
+    ipc.close()
+    print(f"  {size / 1e6:9.3f} MB  read() copy {rounds / copied:12,.0f} reads/s"
+          f"   view() {rounds / viewed:12,.0f} reads/s")
+
+
+def run(largest_mb):
+    print(f"Payloads up to {largest_mb} MB, {os.cpu_count() or 1} cores")
+    sizes = [4096, 1 << 20, largest_mb << 20]
+    print("Handoff to a worker process, which checksums the buffer:")
+    for size in sizes:
+        handoff(size, max(5, (256 << 20) // size // 4))
+    print("Reads in this process:")
+    for size in sizes:
+        reads(size, max(20, (1 << 30) // size // 4))
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [64]
+    for n in counts:
+        run(n)
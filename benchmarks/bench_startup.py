@@ -0,0 +1,64 @@
+# bench_startup.py - cold import and first-use times of the VOS modules, each
+# in a fresh interpreter, plus what importing leaves behind
+#
+# Usage: python benchmarks/bench_startup.py [runs]
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+heavy = [name for name in ("cryptography", "numpy", "concurrent.futures") if name in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+CASES = [
+    ("import shell", "import shell"),
+    ("import main", "import main"),
+    ("import app modules (no streamlit)",
+     "import process_management, memory_management, file_management, user_management, event_log"),
+    ("shell ready (managers built)",
+     "import shell, process_management, memory_management, file_management\n"
+     "process_management.get_process_manager(); memory_management.get_memory_manager(); "
+     "file_management.get_file_manager()"),
+    ("first encrypted write",
+     "import file_management\nfile_management.get_file_manager().write_file('x.txt', 'x', encrypt=True)"),
+]
+
+
+def probe(statement, cwd):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, "-c", PROBE.format(statement=statement)], cwd=cwd, env=env,
+                         capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1]
+    elapsed, heavy = out.split(" ", 1) if " " in out else (out, "")
+    return float(elapsed), heavy
+
+
+def run(runs):
+    print(f"median of {runs} fresh interpreters")
+    for label, statement in CASES:
+        with tempfile.TemporaryDirectory() as cwd:
+            probe(statement, cwd)  # warm the bytecode cache
+            times = []
+            for _ in range(runs):
+                for name in os.listdir(cwd):
+                    shutil.rmtree(os.path.join(cwd, name))
+                elapsed, heavy = probe(statement, cwd)
+                times.append(elapsed)
+            created = sorted(os.listdir(cwd))
+        print(f"  {label:<36} {statistics.median(times) * 1000:7.1f} ms"
+              f"   loaded: {heavy or '-'}   created: {', '.join(created) or '-'}")
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10]
+    for n in counts:
+        run(n)
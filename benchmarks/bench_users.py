@@ -0,0 +1,72 @@
+# bench_users.py - user store size vs login latency, session validation
+# rate, and concurrent logins by hash worker count
+#
+# Usage: python benchmarks/bench_users.py [accounts]
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger
+from user_management import UserManager
+
+logger.set_level(logger.ERROR)  # keep login events out of logs/
+
+
+def run(count, batch=10000):
+    cores = os.cpu_count() or 1
+    print(f"{count:,} accounts, {cores} cores")
+    with tempfile.TemporaryDirectory() as directory:
+        # Cheap hashes to fill the store; verification cost is per row
+        users = UserManager(db_path=os.path.join(directory, "users.db"), iterations=100)
+        started = time.perf_counter()
+        for first in range(0, count, batch):
+            users.create_users({f"user{i:07}": f"pw{i}" for i in range(first, min(count, first + batch))})
+        elapsed = time.perf_counter() - started
+        print(f"  create_users                {count / elapsed:10,.0f} accounts/s")
+
+        rng = random.Random(5)
+        picks = [rng.randrange(count) for _ in range(2000)]
+        started = time.perf_counter()
+        for i in picks:
+            assert users.login(f"user{i:07}", f"pw{i}")
+        elapsed = time.perf_counter() - started
+        print(f"  login, random account       {elapsed / len(picks) * 1000:10.3f} ms (100 PBKDF2 rounds)")
+
+        tokens = [users.start_session(f"user{i:07}", f"pw{i}") for i in picks]
+        started = time.perf_counter()
+        for _ in range(50):
+            for token in tokens:
+                users.validate_session(token)
+        elapsed = time.perf_counter() - started
+        print(f"  validate_session            {50 * len(tokens) / elapsed:10,.0f} checks/s")
+        users.close()
+
+        # Real hash cost: 16 simultaneous logins, one thread each
+        workers = 1
+        while True:
+            users = UserManager(db_path=os.path.join(directory, "users.db"), hash_workers=workers)
+            users.create_user("alice", "secret")
+            threads = [threading.Thread(target=users.login, args=("alice", "secret")) for _ in range(16)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            print(f"  16 concurrent logins, {workers:>2} hash workers  {elapsed:6.2f}s"
+                  f" ({users.iterations:,} PBKDF2 rounds)")
+            users.close()
+            if workers >= max(cores, 4):
+                break
+            workers *= 2
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [100000]
+    for n in counts:
+        run(n)
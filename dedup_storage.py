@@ -0,0 +1,449 @@
+# dedup_storage.py - content-addressed, deduplicating storage backend for FileManager
+import bisect
+import hashlib
+import io
+import lzma
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+from file_management import FileEntry
+
+# Files are cut into content-defined chunks, each stored once under its
+# SHA-256 in objects/ and compressed with the configured codec. A SQLite
+# index maps paths to their chunk lists and counts references per chunk; a
+# chunk is deleted as soon as no file refers to it, and collect() sweeps
+# anything left behind by a crash.
+CODECS = {"none": 0, "zlib": 1, "lzma": 2}
+_ENTRY = struct.Struct(">32sI")  # chunk digest, plaintext length
+
+class _ChunkReader(io.RawIOBase):
+    # Seekable view of a file assembled from its chunks; one decoded chunk is
+    # kept so sequential reads do not decompress twice. The chunks stay
+    # pinned until close, so overwriting or removing the file meanwhile
+    # does not delete them underneath the reader.
+    def __init__(self, storage, entries):
+        self.storage = storage
+        self.digests = [digest for digest, _ in entries]
+        self.offsets = []
+        size = 0
+        for _, length in entries:
+            self.offsets.append(size)
+            size += length
+        self.size = size
+        self.pos = 0
+        self._cached = (None, b"")
+
+    def readable(self):
+        return True
+
+    def close(self):
+        if not self.closed:
+            self.storage._unpin(self.digests)
+        super().close()
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def readinto(self, buffer):
+        if self.pos >= self.size:
+            return 0
+        index = bisect.bisect_right(self.offsets, self.pos) - 1
+        if self._cached[0] != index:
+            self._cached = (index, self.storage._get_object(self.digests[index]))
+        data = self._cached[1]
+        start = self.pos - self.offsets[index]
+        count = min(len(buffer), len(data) - start)
+        buffer[:count] = data[start:start + count]
+        self.pos += count
+        return count
+
+class _DedupWriter:
+    # Spools the new content (in memory, then on disk past spool_size) and
+    # stores it when closed; an exception inside `with` discards it
+    def __init__(self, storage, path, spool_size=16 * 1024 * 1024):
+        self.storage = storage
+        self.path = path
+        self.spool = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        self.closed = False
+
+    def write(self, data):
+        return self.spool.write(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.spool.seek(offset, whence)
+
+    def tell(self):
+        return self.spool.tell()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                self.storage._commit(self.path, self.spool)
+            finally:
+                self.spool.close()
+
+    def discard(self):
+        self.closed = True
+        self.spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+def _parent(path):
+    return path.rpartition("/")[0]
+
+class DedupStorage:
+    def __init__(self, root, codec="zlib", level=None, min_chunk=2048, max_chunk=64 * 1024,
+                 boundary_mask=0x3F):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        if not 32 <= min_chunk <= max_chunk:
+            raise ValueError("Chunk sizes must satisfy 32 <= min_chunk <= max_chunk")
+        self.root = root
+        self.codec = codec
+        self.level = level
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.boundary_mask = boundary_mask
+        self.objects = os.path.join(root, "objects")
+        os.makedirs(self.objects, exist_ok=True)
+        self.lock = threading.RLock()
+        self._pins = {}  # {digest: writers about to reference it}
+        self.bytes_written = 0  # logical bytes committed
+        self.bytes_stored = 0  # compressed bytes of new chunks
+        self.bytes_read = 0  # compressed bytes read back
+        self.chunks_new = 0
+        self.chunks_deduplicated = 0
+        self.db = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, parent TEXT, size INTEGER, mtime_ns INTEGER, chunks BLOB);
+            CREATE INDEX IF NOT EXISTS files_parent ON files(parent);
+            CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);
+            CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+            CREATE TABLE IF NOT EXISTS chunks (
+                digest BLOB PRIMARY KEY, refs INTEGER, raw_size INTEGER, stored_size INTEGER);
+        """)
+
+    # Chunking and objects
+
+    def _find_cut(self, buf, start, final):
+        # Cut after a newline whose preceding 32 bytes hash to zero under
+        # boundary_mask: boundaries depend only on nearby content, so an edit
+        # early in a file does not shift every later chunk. Data without
+        # suitable newlines is cut at max_chunk.
+        end = len(buf)
+        limit = min(end, start + self.max_chunk)
+        pos = start + self.min_chunk - 1
+        mask = self.boundary_mask
+        find = buf.find
+        view = memoryview(buf)
+        crc32 = zlib.crc32
+        while True:
+            pos = find(b"\n", pos, limit)
+            if pos == -1:
+                break
+            if not crc32(view[pos - 31:pos + 1]) & mask:
+                return pos + 1
+            pos += 1
+        if start + self.max_chunk <= end:
+            return start + self.max_chunk
+        if final and start < end:
+            return end
+        return None
+
+    def _chunks(self, f):
+        buf = b""
+        while True:
+            block = f.read(1 << 20)
+            buf = buf + block if buf else block
+            final = not block
+            start = 0
+            while True:
+                cut = self._find_cut(buf, start, final)
+                if cut is None:
+                    break
+                yield buf[start:cut]
+                start = cut
+            buf = buf[start:]
+            if final:
+                return
+
+    def _object_path(self, digest):
+        name = digest.hex()
+        return os.path.join(self.objects, name[:2], name[2:])
+
+    def _put_object(self, digest, chunk):
+        if self.codec == "zlib":
+            payload = zlib.compress(chunk, 6 if self.level is None else self.level)
+        elif self.codec == "lzma":
+            payload = lzma.compress(chunk, preset=6 if self.level is None else self.level)
+        else:
+            payload = chunk
+        codec = CODECS[self.codec]
+        if len(payload) >= len(chunk):
+            payload, codec = chunk, CODECS["none"]  # incompressible
+        path = self._object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(bytes((codec,)))
+            f.write(payload)
+        os.replace(temp, path)
+        return len(payload) + 1
+
+    def _get_object(self, digest):
+        with open(self._object_path(digest), "rb") as f:
+            data = f.read()
+        self.bytes_read += len(data)
+        codec, payload = data[0], data[1:]
+        if codec == CODECS["zlib"]:
+            return zlib.decompress(payload)
+        if codec == CODECS["lzma"]:
+            return lzma.decompress(payload)
+        return payload
+
+    def _release(self, digests):
+        # Drop one reference per digest (inside a transaction); returns the
+        # chunks that are no longer referenced by anything
+        self.db.executemany("UPDATE chunks SET refs = refs - 1 WHERE digest = ?",
+                            [(digest,) for digest in digests])
+        dead = []
+        for digest in set(digests):
+            row = self.db.execute("SELECT refs FROM chunks WHERE digest = ?", (digest,)).fetchone()
+            if row and row[0] <= 0 and digest not in self._pins:
+                dead.append(digest)
+        self.db.executemany("DELETE FROM chunks WHERE digest = ?", [(digest,) for digest in dead])
+        return dead
+
+    def _pin(self, digests):
+        # Lock held
+        for digest in digests:
+            self._pins[digest] = self._pins.get(digest, 0) + 1
+
+    def _unpin(self, digests):
+        # Chunks released while pinned are deleted by the last unpin
+        with self.lock:
+            dead = []
+            for digest in digests:
+                self._pins[digest] -= 1
+                if not self._pins[digest]:
+                    del self._pins[digest]
+                    row = self.db.execute("SELECT refs FROM chunks WHERE digest = ?", (digest,)).fetchone()
+                    if row and row[0] <= 0:
+                        dead.append(digest)
+            self.db.executemany("DELETE FROM chunks WHERE digest = ?", [(digest,) for digest in dead])
+        self._unlink(dead)
+
+    def _unlink(self, digests):
+        for digest in digests:
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def _commit(self, path, spool):
+        spool.seek(0)
+        entries = []
+        created = {}  # {digest: (raw_size, stored_size)} written by this commit
+        pinned = []
+        try:
+            for chunk in self._chunks(spool):
+                digest = hashlib.sha256(chunk).digest()
+                entries.append((digest, len(chunk)))
+                if digest in created:
+                    continue
+                with self.lock:
+                    known = self.db.execute("SELECT 1 FROM chunks WHERE digest = ?", (digest,)).fetchone()
+                    # Keep the chunk from being collected before we reference it
+                    self._pin((digest,))
+                    pinned.append(digest)
+                if known:
+                    self.chunks_deduplicated += 1
+                else:
+                    created[digest] = (len(chunk), self._put_object(digest, chunk))
+                    self.chunks_new += 1
+            size = sum(length for _, length in entries)
+            with self.lock:
+                if not self.isdir(_parent(path)):
+                    raise FileNotFoundError(f"No such directory: '{_parent(path)}'")
+                if self.isdir(path):
+                    raise IsADirectoryError(f"Is a directory: '{path}'")
+                self.db.execute("BEGIN")
+                try:
+                    self.db.executemany(
+                        "INSERT OR IGNORE INTO chunks (digest, refs, raw_size, stored_size) VALUES (?, 0, ?, ?)",
+                        [(digest, raw, stored) for digest, (raw, stored) in created.items()])
+                    self.db.executemany("UPDATE chunks SET refs = refs + 1 WHERE digest = ?",
+                                        [(digest,) for digest, _ in entries])
+                    row = self.db.execute("SELECT chunks FROM files WHERE path = ?", (path,)).fetchone()
+                    dead = []
+                    if row:
+                        self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+                        dead = self._release([digest for digest, _ in _ENTRY.iter_unpack(row[0])])
+                    self.db.execute(
+                        "INSERT INTO files (path, parent, size, mtime_ns, chunks) VALUES (?, ?, ?, ?, ?)",
+                        (path, _parent(path), size, time.time_ns(),
+                         b"".join(_ENTRY.pack(digest, length) for digest, length in entries)))
+                    self.db.execute("COMMIT")
+                except BaseException:
+                    self.db.execute("ROLLBACK")
+                    raise
+                self.bytes_written += size
+                self.bytes_stored += sum(stored for _, stored in created.values())
+        finally:
+            self._unpin(pinned)
+        self._unlink(dead)
+
+    # FileManager storage interface. The SQLite connection is shared by all
+    # threads, so every query takes self.lock; otherwise a reader could see
+    # the half-applied transaction of a concurrent _commit or remove.
+
+    def open_read(self, path):
+        with self.lock:
+            row = self.db.execute("SELECT chunks FROM files WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                raise FileNotFoundError(f"No such file: '{path}'")
+            entries = list(_ENTRY.iter_unpack(row[0]))
+            self._pin([digest for digest, _ in entries])
+        return io.BufferedReader(_ChunkReader(self, entries), 64 * 1024)
+
+    def open_write(self, path):
+        if not self.isdir(_parent(path)):
+            raise FileNotFoundError(f"No such directory: '{_parent(path)}'")
+        return _DedupWriter(self, path)
+
+    def isfile(self, path):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM files WHERE path = ?", (path,)).fetchone() is not None
+
+    def isdir(self, path):
+        if path == "":
+            return True
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM dirs WHERE path = ?", (path,)).fetchone() is not None
+
+    def makedirs(self, path):
+        with self.lock:
+            if self.isfile(path):
+                raise FileExistsError(f"File exists: '{path}'")
+            now = time.time_ns()
+            while path and not self.isdir(path):
+                self.db.execute("INSERT INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                                (path, _parent(path), now))
+                path = _parent(path)
+
+    def remove(self, path):
+        with self.lock:
+            row = self.db.execute("SELECT chunks FROM files WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                raise FileNotFoundError(f"No such file: '{path}'")
+            self.db.execute("BEGIN")
+            try:
+                self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+                dead = self._release([digest for digest, _ in _ENTRY.iter_unpack(row[0])])
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        self._unlink(dead)
+
+    def scandir(self, path):
+        with self.lock:
+            if not self.isdir(path):
+                raise FileNotFoundError(f"No such directory: '{path}'")
+            dirs = self.db.execute("SELECT path, mtime_ns FROM dirs WHERE parent = ?", (path,)).fetchall()
+            files = self.db.execute("SELECT path, size, mtime_ns FROM files WHERE parent = ?", (path,)).fetchall()
+        for child, mtime_ns in dirs:
+            yield FileEntry(child.rpartition("/")[2], child, "dir", 0, mtime_ns / 1e9)
+        for child, size, mtime_ns in files:
+            yield FileEntry(child.rpartition("/")[2], child, "file", size, mtime_ns / 1e9)
+
+    def stat_key(self, path):
+        with self.lock:
+            row = self.db.execute("SELECT mtime_ns, size, rowid FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No such file: '{path}'")
+        return row
+
+    # Maintenance and reporting
+
+    def collect(self):
+        # Sweep unreferenced chunks and object files the index does not know
+        # (left by a crash between writing an object and committing its file)
+        with self.lock:
+            rows = self.db.execute("SELECT digest FROM chunks WHERE refs <= 0").fetchall()
+            dead = [digest for (digest,) in rows if digest not in self._pins]
+            self.db.executemany("DELETE FROM chunks WHERE digest = ?", [(digest,) for digest in dead])
+            known = {digest for (digest,) in self.db.execute("SELECT digest FROM chunks")}
+            known.update(self._pins)
+            orphans = []
+            for prefix in os.listdir(self.objects):
+                directory = os.path.join(self.objects, prefix)
+                for name in os.listdir(directory):
+                    if name.endswith(".tmp"):
+                        continue
+                    try:
+                        digest = bytes.fromhex(prefix + name)
+                    except ValueError:
+                        continue
+                    if digest not in known:
+                        orphans.append(digest)
+        self._unlink(dead)
+        self._unlink(orphans)
+        return {"unreferenced_chunks": len(dead), "orphaned_objects": len(orphans)}
+
+    def stats(self):
+        with self.lock:
+            files, logical = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+            chunks, unique, stored = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(stored_size), 0) FROM chunks").fetchone()
+        return {
+            "backend": "dedup",
+            "codec": self.codec,
+            "files": files,
+            "chunks": chunks,
+            "logical_bytes": logical,
+            "unique_bytes": unique,
+            "stored_bytes": stored,
+            "dedup_ratio": logical / unique if unique else 1.0,
+            "compression_ratio": unique / stored if stored else 1.0,
+            "total_ratio": logical / stored if stored else 1.0,
+            "bytes_written": self.bytes_written,
+            "bytes_stored": self.bytes_stored,
+            "bytes_read": self.bytes_read,
+            "chunks_new": self.chunks_new,
+            "chunks_deduplicated": self.chunks_deduplicated,
+        }
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,361 @@
+# event_bus.py
+import asyncio
+import collections
+import threading
+import logger
+from event_log import event_log
+
+system_logger = logger.system_logger
+
+# Topics are dot-separated names such as "proc.7.exit". A subscription
+# pattern may use "*" for exactly one segment and "#" for zero or more, so
+# "proc.*.exit" and "proc.#" both match that topic. Patterns live in a trie of
+# segments, and the subscribers matching a topic are cached until the next
+# (un)subscribe, so a publish costs one dict lookup plus one append per
+# subscriber. Every subscriber queues the same (topic, message) tuple;
+# messages are never copied.
+#
+# Each subscription has a bounded queue and an overflow policy:
+# - "block": publish() waits until the subscriber has room (backpressure)
+# - "drop": the new message is dropped for that subscriber
+# - "drop_oldest": the oldest queued message is dropped to make room
+POLICIES = ("block", "drop", "drop_oldest")
+BUS_PID = 0  # sender PID of messages forwarded into IPC mailboxes
+
+class Subscription:
+    def __init__(self, bus, pattern, maxsize, policy):
+        self.bus = bus
+        self.pattern = pattern
+        self.maxsize = maxsize
+        self.policy = policy
+        self.queue = collections.deque()  # (topic, message), oldest first
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+        self.pid = None  # receiving PID when forwarded into IPC
+        self.task = None
+        self._ready = None  # future set when a message arrives
+        self._space = None  # future set when a message is taken
+
+    def _offer(self, item):
+        # Queue item on a full queue; False if a "block" publisher must wait
+        if self.closed:
+            return True
+        if len(self.queue) < self.maxsize:
+            self.queue.append(item)
+            self._wake_ready()
+            return True
+        if self.policy == "block":
+            return False
+        self.dropped += 1
+        if self.policy == "drop_oldest":
+            self.queue.popleft()
+            self.queue.append(item)
+        return True
+
+    def _wake_ready(self):
+        ready = self._ready
+        if ready is not None:
+            self._ready = None
+            if not ready.done():
+                ready.set_result(None)
+
+    def _wake_space(self):
+        space = self._space
+        if space is not None:
+            self._space = None
+            if not space.done():
+                space.set_result(None)
+
+    # Waiters share one future per event and await it through shield(), so
+    # a waiter that is cancelled (a publish timing out) leaves the future,
+    # and everyone else waiting on it, untouched
+
+    async def _wait_space(self):
+        if self._space is None or self._space.done():
+            self._space = asyncio.get_running_loop().create_future()
+        await asyncio.shield(self._space)
+
+    async def _wait_ready(self):
+        if self._ready is None or self._ready.done():
+            self._ready = asyncio.get_running_loop().create_future()
+        await asyncio.shield(self._ready)
+
+    async def get(self):
+        # Next (topic, message); None once the subscription is closed and empty
+        while not self.queue:
+            if self.closed:
+                return None
+            await self._wait_ready()
+        self.received += 1
+        if self._space is not None:
+            self._wake_space()
+        return self.queue.popleft()
+
+    async def get_batch(self, max_items=None):
+        # Wait for at least one message and take up to max_items (default:
+        # all queued); [] once the subscription is closed and empty
+        while not self.queue:
+            if self.closed:
+                return []
+            await self._wait_ready()
+        queue = self.queue
+        count = len(queue) if max_items is None else min(max_items, len(queue))
+        items = [queue.popleft() for _ in range(count)]
+        self.received += count
+        if self._space is not None:
+            self._wake_space()
+        return items
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def stats(self):
+        return {
+            "pattern": self.pattern,
+            "policy": self.policy,
+            "pid": self.pid,
+            "queued": len(self.queue),
+            "maxsize": self.maxsize,
+            "delivered": self.received + len(self.queue),
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+class EventBus:
+    # Publish/subscribe on one asyncio event loop; every method must be called
+    # from that loop's thread (see BusThread for synchronous callers)
+    def __init__(self, maxsize=1024, policy="block", cache_topics=4096):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.cache_topics = cache_topics
+        self.published = 0
+        self._trie = ({}, [])  # (children by segment, subscriptions ending here)
+        self._subscriptions = {}  # {Subscription: None}, in subscription order
+        self._cache = {}  # {topic: (Subscription, ...)}
+        self._terminate_hooks = {}  # {ProcessManager: hook} ending forwards to dead PIDs
+
+    def subscribe(self, pattern, maxsize=None, policy=None):
+        policy = policy or self.policy
+        if policy not in POLICIES:
+            print(f"Unknown overflow policy '{policy}' (use {', '.join(POLICIES)})")
+            return None
+        if not pattern or "" in pattern.split("."):
+            print(f"Invalid topic pattern '{pattern}'")
+            return None
+        subscription = Subscription(self, pattern, maxsize or self.maxsize, policy)
+        node = self._trie
+        for segment in pattern.split("."):
+            node = node[0].setdefault(segment, ({}, []))
+        node[1].append(subscription)
+        self._subscriptions[subscription] = None
+        self._cache.clear()
+        system_logger.log(f"Subscribed to '{pattern}' ({policy}, {subscription.maxsize} messages)")
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription not in self._subscriptions:
+            return False
+        del self._subscriptions[subscription]
+        node = self._trie
+        for segment in subscription.pattern.split("."):
+            node = node[0][segment]
+        node[1].remove(subscription)
+        self._cache.clear()
+        subscription.closed = True
+        subscription._wake_ready()
+        subscription._wake_space()
+        if subscription.task is not None:
+            subscription.task.cancel()
+        system_logger.log(f"Unsubscribed from '{subscription.pattern}'")
+        return True
+
+    @property
+    def subscriptions(self):
+        return list(self._subscriptions)
+
+    def _collect(self, node, segments, index, found):
+        children, subscriptions = node
+        rest = children.get("#")
+        if rest is not None:
+            for start in range(index, len(segments) + 1):
+                self._collect(rest, segments, start, found)
+        if index == len(segments):
+            found.extend(subscriptions)
+            return
+        for key in (segments[index], "*"):
+            child = children.get(key)
+            if child is not None:
+                self._collect(child, segments, index + 1, found)
+
+    def match(self, topic):
+        # Subscriptions whose pattern matches topic
+        subscriptions = self._cache.get(topic)
+        if subscriptions is None:
+            found = []
+            self._collect(self._trie, topic.split("."), 0, found)
+            subscriptions = tuple(dict.fromkeys(found))  # "#" can reach one twice
+            if len(self._cache) >= self.cache_topics:
+                self._cache.clear()
+            self._cache[topic] = subscriptions
+        return subscriptions
+
+    async def publish(self, topic, message):
+        # Fan message out to every matching subscription; returns how many
+        # there were. Waits while a "block" subscriber is full.
+        item = (topic, message)
+        subscriptions = self.match(topic)
+        blocked = None
+        for subscription in subscriptions:
+            queue = subscription.queue
+            if len(queue) < subscription.maxsize and not subscription.closed:
+                queue.append(item)
+                if subscription._ready is not None:
+                    subscription._wake_ready()
+            elif not subscription._offer(item):
+                if blocked is None:
+                    blocked = []
+                blocked.append(subscription)
+        self.published += 1
+        if blocked:
+            for subscription in blocked:
+                while not subscription._offer(item):
+                    await subscription._wait_space()
+        return len(subscriptions)
+
+    def forward(self, pattern, ipc, pid, maxsize=None, policy=None, retry_delay=0.01):
+        # Subscribe pid's IPC mailbox to pattern: a task moves each message
+        # there as (BUS_PID, (topic, message)). While the mailbox is full the
+        # task checks back every retry_delay seconds, so this subscription's
+        # queue fills up and its policy applies to publishers. The
+        # subscription ends when pid's process is terminated.
+        subscription = self.subscribe(pattern, maxsize, policy)
+        if subscription is not None:
+            self._watch(ipc.process_manager)
+            subscription.pid = pid
+            subscription.task = asyncio.get_running_loop().create_task(
+                self._forward(subscription, ipc, pid, retry_delay))
+            event_log.record("bus_subscribed", pid=pid, pattern=pattern)
+        return subscription
+
+    async def _forward(self, subscription, ipc, pid, retry_delay):
+        manager = ipc.process_manager
+        simulated = manager is not None and pid in manager.table
+        while True:
+            batch = await subscription.get_batch(ipc.capacity)
+            if not batch:
+                return
+            sent = 0
+            while sent < len(batch) and not subscription.closed:
+                # Only send what fits, so nothing counts as refused. The
+                # mailbox is looked up each time: terminating pid drops it.
+                if simulated and pid not in manager.table:
+                    self.unsubscribe(subscription)
+                    return
+                mailbox = ipc.mailbox(pid)
+                room = mailbox.capacity - mailbox.count
+                accepted = ipc.send_batch(BUS_PID, pid, batch[sent:sent + room]) if room else 0
+                if accepted:
+                    sent += accepted
+                else:
+                    await asyncio.sleep(retry_delay)
+
+    def _watch(self, manager):
+        # Terminate hooks run on the terminating thread, holding the process
+        # manager's lock, so the hook only hands the PID over to the loop
+        if manager is None or manager in self._terminate_hooks:
+            return
+        loop = asyncio.get_running_loop()
+
+        def hook(pid):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._process_terminated, pid)
+        with manager.lock:
+            manager.terminate_hooks.append(hook)
+        self._terminate_hooks[manager] = hook
+
+    def _process_terminated(self, pid):
+        for subscription in self.subscriptions:
+            if subscription.pid == pid:
+                self.unsubscribe(subscription)
+
+    def close(self):
+        # End every subscription and stop watching for terminated processes;
+        # returns the forwarding tasks, which finish once the loop runs them
+        tasks = [subscription.task for subscription in self.subscriptions if subscription.task]
+        for subscription in self.subscriptions:
+            self.unsubscribe(subscription)
+        for manager, hook in self._terminate_hooks.items():
+            with manager.lock:
+                manager.terminate_hooks.remove(hook)
+        self._terminate_hooks.clear()
+        return tasks
+
+    def stats(self):
+        subscriptions = self.subscriptions
+        return {
+            "subscriptions": len(subscriptions),
+            "published": self.published,
+            "queued": sum(len(subscription.queue) for subscription in subscriptions),
+            "dropped": sum(subscription.dropped for subscription in subscriptions),
+            "cached_topics": len(self._cache),
+        }
+
+class BusThread:
+    # Runs an EventBus on its own event-loop thread for synchronous callers
+    # such as the shell; each call waits for the loop to finish it
+    def __init__(self, **options):
+        self.loop = asyncio.new_event_loop()
+        self.bus = EventBus(**options)
+        self.thread = threading.Thread(target=self.loop.run_forever, name="event-bus", daemon=True)
+        self.thread.start()
+
+    def _call(self, function, *args):
+        async def call():
+            return function(*args)
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result()
+
+    def publish(self, topic, message, timeout=None):
+        # Number of subscribers reached, or None if a "block" subscriber
+        # still had no room after timeout seconds
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(self.bus.publish(topic, message), timeout), self.loop)
+        try:
+            return future.result()
+        except asyncio.TimeoutError:
+            print(f"Publish to '{topic}' timed out: a subscriber's queue is full")
+            return None
+
+    def forward(self, pattern, ipc, pid, maxsize=None, policy=None):
+        return self._call(self.bus.forward, pattern, ipc, pid, maxsize, policy)
+
+    def unsubscribe(self, pid, pattern):
+        # End pid's forwarded subscriptions to pattern; returns how many
+        def unsubscribe():
+            return sum(self.bus.unsubscribe(subscription) for subscription in self.bus.subscriptions
+                       if subscription.pid == pid and subscription.pattern == pattern)
+        return self._call(unsubscribe)
+
+    def subscription_stats(self):
+        return self._call(lambda: [subscription.stats() for subscription in self.bus.subscriptions])
+
+    def stats(self):
+        return self._call(self.bus.stats)
+
+    def close(self):
+        # End every subscription and wait for their forwarding tasks
+        async def shutdown():
+            await asyncio.gather(*self.bus.close(), return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
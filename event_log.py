@@ -0,0 +1,364 @@
+# event_log.py - structured event log with a sparse time/PID index
+import bisect
+import contextlib
+import contextvars
+import datetime
+import json
+import os
+
+import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process may write the event log
+    fcntl = None
+
+_encode = json.JSONEncoder(separators=(",", ":"), default=str).encode
+
+BLOCK_RECORDS = 4096  # records summarised by one index entry
+PID_MASK_BITS = 1024  # PIDs are hashed into a per-block bitmask of this size
+
+_session_user = contextvars.ContextVar("event_log_user", default=None)
+
+class EventBackend(logger.LogBackend):
+    # Appends one JSON object per line to the event file. Every block_records
+    # records, a summary of the finished block goes to the .idx sidecar: its
+    # byte range, time span, event types and a bitmask of the PIDs it holds.
+    # Queries read the index and then only the blocks that can match. The
+    # events written after the last full block are the unindexed tail, which
+    # queries always scan.
+    #
+    # Several processes (the shell and the dashboard) may append to the same
+    # file. Each write holds an exclusive flock on the event file while it
+    # appends and updates the index, and first folds in whatever the other
+    # writers appended since, so block offsets always match the file.
+    def __init__(self, path, block_records=BLOCK_RECORDS):
+        self.index_path = path + ".idx"
+        self.block_records = block_records
+        self._recover(path)
+        super().__init__(path, max_bytes=0)  # rotation would orphan the index
+
+    def _reset_block(self, start):
+        self._block_start = start
+        self._block_count = 0
+        self._block_t0 = None
+        self._block_t1 = None
+        self._block_pids = 0
+        self._block_types = set()
+
+    def _add_to_block(self, created, event_type, pid):
+        if self._block_t0 is None or created < self._block_t0:
+            self._block_t0 = created
+        if self._block_t1 is None or created > self._block_t1:
+            self._block_t1 = created
+        if pid is not None:
+            self._block_pids |= 1 << (pid % PID_MASK_BITS)
+        self._block_types.add(event_type)
+        self._block_count += 1
+
+    @contextlib.contextmanager
+    def _locked(self, f):
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _index_end(self):
+        # End of the last indexed block; 0 without an index
+        if not os.path.exists(self.index_path):
+            return 0
+        with open(self.index_path, "rb") as index:
+            index.seek(max(0, os.path.getsize(self.index_path) - 4096))
+            lines = index.read().splitlines()
+        for line in reversed(lines):
+            try:
+                return json.loads(line)["end"]
+            except (ValueError, KeyError):
+                continue
+        return 0
+
+    def _scan(self, f, start):
+        # Add the records from start to the end of the file to the open block
+        f.seek(start)
+        offset = start
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Drop a record cut short by a crash
+                f.truncate(offset)
+                break
+            offset += len(line)
+            event = json.loads(line)
+            self._add_to_block(event["ts"], event["type"], event.get("pid"))
+        self._end = offset
+
+    def _recover(self, path):
+        # Rebuild the open block from the tail the index does not cover yet
+        self._end = 0
+        if not os.path.exists(path):
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)  # the event file was removed
+            self._reset_block(0)
+            return
+        with open(path, "rb+") as f, self._locked(f):
+            end = self._index_end()
+            if end > os.fstat(f.fileno()).st_size:
+                # The event file was replaced; start a fresh index
+                os.remove(self.index_path)
+                end = 0
+            self._reset_block(end)
+            self._scan(f, end)
+
+    def _open(self):
+        return open(self.path, "ab+")
+
+    def _write(self, f, records):
+        with self._locked(f):
+            self._catch_up(f)
+            return self._append(f, records)
+
+    def _catch_up(self, f):
+        # Fold in what other processes appended since our last write
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == self._end:
+            return
+        end = self._index_end()
+        if end > self._block_start or size < self._end:
+            # They also finished the open block
+            self._reset_block(end)
+            self._scan(f, end)
+        else:
+            self._scan(f, self._end)
+
+    def _append(self, f, records):
+        offset = f.tell()
+        chunks = []
+        blocks = []
+        for created, level, (event_type, pid, user, fields) in records:
+            created = round(created, 6)
+            event = {"ts": created, "type": event_type, "pid": pid, "user": user}
+            if level != logger.INFO:
+                event["level"] = logger.LEVEL_NAMES.get(level, level)
+            event.update(fields)
+            line = (_encode(event) + "\n").encode()
+            chunks.append(line)
+            offset += len(line)
+            self._add_to_block(created, event_type, pid)
+            if self._block_count >= self.block_records:
+                blocks.append({
+                    "offset": self._block_start,
+                    "end": offset,
+                    "t0": self._block_t0,
+                    "t1": self._block_t1,
+                    "n": self._block_count,
+                    "pids": format(self._block_pids, "x"),
+                    "types": sorted(self._block_types),
+                })
+                self._reset_block(offset)
+        data = b"".join(chunks)
+        f.write(data)
+        f.flush()
+        self._end = offset
+        if blocks:
+            # Only index data that is already in the file
+            with open(self.index_path, "a") as index:
+                index.write("".join(json.dumps(block, separators=(",", ":")) + "\n" for block in blocks))
+        return len(data)
+
+def parse_time(value):
+    # Accepts epoch seconds, datetimes, "HH:MM[:SS]" (today) and
+    # "YYYY-MM-DD[ HH:MM[:SS]]" (a "T" separator also works)
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            clock = datetime.datetime.strptime(text, fmt).time()
+            return datetime.datetime.combine(datetime.date.today(), clock).timestamp()
+        except ValueError:
+            pass
+    try:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise ValueError(f"Unrecognised time: {value}")
+
+def format_event(event):
+    stamp = datetime.datetime.fromtimestamp(event["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+    parts = [f"[{stamp}]", event["type"]]
+    if event.get("pid") is not None:
+        parts.append(f"pid={event['pid']}")
+    if event.get("user") is not None:
+        parts.append(f"user={event['user']}")
+    for key, value in event.items():
+        if key not in ("ts", "type", "pid", "user"):
+            parts.append(f"{key}={value}")
+    return " ".join(parts)
+
+def _candidate_lines(data, needles):
+    # Lines of `data` containing every needle, found with bytes.find so the
+    # lines that cannot match are never split out or decoded
+    if not needles:
+        yield from data.splitlines()
+        return
+    first, rest = needles[0], needles[1:]
+    pos = data.find(first)
+    while pos != -1:
+        start = data.rfind(b"\n", 0, pos) + 1
+        end = data.find(b"\n", pos)
+        if end == -1:
+            end = len(data)
+        line = data[start:end]
+        if all(needle in line for needle in rest):
+            yield line
+        pos = data.find(first, end)
+
+class EventLog:
+    def __init__(self, log_file="events.jsonl"):
+        # Like Logger, nothing is opened until the first event or query
+        self.log_dir = "logs"
+        self.full_path = os.path.join(self.log_dir, log_file)
+        self._backend = None
+        self.current_user = None  # default user for recorded events (single-user CLI)
+        self._blocks = []
+        self._block_max_t1 = []  # running maximum of t1, for bisecting on `since`
+        self._index_read = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._backend = logger.get_backend(self.full_path, EventBackend)
+        return self._backend
+
+    @contextlib.contextmanager
+    def user_context(self, username):
+        # Events recorded inside the block, on this thread or task, default
+        # to username; for servers where each session runs on its own thread
+        token = _session_user.set(username)
+        try:
+            yield
+        finally:
+            _session_user.reset(token)
+
+    def record(self, event_type, pid=None, user=None, level=logger.INFO, **fields):
+        backend = self._backend
+        if backend is None:
+            if level < logger.default_level:
+                return
+            backend = self.backend
+        if level >= backend.level:
+            if user is None:
+                user = _session_user.get()
+                if user is None:
+                    user = self.current_user
+            backend.submit(level, (event_type, pid, user, fields))
+
+    def _load_index(self):
+        # Pick up index entries appended since the last query
+        index_path = self.backend.index_path
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "rb") as index:
+            index.seek(self._index_read)
+            data = index.read()
+        complete = data.rfind(b"\n") + 1
+        self._index_read += complete
+        for line in data[:complete].splitlines():
+            block = json.loads(line)
+            block["pids"] = int(block["pids"], 16)
+            block["types"] = set(block["types"])
+            self._blocks.append(block)
+            previous = self._block_max_t1[-1] if self._block_max_t1 else block["t1"]
+            self._block_max_t1.append(max(previous, block["t1"]))
+
+    def _ranges(self, since, until, pid, event_type):
+        blocks = self._blocks
+        first = bisect.bisect_left(self._block_max_t1, since) if since is not None else 0
+        bit = 1 << (pid % PID_MASK_BITS) if pid is not None else 0
+        ranges = []
+        for block in blocks[first:]:
+            if until is not None and block["t0"] > until:
+                continue
+            if bit and not block["pids"] & bit:
+                continue
+            if event_type is not None and event_type not in block["types"]:
+                continue
+            # One block per read, so a query holds at most one block in memory
+            ranges.append((block["offset"], block["end"]))
+        tail = blocks[-1]["end"] if blocks else 0
+        ranges.append((tail, None))  # the tail is shorter than a block
+        return ranges
+
+    def query(self, since=None, until=None, pid=None, event_type=None, user=None, limit=None,
+              newest_first=False):
+        # Yields matching events (dicts) in file order, or newest first, which
+        # finds the latest `limit` events without reading older blocks
+        since = parse_time(since)
+        until = parse_time(until)
+        self.backend.flush()
+        self._load_index()
+        # Cheap byte checks before decoding; "pid" is always followed by "user"
+        needles = []
+        if pid is not None:
+            needles.append(f'"pid":{pid},'.encode())
+        if event_type is not None:
+            needles.append(f'"type":{_encode(event_type)},'.encode())
+        found = 0
+        ranges = self._ranges(since, until, pid, event_type)
+        if newest_first:
+            ranges.reverse()
+        with open(self.full_path, "rb") as f:
+            for start, end in ranges:
+                if start:
+                    # Begin at a line boundary even if start is not one
+                    f.seek(start - 1)
+                    data = f.read() if end is None else f.read(end - start + 1)
+                    cut = data.find(b"\n")
+                    data = data[cut + 1:] if cut != -1 else b""
+                else:
+                    f.seek(0)
+                    data = f.read() if end is None else f.read(end)
+                lines = _candidate_lines(data, needles)
+                if newest_first:
+                    lines = reversed(list(lines))
+                for line in lines:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue  # a record still being appended, or damaged
+                    if since is not None and event["ts"] < since:
+                        continue
+                    if until is not None and event["ts"] > until:
+                        continue
+                    if pid is not None and event.get("pid") != pid:
+                        continue
+                    if event_type is not None and event["type"] != event_type:
+                        continue
+                    if user is not None and event.get("user") != user:
+                        continue
+                    yield event
+                    found += 1
+                    if limit is not None and found >= limit:
+                        return
+
+    def stats(self):
+        self.backend.flush()
+        self._load_index()
+        return {
+            "path": self.full_path,
+            "bytes": os.path.getsize(self.full_path) if os.path.exists(self.full_path) else 0,
+            "indexed_blocks": len(self._blocks),
+            "indexed_events": sum(block["n"] for block in self._blocks),
+        }
+
+# Global event log instance
+event_log = EventLog()
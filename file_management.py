@@ -1,9 +1,50 @@
 # file_management.py
+import base64
+import codecs
+import collections
+import fnmatch
+import glob
+import hashlib
+import itertools
+import mmap
 import os
-from cryptography.fernet import Fernet
+import stat
+import struct
+import sys
+import threading
 
+import singletons
 
+# Files that need it start with an 8-byte header: magic, version, flags and
+# two reserved bytes. Encrypted files are a header followed by frames of
+# (4-byte length, Fernet token), one token per CHUNK_SIZE bytes of plaintext,
+# so they can be streamed in constant memory. Plain files are stored as-is
+# and only get a header if their content would otherwise look like one.
+#
+# With FLAG_CHUNKED as well, the body is an AES-GCM container instead: a
+# sub-header (chunk size, plaintext length, random file id) and then
+# fixed-size frames of chunk_size ciphertext + 16-byte tag (the last one may
+# be shorter). Chunk i uses nonce file_id + i and authenticates i and a
+# "last chunk" flag, so chunks cannot be reordered, swapped between files or
+# truncated unnoticed. Chunks are independent: they are encrypted and
+# decrypted on a thread pool (OpenSSL releases the GIL), and any byte range
+# can be read by decrypting only the chunks that cover it.
+FILE_MAGIC = b"VOSF"
+FILE_VERSION = 1
+FLAG_ENCRYPTED = 0x01
+FLAG_CHUNKED = 0x02
+_HEADER = struct.Struct(">4sBBH")
+_FRAME = struct.Struct(">I")
+_GCM_HEADER = struct.Struct(">IQ8s")  # chunk size, plaintext length, file id
+_GCM_AAD = struct.Struct(">IB")  # chunk index, last chunk
+_GCM_TAG = 16
+CHUNK_SIZE = 64 * 1024
 
+# One row of a directory listing; path is relative to FileManager.base_dir
+FileEntry = collections.namedtuple("FileEntry", "name path kind size mtime")
+# Outcome of one FileManager.batch operation; error is None on success
+BatchResult = collections.namedtuple("BatchResult", "op name ok error")
+_temp_ids = itertools.count()
 
 
 
@@ -25,45 +66,305 @@ from cryptography.fernet import Fernet
 
 
 
+
+
+
+
+class ContentCache:
+    # LRU of decoded file contents bounded by total size in bytes. Entries are
+    # keyed by path and validated against (mtime_ns, size, inode), so edits
+    # made outside FileManager are noticed on the next read.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # {path: (stat_key, content, cost)}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, stat_key):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == stat_key:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(path)
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, path, stat_key, content):
+        cost = sys.getsizeof(content)
+        if cost > self.max_bytes:
+            return
+        with self.lock:
+            if path in self.entries:
+                self._drop(path)
+            self.entries[path] = (stat_key, content, cost)
+            self.bytes += cost
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, path):
+        with self.lock:
+            if path in self.entries:
+                self._drop(path)
+                self.invalidations += 1
+
+    def _drop(self, path):
+        self.bytes -= self.entries.pop(path)[2]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+class FileView:
+    # Read-only random access to the content of one file (header excluded).
+    # Plain files are mmapped and every read is a zero-copy memoryview into
+    # the mapping; AES-GCM files decrypt only the chunks a read touches.
+    # Views stay valid after close(): the mapping is released once the last
+    # memoryview into it is gone.
+    def __init__(self, manager, filepath):
+        self._manager = manager
+        self._file = manager._open_read(filepath)
+        self._map = None
+        self._data = None
+        try:
+            flags = manager._read_header(self._file)
+            self._base = self._file.tell()
+            self.encrypted = bool(flags & FLAG_ENCRYPTED)
+            if flags & FLAG_CHUNKED:
+                self.size = _GCM_HEADER.unpack(self._file.read(_GCM_HEADER.size))[1]
+            elif flags & FLAG_ENCRYPTED:
+                # Fernet frames have no random access; decrypt them once
+                self._data = memoryview(b"".join(manager._fernet_chunks(self._file)))
+                self.size = len(self._data)
+            elif manager.storage is not None:
+                # Backend files cannot be mapped; reads seek and copy instead
+                self.size = self._file.seek(0, os.SEEK_END) - self._base
+            else:
+                total = os.fstat(self._file.fileno()).st_size
+                self.size = total - self._base
+                if self.size:
+                    self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._data = memoryview(self._map)[self._base:]
+                else:
+                    self._data = memoryview(b"")
+        except BaseException:
+            self._file.close()
+            raise
+
+    def read(self, offset=0, length=None):
+        offset = max(0, offset)
+        if length is None:
+            length = self.size - offset
+        if self._data is not None:
+            return self._data[offset:offset + length]
+        if not self.encrypted:
+            self._file.seek(self._base + offset)
+            return memoryview(self._file.read(max(0, min(length, self.size - offset))))
+        self._file.seek(self._base)
+        return memoryview(self._manager._gcm_range(self._file, offset, length))
+
+    def windows(self, window_size, offset=0, length=None):
+        # Consecutive views of window_size bytes (the last may be shorter)
+        end = self.size if length is None else min(self.size, offset + length)
+        for start in range(max(0, offset), end, window_size):
+            yield self.read(start, min(window_size, end - start))
+
+    def head(self, lines=10):
+        # View of the first `lines` lines
+        if self._map is not None:
+            pos = self._base
+            for _ in range(lines):
+                pos = self._map.find(b"\n", pos)
+                if pos == -1:
+                    return self.read()
+                pos += 1
+            return self.read(0, pos - self._base)
+        end = 0
+        for window in self.windows(CHUNK_SIZE):
+            data = bytes(window)
+            pos = -1
+            while lines:
+                pos = data.find(b"\n", pos + 1)
+                if pos == -1:
+                    break
+                lines -= 1
+            if not lines:
+                return self.read(0, end + pos + 1)
+            end += len(data)
+        return self.read()
+
+    def tail(self, lines=10):
+        # View of the last `lines` lines (a final newline does not count)
+        if not self.size or not lines:
+            return self.read(self.size, 0)
+        if self._map is not None:
+            end = self._base + self.size
+            if self._map[end - 1:end] == b"\n":
+                end -= 1
+            pos = end
+            for _ in range(lines):
+                pos = self._map.rfind(b"\n", self._base, pos)
+                if pos == -1:
+                    return self.read()
+            return self.read(pos + 1 - self._base)
+        end = self.size
+        if bytes(self.read(end - 1, 1)) == b"\n":
+            end -= 1
+        while end > 0:
+            start = max(0, end - CHUNK_SIZE)
+            data = bytes(self.read(start, end - start))
+            pos = len(data)
+            while lines:
+                pos = data.rfind(b"\n", 0, pos)
+                if pos == -1:
+                    break
+                lines -= 1
+            if not lines:
+                return self.read(start + pos + 1)
+            end = start
+        return self.read()
+
+    def close(self):
+        self._data = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # views are still in use; freed with the last of them
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 class FileManager:
-    def __init__(self, base_dir='data', logger=None):
+    def __init__(self, base_dir='data', logger=None, crypto_workers=None, cache_bytes=0, storage=None):
         # Convert to absolute path and normalize
         self.base_dir = os.path.normpath(os.path.abspath(base_dir))
         self.logger = logger
-        os.makedirs(self.base_dir, exist_ok=True)
-        
-        # Debug output - will appear in terminal
-        print(f"FILE MANAGER INITIALIZED\n"
-              f"Storage directory: {self.base_dir}\n"
-              f"Directory exists: {os.path.exists(self.base_dir)}\n"
-              f"Write test file...")
-              
-        # Test file creation during init
-        test_file = os.path.join(self.base_dir, "__testfile__.tmp")
-        try:
-            with open(test_file, 'w') as f:
-                f.write("test")
-            os.remove(test_file)
-            print("SUCCESS: Test file created/deleted successfully")
-        except Exception as e:
-            print(f"CRITICAL ERROR: Cannot write to {self.base_dir}\n{str(e)}")
+        if storage is None:
+            os.makedirs(self.base_dir, exist_ok=True)
 
-        self.key = Fernet.generate_key()
-        self.cipher = Fernet(self.key)
+        # Same format as Fernet.generate_key(); the ciphers themselves (and
+        # cryptography) are only loaded once something is encrypted
+        self.key = base64.urlsafe_b64encode(os.urandom(32))
+        self._cipher = None
+        self._gcm = None
+        self.crypto_workers = crypto_workers or os.cpu_count() or 1
+        self._pool = None
+        self._io_pool = None
+        self.io_workers = 8  # threads for batch()
+        # Opt-in: cache_bytes > 0 keeps recently read contents in memory
+        self.cache = ContentCache(cache_bytes) if cache_bytes else None
+        # {directory: (mtime_ns, sorted entries)}, most recently used last
+        self._dir_index = collections.OrderedDict()
+        self._dir_index_size = 32
+        self._dir_lock = threading.Lock()
+        # None stores files directly under base_dir; see the storage hooks
+        self.storage = storage
 
     def get_full_path(self, path):
         return os.path.join(self.base_dir, path)
 
+    @property
+    def cipher(self):
+        # Fernet, for files written before chunked AES-GCM
+        if self._cipher is None:
+            from cryptography.fernet import Fernet
+            self._cipher = Fernet(self.key)
+        return self._cipher
+
+    @property
+    def gcm(self):
+        if self._gcm is None:
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+            self._gcm = AESGCM(hashlib.sha256(b"VOSF chunked AES-GCM" + self.key).digest())
+        return self._gcm
+
+    # Storage hooks. Without a backend, files live under base_dir on the host.
+    # A storage backend (e.g. dedup_storage.DedupStorage) takes "/"-separated
+    # paths relative to base_dir and provides:
+    #   open_read(path) / open_write(path) - seekable binary file objects; a
+    #       write becomes visible when its file object is closed
+    #   isfile, isdir, remove, makedirs(path)
+    #   scandir(path) - FileEntry rows of one directory
+    #   stat_key(path) - value that changes whenever the file does
+    #   stats() - backend-specific usage report
+    def _key(self, filepath):
+        filepath = os.path.normpath(filepath)
+        if filepath.startswith(self.base_dir + os.sep):
+            rel = filepath[len(self.base_dir) + 1:]
+        else:
+            rel = os.path.relpath(filepath, self.base_dir)
+        return "" if rel == "." else rel.replace(os.sep, "/")
+
+    def _open_read(self, filepath):
+        if self.storage is not None:
+            return self.storage.open_read(self._key(filepath))
+        return open(filepath, 'rb')
+
+    def _open_write(self, filepath):
+        if self.storage is not None:
+            return self.storage.open_write(self._key(filepath))
+        return open(filepath, 'wb')
+
+    def _isfile(self, filepath):
+        if self.storage is not None:
+            return self.storage.isfile(self._key(filepath))
+        return os.path.isfile(filepath)
+
+    def _remove(self, filepath):
+        if self.storage is not None:
+            return self.storage.remove(self._key(filepath))
+        os.remove(filepath)
+
+    def _makedirs(self, dirpath):
+        if self.storage is not None:
+            return self.storage.makedirs(self._key(dirpath))
+        os.makedirs(dirpath, exist_ok=True)
+
+    def _stat_key(self, filepath):
+        if self.storage is not None:
+            return self.storage.stat_key(self._key(filepath))
+        st = os.stat(filepath)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def storage_stats(self):
+        return self.storage.stats() if self.storage is not None else None
+
     def create_file(self, filename):
         filepath = self.get_full_path(filename)
         try:
-            # Double-check directory exists
-            os.makedirs(self.base_dir, exist_ok=True)
+            # Double-check directory exists (storage backends have no host directory)
+            if self.storage is None:
+                os.makedirs(self.base_dir, exist_ok=True)
             
             # Verify we can write
-            with open(filepath, 'w') as f:
-                f.write("")  # Create empty file
+            if self.cache:
+                self.cache.invalidate(filepath)
+            with self._open_write(filepath):
+                pass  # Create empty file
+            self._forget_directory(filepath)
                 
             msg = f"File created: {filepath}"
             if self.logger:
@@ -80,8 +381,11 @@ class FileManager:
 
     def delete_file(self, filename):
         filepath = self.get_full_path(filename)
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        if self._isfile(filepath):
+            self._remove(filepath)
+            if self.cache:
+                self.cache.invalidate(filepath)
+            self._forget_directory(filepath)
             msg = f"File deleted: {filename}"
             if self.logger:
                 self.logger.log(msg)
@@ -94,41 +398,305 @@ class FileManager:
             print(msg)
             return False
 
-    def read_file(self, filename):
+    def _read_header(self, f):
+        # Returns the header flags and leaves f at the start of the content
+        head = f.read(_HEADER.size)
+        if len(head) == _HEADER.size:
+            magic, version, flags, _ = _HEADER.unpack(head)
+            if magic == FILE_MAGIC:
+                if version != FILE_VERSION:
+                    raise ValueError(f"Unsupported file format version {version}")
+                return flags
+        f.seek(0)
+        return 0
+
+    def is_encrypted(self, filename):
+        with self._open_read(self.get_full_path(filename)) as f:
+            return bool(self._read_header(f) & FLAG_ENCRYPTED)
+
+    def _parallel(self, fn, items):
+        # Ordered map over the crypto pool, with a bounded number of chunks in
+        # flight so memory stays constant however large the file is
+        if self.crypto_workers <= 1:
+            for args in items:
+                yield fn(*args)
+            return
+        if self._pool is None:
+            from concurrent.futures import ThreadPoolExecutor  # not needed at startup
+            self._pool = ThreadPoolExecutor(self.crypto_workers, thread_name_prefix="file-crypto")
+        window = self.crypto_workers * 2
+        pending = collections.deque()
+        for args in items:
+            pending.append(self._pool.submit(fn, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def _gcm_nonce(self, file_id, index):
+        return file_id + _FRAME.pack(index)
+
+    def _gcm_encrypt(self, file_id, index, chunk, last):
+        return self.gcm.encrypt(self._gcm_nonce(file_id, index), chunk, _GCM_AAD.pack(index, last))
+
+    def _gcm_decrypt(self, file_id, index, frame, last):
+        try:
+            return self.gcm.decrypt(self._gcm_nonce(file_id, index), frame, _GCM_AAD.pack(index, last))
+        except Exception as e:
+            from cryptography.exceptions import InvalidTag
+            if isinstance(e, InvalidTag):
+                raise ValueError(f"Encrypted chunk {index} failed authentication (wrong key or corrupted file)")
+            raise
+
+    def _gcm_chunks(self, f, first=0, stop=None):
+        # Decrypted chunks first..stop-1 of an AES-GCM container; f is
+        # positioned just after the main header
+        chunk_size, length, file_id = _GCM_HEADER.unpack(f.read(_GCM_HEADER.size))
+        count = -(-length // chunk_size)
+        stop = count if stop is None else min(stop, count)
+        f.seek(first * (chunk_size + _GCM_TAG), os.SEEK_CUR)
+
+        def frames():
+            for index in range(first, stop):
+                size = min(chunk_size, length - index * chunk_size) + _GCM_TAG
+                frame = f.read(size)
+                if len(frame) < size:
+                    raise ValueError("Truncated encrypted file")
+                yield file_id, index, frame, index == count - 1
+
+        return self._parallel(self._gcm_decrypt, frames())
+
+    def _fernet_chunks(self, f):
+        while True:
+            frame = f.read(_FRAME.size)
+            if not frame:
+                break
+            if len(frame) < _FRAME.size:
+                raise ValueError("Truncated encrypted file")
+            (length,) = _FRAME.unpack(frame)
+            token = f.read(length)
+            if len(token) < length:
+                raise ValueError("Truncated encrypted file")
+            yield self.cipher.decrypt(token)
+
+    def _read_chunks(self, filepath, chunk_size):
+        with self._open_read(filepath) as f:
+            flags = self._read_header(f)
+            if flags & FLAG_CHUNKED:
+                yield from self._gcm_chunks(f)
+            elif flags & FLAG_ENCRYPTED:
+                yield from self._fernet_chunks(f)
+            else:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    def _gcm_range(self, f, offset, length):
+        # Plaintext bytes [offset, offset + length) of an AES-GCM container;
+        # f is positioned just after the main header
+        start = f.tell()
+        chunk_size, total, _ = _GCM_HEADER.unpack(f.read(_GCM_HEADER.size))
+        end = min(offset + length, total)
+        if offset >= end:
+            return b""
+        first = offset // chunk_size
+        f.seek(start)
+        data = b"".join(self._gcm_chunks(f, first, (end - 1) // chunk_size + 1))
+        skip = offset - first * chunk_size
+        return data[skip:skip + end - offset]
+
+    def read_range(self, filename, offset, length):
+        # Bytes [offset, offset + length) of the plaintext. Chunked AES-GCM
+        # files only decrypt the chunks covering the range.
         filepath = self.get_full_path(filename)
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'r') as f:
-                    content = f.read()
-                    # Try to decrypt if encrypted
-                    try:
-                        content = self.cipher.decrypt(content.encode()).decode()
-                    except:
-                        pass  # Not encrypted or wrong key
-                    msg = f"File read: {filename}"
-                    if self.logger:
-                        self.logger.log(msg)
-                    print(content)
-                    return content
-            except Exception as e:
-                msg = f"Error reading file: {str(e)}"
-                if self.logger:
-                    self.logger.log(msg)
-                print(msg)
-                return None
-        else:
+        if not self._isfile(filepath):
             msg = f"Error: File '{filename}' not found."
             if self.logger:
                 self.logger.log(msg)
             print(msg)
             return None
+        try:
+            with self._open_read(filepath) as f:
+                flags = self._read_header(f)
+                if flags & FLAG_CHUNKED:
+                    return self._gcm_range(f, offset, length)
+                if flags & FLAG_ENCRYPTED:
+                    # Fernet frames are variable-sized, so walk them in order
+                    parts = []
+                    position = 0
+                    for chunk in self._fernet_chunks(f):
+                        if position + len(chunk) > offset:
+                            parts.append(chunk[max(0, offset - position):offset + length - position])
+                        position += len(chunk)
+                        if position >= offset + length:
+                            break
+                    return b"".join(parts)
+                f.seek(offset, os.SEEK_CUR)
+                return f.read(length)
+        except Exception as e:
+            msg = f"Error reading file: {str(e)}"
+            if self.logger:
+                self.logger.log(msg)
+            print(msg)
+            return None
 
-    def write_file(self, filename, content, encrypt=False):
+    def open_view(self, filename):
+        # FileView over a file, or None if it cannot be opened
+        filepath = self.get_full_path(filename)
+        if not self._isfile(filepath):
+            msg = f"Error: File '{filename}' not found."
+            if self.logger:
+                self.logger.log(msg)
+            print(msg)
+            return None
+        try:
+            return FileView(self, filepath)
+        except Exception as e:
+            msg = f"Error reading file: {str(e)}"
+            if self.logger:
+                self.logger.log(msg)
+            print(msg)
+            return None
+
+    def read_view(self, filename, offset=0, length=None):
+        # memoryview of a byte range; zero-copy for plain files
+        view = self.open_view(filename)
+        if view is None:
+            return None
+        with view:
+            return view.read(offset, length)
+
+    def iter_windows(self, filename, window_size=CHUNK_SIZE, offset=0, length=None):
+        # memoryviews over consecutive windows of a file
+        view = self.open_view(filename)
+        if view is None:
+            return
+        with view:
+            yield from view.windows(window_size, offset, length)
+
+    def _decode_chunks(self, chunks):
+        # Chunk boundaries may split a multi-byte character
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in chunks:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+
+    def iter_read(self, filename, chunk_size=CHUNK_SIZE, binary=False):
+        # Generator over the file contents (str, or bytes with binary=True),
+        # decrypting one chunk at a time. Returns None if the file is missing.
         filepath = self.get_full_path(filename)
+        if not self._isfile(filepath):
+            msg = f"Error: File '{filename}' not found."
+            if self.logger:
+                self.logger.log(msg)
+            print(msg)
+            return None
+        msg = f"File read: {filename}"
+        if self.logger:
+            self.logger.log(msg)
+        chunks = self._read_chunks(filepath, chunk_size)
+        return chunks if binary else self._decode_chunks(chunks)
+
+    def read_file(self, filename):
         try:
-            data = self.cipher.encrypt(content.encode()) if encrypt else content
-            with open(filepath, 'w') as f:
-                f.write(data if isinstance(data, str) else data.decode())
+            stat_key = None
+            if self.cache:
+                filepath = self.get_full_path(filename)
+                try:
+                    stat_key = self._stat_key(filepath)
+                except FileNotFoundError:
+                    pass
+                else:
+                    content = self.cache.get(filepath, stat_key)
+                    if content is not None:
+                        if self.logger:
+                            self.logger.log(f"File read: {filename} (cached)")
+                        print(content)
+                        return content
+            chunks = self.iter_read(filename)
+            if chunks is None:
+                return None
+            content = "".join(chunks)
+            if stat_key is not None:
+                self.cache.put(filepath, stat_key, content)
+            print(content)
+            return content
+        except Exception as e:
+            msg = f"Error reading file: {str(e)}"
+            if self.logger:
+                self.logger.log(msg)
+            print(msg)
+            return None
+
+    def _split_chunks(self, content, chunk_size):
+        if isinstance(content, str):
+            content = content.encode()
+        view = memoryview(content)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+
+    def _encode_chunks(self, chunks, chunk_size):
+        # Re-block an iterable of str/bytes into chunk_size pieces of bytes
+        pending = bytearray()
+        for chunk in chunks:
+            pending += chunk.encode() if isinstance(chunk, str) else chunk
+            while len(pending) >= chunk_size:
+                yield bytes(pending[:chunk_size])
+                del pending[:chunk_size]
+        if pending:
+            yield bytes(pending)
+
+    def _write_body(self, f, chunks, encrypt, chunk_size):
+        # Header (if any) and content of a file, written to an open binary f
+        if encrypt:
+            f.write(_HEADER.pack(FILE_MAGIC, FILE_VERSION, FLAG_ENCRYPTED | FLAG_CHUNKED, 0))
+            container = f.tell()
+            file_id = os.urandom(8)
+            f.write(_GCM_HEADER.pack(chunk_size, 0, file_id))
+            length = 0
+
+            def numbered():
+                # Look one chunk ahead to know which one is last
+                nonlocal length
+                index = 0
+                previous = None
+                for chunk in self._encode_chunks(chunks, chunk_size):
+                    if previous is not None:
+                        yield file_id, index - 1, previous, False
+                    previous = chunk
+                    length += len(chunk)
+                    index += 1
+                if previous is not None:
+                    yield file_id, index - 1, previous, True
+
+            for frame in self._parallel(self._gcm_encrypt, numbered()):
+                f.write(frame)
+            f.seek(container)
+            f.write(_GCM_HEADER.pack(chunk_size, length, file_id))
+        else:
+            first = True
+            for chunk in self._encode_chunks(chunks, chunk_size):
+                if first and chunk[:len(FILE_MAGIC)] == FILE_MAGIC:
+                    # Keep plain content from being mistaken for a header
+                    f.write(_HEADER.pack(FILE_MAGIC, FILE_VERSION, 0, 0))
+                first = False
+                f.write(chunk)
+
+    def write_stream(self, filename, chunks, encrypt=False, chunk_size=CHUNK_SIZE):
+        # Write an iterable of str/bytes chunks, encrypting chunk by chunk
+        filepath = self.get_full_path(filename)
+        if self.cache:
+            self.cache.invalidate(filepath)
+        try:
+            with self._open_write(filepath) as f:
+                self._write_body(f, chunks, encrypt, chunk_size)
+            self._forget_directory(filepath)
             msg = f"File written: {filename} (encrypted: {encrypt})"
             if self.logger:
                 self.logger.log(msg)
@@ -141,10 +709,124 @@ class FileManager:
             print(msg)
             return False
 
+    def write_file(self, filename, content, encrypt=False):
+        return self.write_stream(filename, self._split_chunks(content, CHUNK_SIZE), encrypt)
+
+    def _atomic_write(self, filepath, content, encrypt, durable):
+        # Write to a temporary file beside the target, flush it to disk, then
+        # rename it over the target: readers see the old or the new file,
+        # never a partial one, even after a crash
+        directory, name = os.path.split(filepath)
+        temp = os.path.join(directory, f".{name}.{os.getpid()}.{next(_temp_ids)}.tmp")
+        try:
+            with open(temp, 'wb') as f:
+                self._write_body(f, self._split_chunks(content, CHUNK_SIZE), encrypt, CHUNK_SIZE)
+                if durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp, filepath)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+
+    def _run_batch_item(self, op, filepath, args, durable):
+        if op in ("write", "create"):
+            content = args[0] if args else ""
+            encrypt = args[1] if len(args) > 1 else False
+            if self.storage is not None:
+                # Backends publish a file only when its writer is closed
+                with self._open_write(filepath) as f:
+                    self._write_body(f, self._split_chunks(content, CHUNK_SIZE), encrypt, CHUNK_SIZE)
+            else:
+                self._atomic_write(filepath, content, encrypt, durable)
+        elif op == "delete":
+            self._remove(filepath)
+        else:
+            raise ValueError(f"Unknown batch operation: {op}")
+
+    def batch(self, operations, durable=True):
+        # Run many file operations in one call on a thread pool. Each
+        # operation is a tuple:
+        #   ("write", name, content[, encrypt]), ("create", name),
+        #   ("delete", name) or ("mkdir", name)
+        # Writes are atomic (temp file + rename). With durable=True every
+        # file is fsynced before its rename and each touched directory is
+        # fsynced once at the end, instead of once per file. Operations on
+        # the same path run in the given order, and directories are created
+        # before anything else. Returns one BatchResult per operation, in
+        # order; failures do not stop the rest of the batch.
+        operations = list(operations)
+        results = [None] * len(operations)
+        by_path = {}
+        for i, (op, name, *args) in enumerate(operations):
+            filepath = os.path.normpath(self.get_full_path(name))
+            if op == "mkdir":
+                try:
+                    self._makedirs(filepath)
+                    results[i] = BatchResult(op, name, True, None)
+                except Exception as e:
+                    results[i] = BatchResult(op, name, False, str(e))
+                continue
+            by_path.setdefault(filepath, []).append((i, op, name, args))
+
+        def run_groups(groups):
+            for filepath, items in groups:
+                for i, op, name, args in items:
+                    try:
+                        self._run_batch_item(op, filepath, args, durable)
+                        results[i] = BatchResult(op, name, True, None)
+                    except Exception as e:
+                        results[i] = BatchResult(op, name, False, str(e))
+
+        # A few slices per thread keeps the pool busy without a future per file
+        groups = list(by_path.items())
+        slices = min(len(groups), self.io_workers * 4) or 1
+        if self._io_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._io_pool = ThreadPoolExecutor(self.io_workers, thread_name_prefix="file-batch")
+        for future in [self._io_pool.submit(run_groups, groups[k::slices]) for k in range(slices)]:
+            future.result()
+
+        directories = {os.path.dirname(path) for path in by_path}
+        if durable and self.storage is None:
+            for directory in directories:
+                try:
+                    fd = os.open(directory, os.O_RDONLY)
+                except OSError:
+                    continue
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        for filepath in by_path:
+            if self.cache:
+                self.cache.invalidate(filepath)
+            self._forget_directory(filepath)
+
+        failed = sum(1 for result in results if not result.ok)
+        msg = f"Batch completed: {len(results)} operations, {failed} failed"
+        if self.logger:
+            self.logger.log(msg)
+        print(msg)
+        return results
+
+    def write_files(self, files, encrypt=False, durable=True):
+        # files: {name: content}
+        return self.batch((("write", name, content, encrypt) for name, content in files.items()), durable)
+
+    def delete_files(self, names, durable=True):
+        return self.batch((("delete", name) for name in names), durable)
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache else None
+
     def create_directory(self, dirname):
         dirpath = self.get_full_path(dirname)
         try:
-            os.makedirs(dirpath, exist_ok=True)
+            self._makedirs(dirpath)
             msg = f"Directory created: {dirname}"
             if self.logger:
                 self.logger.log(msg)
@@ -157,20 +839,134 @@ class FileManager:
             print(msg)
             return False
 
-    def list_directory(self, path="."):
+    def _prefix(self, dirpath):
+        # Relative path of a directory under base_dir, ready to prepend to names
+        rel = os.path.relpath(dirpath, self.base_dir)
+        return "" if rel == "." else rel + os.sep
+
+    def _entry(self, entry, prefix):
+        # FileEntry from an os.DirEntry; scandir already knows the type, so
+        # only size and mtime cost a stat (lstat: links are not followed)
+        info = entry.stat(follow_symlinks=False)
+        if entry.is_symlink():
+            kind = "link"
+        elif stat.S_ISDIR(info.st_mode):
+            kind = "dir"
+        elif stat.S_ISREG(info.st_mode):
+            kind = "file"
+        else:
+            kind = "other"
+        return FileEntry(entry.name, prefix + entry.name, kind, info.st_size, info.st_mtime)
+
+    def scan_directory(self, path="."):
+        # Stream the entries of one directory, unsorted, without caching
         dirpath = self.get_full_path(path)
+        if self.storage is not None:
+            yield from self.storage.scandir(self._key(dirpath))
+            return
+        prefix = self._prefix(dirpath)
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                try:
+                    yield self._entry(entry, prefix)
+                except FileNotFoundError:
+                    continue  # removed while we were listing
+
+    def _forget_directory(self, filepath):
+        with self._dir_lock:
+            self._dir_index.pop(os.path.dirname(os.path.normpath(filepath)), None)
+
+    def directory_index(self, path=".", refresh=False):
+        # Sorted entries of a directory, rebuilt only when the directory's
+        # mtime changes (an entry was added, removed or renamed) or when a
+        # file in it was written through this FileManager. Edits to file
+        # contents made elsewhere show up after refresh=True.
+        if self.storage is not None:
+            # Backend listings come from their own index; nothing to cache
+            return sorted(self.scan_directory(path), key=lambda entry: (entry.kind != "dir", entry.name))
+        dirpath = os.path.normpath(self.get_full_path(path))
+        mtime = os.stat(dirpath).st_mtime_ns
+        with self._dir_lock:
+            cached = self._dir_index.get(dirpath)
+            if cached is not None and cached[0] == mtime and not refresh:
+                self._dir_index.move_to_end(dirpath)
+                return cached[1]
+        entries = sorted(self.scan_directory(path), key=lambda entry: (entry.kind != "dir", entry.name))
+        with self._dir_lock:
+            self._dir_index[dirpath] = (mtime, entries)
+            self._dir_index.move_to_end(dirpath)
+            while len(self._dir_index) > self._dir_index_size:
+                self._dir_index.popitem(last=False)
+        return entries
+
+    def list_page(self, path=".", page=0, page_size=100, refresh=False):
+        # One page of a directory listing (directories first, then by name).
+        # Returns (entries, total) or None if the directory cannot be listed.
         try:
-            contents = os.listdir(dirpath)
-            msg = f"Directory listed: {path}"
-            if self.logger:
-                self.logger.log(msg)
-            return contents
+            entries = self.directory_index(path, refresh)
         except Exception as e:
             msg = f"Error listing directory: {str(e)}"
             if self.logger:
                 self.logger.log(msg)
             print(msg)
+            return None
+        msg = f"Directory listed: {path} (page {page})"
+        if self.logger:
+            self.logger.log(msg)
+        if page_size is None:
+            return entries, len(entries)
+        start = page * page_size
+        return entries[start:start + page_size], len(entries)
+
+    def walk(self, path="."):
+        # Recursive, depth-first stream of every entry below path
+        if self.storage is not None:
+            stack = [path]
+            while stack:
+                for entry in self.scan_directory(stack.pop()):
+                    if entry.kind == "dir":
+                        stack.append(entry.path)
+                    yield entry
+            return
+        stack = [self.get_full_path(path)]
+        while stack:
+            dirpath = stack.pop()
+            try:
+                scanner = os.scandir(dirpath)
+            except OSError:
+                continue
+            prefix = self._prefix(dirpath)
+            with scanner:
+                for entry in scanner:
+                    try:
+                        item = self._entry(entry, prefix)
+                    except FileNotFoundError:
+                        continue
+                    if item.kind == "dir":
+                        stack.append(entry.path)
+                    yield item
+
+    def glob(self, pattern, path="."):
+        # Paths (relative to base_dir) matching a glob; "**" recurses
+        root = os.path.normpath(self.get_full_path(path))
+        if self.storage is not None:
+            # fnmatch over a walk; "*" may also match across "/" here
+            prefix = self._prefix(root).replace(os.sep, "/")
+            patterns = [prefix + pattern]
+            if pattern.startswith("**/"):
+                patterns.append(prefix + pattern[3:])
+            for entry in self.walk(path):
+                if any(fnmatch.fnmatchcase(entry.path, p) for p in patterns):
+                    yield entry.path
+            return
+        for match in glob.iglob(pattern, root_dir=root, recursive=True):
+            yield os.path.relpath(os.path.join(root, match), self.base_dir)
+
+    def list_directory(self, path="."):
+        result = self.list_page(path, page_size=None)
+        if result is None:
             return []
+        return [entry.name for entry in result[0]]
 
-# Default instance without logger for backward compatibility
-file_manager = FileManager()
\ No newline at end of file
+# Default instance without logger for backward compatibility, built on first use
+get_file_manager, __getattr__ = singletons.lazy(__name__, "file_manager", FileManager)
\ No newline at end of file
@@ -1,31 +1,441 @@
+import contextlib
+import struct
+import threading
+import time
 import logger
+from event_log import event_log
 
-system_logger = logger.Logger()
+system_logger = logger.system_logger
+
+_SEQ = struct.Struct("<Q")  # shared segment header: sequence number,
+_LENGTH = struct.Struct("<Q")  # then payload length
+_HEADER_SIZE = _SEQ.size + _LENGTH.size
+_created = set()  # shared_memory names of segments created by this process
+
+class Mailbox:
+    # Bounded FIFO of (sender_pid, message) in a fixed ring of slots.
+    # Batches go in and out with at most two slice copies, and threads can
+    # wait on it for space or for messages.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.head = 0
+        self.count = 0
+        self.sent = 0
+        self.received = 0
+        self.rejected = 0  # messages refused because the mailbox was full
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.waiting_receiver = False  # owner parked in ProcessManager.blocked_queue
+        self.waiting_senders = {}  # {pid: None} parked until there is space
+
+    def _put(self, items):
+        # Append as many items as fit (lock held); returns how many
+        count = min(len(items), self.capacity - self.count)
+        if count:
+            start = (self.head + self.count) % self.capacity
+            first = min(count, self.capacity - start)
+            self.slots[start:start + first] = items[:first]
+            if count > first:
+                self.slots[:count - first] = items[first:count]
+            self.count += count
+            self.sent += count
+            self.not_empty.notify()
+        return count
+
+    def _get(self, limit):
+        # Remove up to limit items, oldest first (lock held)
+        count = self.count if limit is None else min(limit, self.count)
+        if not count:
+            return []
+        first = min(count, self.capacity - self.head)
+        items = self.slots[self.head:self.head + first]
+        self.slots[self.head:self.head + first] = [None] * first
+        if count > first:
+            items += self.slots[:count - first]
+            self.slots[:count - first] = [None] * (count - first)
+        self.head = (self.head + count) % self.capacity
+        self.count -= count
+        self.received += count
+        self.not_full.notify_all()
+        return items
+
+    def stats(self):
+        return {
+            "queued": self.count,
+            "capacity": self.capacity,
+            "sent": self.sent,
+            "received": self.received,
+            "rejected": self.rejected,
+        }
+
+class SharedSegment:
+    # A named multiprocessing.shared_memory block that other OS processes
+    # attach to by name (SharedSegment.attach), so large buffers are shared
+    # instead of pickled. Layout: 8-byte sequence number, 8-byte payload
+    # length, then up to size bytes of payload.
+    #
+    # The sequence number is a seqlock: a write makes it odd, changes the
+    # payload and makes it even again; version is half of it. read() retries
+    # until it copies the payload without a write in between. view() and
+    # array() hand out zero-copy views with the version they were taken at,
+    # and a reader that needs a consistent result checks changed(version)
+    # after using them. Writes must not overlap (one writer at a time);
+    # readers never block a writer.
+    def __init__(self, name=None, size=0, create=True):
+        import multiprocessing
+        from multiprocessing import resource_tracker, shared_memory
+        if create:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=_HEADER_SIZE + size)
+            _created.add(self.shm._name)
+        else:
+            try:
+                self.shm = shared_memory.SharedMemory(name, track=False)  # Python 3.13+
+            except TypeError:
+                # Older versions register attached segments with the resource
+                # tracker, which unlinks them when its processes exit.
+                # Processes started by multiprocessing share their parent's
+                # tracker, where that is harmless; any other process takes
+                # the segment back off its own tracker.
+                self.shm = shared_memory.SharedMemory(name)
+                if multiprocessing.parent_process() is None and self.shm._name not in _created:
+                    resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.payload = self.buf[_HEADER_SIZE:]
+        self.size = size if create else len(self.payload)
+        self.owner = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def attach(cls, name):
+        return cls(name, create=False)
+
+    @property
+    def version(self):
+        return _SEQ.unpack_from(self.buf)[0] >> 1
+
+    def changed(self, version):
+        # True if a write started since version was read
+        return _SEQ.unpack_from(self.buf)[0] != version << 1
+
+    @contextlib.contextmanager
+    def writing(self, length=None):
+        # Write section yielding the whole payload buffer for in-place
+        # updates; length, if given, becomes the new payload length
+        with self._lock:
+            seq = _SEQ.unpack_from(self.buf)[0]
+            _SEQ.pack_into(self.buf, 0, seq + 1)
+            try:
+                yield self.payload[:self.size]
+            finally:
+                if length is not None:
+                    _LENGTH.pack_into(self.buf, _SEQ.size, length)
+                _SEQ.pack_into(self.buf, 0, seq + 2)
+
+    def write(self, data):
+        # Replace the payload with a bytes-like object
+        data = memoryview(data).cast("B")
+        if data.nbytes > self.size:
+            print(f"{data.nbytes} bytes do not fit in shared segment {self.name} ({self.size} bytes)")
+            return False
+        with self.writing(data.nbytes) as payload:
+            payload[:data.nbytes] = data
+        return True
+
+    def update(self, offset, data):
+        # Overwrite part of the current payload in place
+        data = memoryview(data).cast("B")
+        if offset < 0 or offset + data.nbytes > _LENGTH.unpack_from(self.buf, _SEQ.size)[0]:
+            print(f"Update outside the payload of shared segment {self.name}")
+            return False
+        with self.writing() as payload:
+            payload[offset:offset + data.nbytes] = data
+        return True
+
+    def read(self):
+        # Consistent copy of the payload
+        while True:
+            seq = _SEQ.unpack_from(self.buf)[0]
+            if not seq & 1:
+                data = bytes(self.payload[:_LENGTH.unpack_from(self.buf, _SEQ.size)[0]])
+                if _SEQ.unpack_from(self.buf)[0] == seq:
+                    return data
+            time.sleep(0)
+
+    def view(self):
+        # (memoryview of the payload, version), without copying
+        while True:
+            seq = _SEQ.unpack_from(self.buf)[0]
+            if not seq & 1:
+                return self.payload[:_LENGTH.unpack_from(self.buf, _SEQ.size)[0]], seq >> 1
+            time.sleep(0)
+
+    def array(self, dtype="uint8", shape=None):
+        # (NumPy array over the payload, version), or (None, None) without numpy
+        from memory_management import load_numpy
+        np = load_numpy()
+        if np is None:
+            print("NumPy is not installed")
+            return None, None
+        view, version = self.view()
+        array = np.frombuffer(view, dtype=dtype)
+        return (array if shape is None else array.reshape(shape)), version
+
+    def close(self):
+        # Unmap the segment in this process; False while views handed out
+        # by view() or array() are still alive
+        self.payload.release()
+        try:
+            self.shm.close()
+        except BufferError:
+            print(f"Shared segment {self.name} is still in use; it stays mapped until its views are released")
+            return False
+        return True
+
+    def unlink(self):
+        # Remove the name; processes that have it mapped keep their mapping
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "size": self.size,
+            "length": _LENGTH.unpack_from(self.buf, _SEQ.size)[0],
+            "version": self.version,
+            "owner": self.owner,
+        }
 
 class IPC:
-    def __init__(self):
-        self.messages = {}  # {receiver_pid: [(sender_pid, message)]}
+    # Message passing between PIDs through one bounded Mailbox each.
+    #
+    # A full mailbox pushes back on its senders and an empty one makes a
+    # receiver wait, in one of two ways:
+    # - PIDs of simulated processes (with a process_manager set) have no
+    #   thread to suspend, so block=True parks the process in
+    #   ProcessManager.blocked_queue instead and the call returns at once
+    #   (0 sent / no messages). The process is woken when the mailbox
+    #   changes and retries, so message-driven processes never busy-poll.
+    # - Any other caller is a thread driving IPC directly; block=True waits
+    #   on the mailbox, up to timeout seconds (None waits indefinitely).
+    #
+    # Shared memory is either the shared_memory dict (Python objects, this
+    # process only) or named SharedSegments from create_segment(); keys that
+    # name a segment read and write the segment. When a process manager is
+    # set, terminating a process drops its mailbox and frees the segments it
+    # owns.
+    def __init__(self, capacity=1024, process_manager=None):
+        self.capacity = capacity
+        self.process_manager = process_manager
+        self.mailboxes = {}  # {receiver_pid: Mailbox}
+        self._lock = threading.Lock()
         self.shared_memory = {}  # {key: value}
+        self.segments = {}  # {name: SharedSegment}
+        self._owned_segments = {}  # {pid: {name: None}}
+        if process_manager is not None:
+            process_manager.terminate_hooks.append(self._process_terminated)
+
+    @property
+    def messages(self):
+        # Snapshot of queued messages per receiver
+        result = {}
+        for pid, mailbox in list(self.mailboxes.items()):
+            with mailbox.lock:
+                if mailbox.count:
+                    result[pid] = [mailbox.slots[(mailbox.head + i) % mailbox.capacity]
+                                   for i in range(mailbox.count)]
+        return result
+
+    def mailbox(self, pid):
+        mailbox = self.mailboxes.get(pid)
+        if mailbox is None:
+            with self._lock:
+                mailbox = self.mailboxes.get(pid)
+                if mailbox is None:
+                    mailbox = self.mailboxes[pid] = Mailbox(self.capacity)
+        return mailbox
 
-    def send(self, sender_pid, receiver_pid, message):
-        if receiver_pid not in self.messages:
-            self.messages[receiver_pid] = []
-        self.messages[receiver_pid].append((sender_pid, message))
-        system_logger.log(f"Message sent from {sender_pid} to {receiver_pid}")
+    def _simulated(self, pid):
+        manager = self.process_manager
+        return manager is not None and pid in manager.table
 
-    def receive(self, receiver_pid):
-        messages = self.messages.get(receiver_pid, [])
+    def send_batch(self, sender_pid, receiver_pid, messages, block=False, timeout=None):
+        # Queue messages in order; returns how many were accepted. Without
+        # block the ones that do not fit are refused.
+        mailbox = self.mailbox(receiver_pid)
+        items = [(sender_pid, message) for message in messages]
+        simulated = block and self._simulated(sender_pid)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        sent = 0
+        with mailbox.lock:
+            while True:
+                sent += mailbox._put(items[sent:])
+                if sent == len(items) or not block or simulated:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                mailbox.not_full.wait(remaining)
+            mailbox.rejected += len(items) - sent
+            wake_receiver = sent and mailbox.waiting_receiver
+            if wake_receiver:
+                mailbox.waiting_receiver = False
+            park_sender = simulated and sent < len(items)
+            if park_sender:
+                mailbox.waiting_senders[sender_pid] = None
+        if sent:
+            if system_logger.enabled(logger.INFO):
+                system_logger.log(f"Message sent from {sender_pid} to {receiver_pid}" if len(items) == 1
+                                  else f"{sent} messages sent from {sender_pid} to {receiver_pid}")
+            event_log.record("message_sent", pid=sender_pid, receiver=receiver_pid, count=sent)
+        if wake_receiver:
+            self.process_manager.wake(receiver_pid)
+        if park_sender:
+            system_logger.log(f"Mailbox of {receiver_pid} full; sender {sender_pid} blocked")
+            self._park(sender_pid, f"mailbox {receiver_pid} full",
+                       lambda: mailbox.count < mailbox.capacity)
+        elif sent < len(items):
+            system_logger.log(f"Mailbox of {receiver_pid} full; {len(items) - sent} messages refused",
+                              logger.WARNING)
+        return sent
+
+    def send(self, sender_pid, receiver_pid, message, block=False, timeout=None):
+        # True if the message was queued
+        return self.send_batch(sender_pid, receiver_pid, (message,), block, timeout) == 1
+
+    def receive(self, receiver_pid, max_messages=None, block=False, timeout=None):
+        # Up to max_messages (default: all) queued (sender_pid, message)
+        # pairs, oldest first
+        mailbox = self.mailbox(receiver_pid)
+        simulated = block and self._simulated(receiver_pid)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with mailbox.lock:
+            messages = mailbox._get(max_messages)
+            while not messages and block and not simulated:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                mailbox.not_empty.wait(remaining)
+                messages = mailbox._get(max_messages)
+            park_receiver = simulated and not messages
+            if park_receiver:
+                mailbox.waiting_receiver = True
+            senders = list(mailbox.waiting_senders) if messages else []
+            if senders:
+                mailbox.waiting_senders.clear()
         if messages:
-            self.messages[receiver_pid] = []
-            system_logger.log(f"Messages retrieved for {receiver_pid}")
+            if system_logger.enabled(logger.INFO):
+                system_logger.log(f"Messages retrieved for {receiver_pid}")
+            event_log.record("messages_received", pid=receiver_pid, count=len(messages))
+        for pid in senders:
+            self.process_manager.wake(pid)
+        if park_receiver:
+            self._park(receiver_pid, "waiting for a message", lambda: mailbox.count)
         return messages
 
+    def _park(self, pid, reason, ready):
+        # Block pid until the mailbox changes. The wait flag is set under the
+        # mailbox lock but the process is parked after it is released, so a
+        # sender or receiver on another thread may already have found the
+        # flag and called wake() on a process that was not blocked yet;
+        # checking again once it is parked catches that.
+        manager = self.process_manager
+        if manager.block_on(pid, reason) and ready():
+            manager.wake(pid)
+
+    def _process_terminated(self, pid):
+        with self._lock:
+            mailbox = self.mailboxes.pop(pid, None)
+            names = list(self._owned_segments.pop(pid, ()))
+        if mailbox is not None:
+            with mailbox.lock:
+                senders = list(mailbox.waiting_senders)
+                mailbox.waiting_senders.clear()
+                mailbox.not_full.notify_all()
+            for sender in senders:
+                self.process_manager.wake(sender)
+            if mailbox.count:
+                system_logger.log(f"Dropped {mailbox.count} undelivered messages for PID {pid}")
+        for other in list(self.mailboxes.values()):
+            with other.lock:
+                other.waiting_senders.pop(pid, None)
+        for name in names:
+            self.free_segment(name)
+
+    def stats(self):
+        return {pid: mailbox.stats() for pid, mailbox in list(self.mailboxes.items())}
+
+    # Shared memory
+
+    def create_segment(self, name, size, owner_pid=None):
+        # New named SharedSegment of size payload bytes; freed when owner_pid
+        # is terminated. None if the name is taken.
+        with self._lock:
+            if name in self.segments:
+                print(f"Shared segment {name} already exists")
+                return None
+            try:
+                segment = SharedSegment(name, size)
+            except FileExistsError:
+                print(f"Shared segment {name} already exists")
+                return None
+            self.segments[name] = segment
+            if owner_pid is not None:
+                segment.owner = owner_pid
+                self._owned_segments.setdefault(owner_pid, {})[name] = None
+        system_logger.log(f"Shared segment created: {name} ({size} bytes)")
+        event_log.record("segment_created", pid=owner_pid, name=name, size=size)
+        return segment
+
+    def segment(self, name):
+        return self.segments.get(name)
+
+    def free_segment(self, name):
+        with self._lock:
+            segment = self.segments.pop(name, None)
+            if segment is None:
+                return False
+            owned = self._owned_segments.get(segment.owner)
+            if owned is not None:
+                owned.pop(name, None)
+                if not owned:
+                    del self._owned_segments[segment.owner]
+        segment.unlink()
+        segment.close()
+        system_logger.log(f"Shared segment freed: {name}")
+        event_log.record("segment_freed", pid=segment.owner, name=name)
+        return True
+
     def shared_memory_write(self, key, value):
-        self.shared_memory[key] = value
+        segment = self.segments.get(key)
+        if segment is not None:
+            if not segment.write(value):
+                return False
+        else:
+            self.shared_memory[key] = value
         system_logger.log(f"Shared memory updated: {key}")
+        return True
 
     def shared_memory_read(self, key):
+        # Segments return a consistent bytes copy; see shared_memory_view
+        segment = self.segments.get(key)
+        if segment is not None:
+            return segment.read()
         return self.shared_memory.get(key)
 
+    def shared_memory_view(self, key):
+        # (memoryview, version) of a segment without copying, or None
+        segment = self.segments.get(key)
+        return segment.view() if segment is not None else None
+
     def shared_memory_list(self):
-        return list(self.shared_memory.keys())
\ No newline at end of file
+        return list(self.shared_memory.keys()) + list(self.segments)
+
+    def close(self):
+        # Free every segment created here
+        for name in list(self.segments):
+            self.free_segment(name)
@@ -1,20 +1,197 @@
 # logger.py
+import atexit
 import datetime
 import os
+import queue
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+class LogBackend:
+    # Background writer shared by every Logger on the same file. Callers only
+    # enqueue (time, level, message); the writer thread formats and appends
+    # records in batches, flushing when a batch fills or flush_interval passes.
+    def __init__(self, path, batch_size=1024, flush_interval=0.2,
+                 max_bytes=10 * 1024 * 1024, backup_count=3):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.level = default_level
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._last_second = None
+        self._last_stamp = ""
+        self._thread = threading.Thread(target=self._run, name=f"log-writer:{path}", daemon=True)
+        self._thread.start()
+
+    def submit(self, level, message):
+        if self._closed:
+            self.dropped += 1
+            return
+        self._queue.put((time.time(), level, message))
+
+    def flush(self, timeout=5.0):
+        # Block until everything queued so far is on disk
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(5.0)
+
+    def _rotate(self, f):
+        f.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        return self._open()
+
+    def _stamp(self, created):
+        second = int(created)
+        if second != self._last_second:
+            self._last_second = second
+            self._last_stamp = datetime.datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        return self._last_stamp
+
+    def _write(self, f, records):
+        # Format and append one batch; returns the number of bytes written
+        lines = []
+        for created, level, message in records:
+            stamp = self._stamp(created)
+            if level == INFO:
+                lines.append(f"[{stamp}] {message}\n")
+            else:
+                lines.append(f"[{stamp}] {LEVEL_NAMES.get(level, level)}: {message}\n")
+        data = "".join(lines)
+        f.write(data)
+        f.flush()
+        return len(data)
+
+    def _open(self):
+        return open(self.path, "a")
+
+    def _run(self):
+        f = self._open()
+        size = f.tell()
+        get = self._queue.get
+        while True:
+            item = get()
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            # Gather until the batch is full or the flush interval runs out
+            while len(batch) < self.batch_size and isinstance(item, tuple):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            records = []
+            waiters = []
+            stop = False
+            for record in batch:
+                if record is None:
+                    stop = True
+                elif isinstance(record, threading.Event):
+                    waiters.append(record)
+                else:
+                    records.append(record)
+            if records:
+                size += self._write(f, records)
+                self.written += len(records)
+                if self.max_bytes and size >= self.max_bytes:
+                    f = self._rotate(f)
+                    size = 0
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                f.close()
+                return
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(path, factory=LogBackend):
+    path = os.path.abspath(path)
+    with _backends_lock:
+        backend = _backends.get(path)
+        if backend is None:
+            backend = _backends[path] = factory(path)
+        return backend
+
+def set_level(level):
+    # Applies to every log file, including ones opened later
+    global default_level
+    default_level = level
+    for backend in list(_backends.values()):
+        backend.level = level
+
+def flush_all():
+    for backend in list(_backends.values()):
+        backend.flush()
+
+def _shutdown():
+    for backend in list(_backends.values()):
+        backend.close()
+
+atexit.register(_shutdown)
+default_level = INFO
 
 class Logger:
+    # Creating a Logger touches nothing; logs/ and the writer thread are set
+    # up by the first message that passes the level gate
     def __init__(self, log_file="system.log"):
         self.log_dir = "logs"
         self.log_file = log_file
-        os.makedirs(self.log_dir, exist_ok=True)
         self.full_path = os.path.join(self.log_dir, log_file)
-        if not os.path.exists(self.full_path):
-            open(self.full_path, 'w').close()
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._backend = get_backend(self.full_path)
+        return self._backend
+
+    def enabled(self, level):
+        # Guard expensive messages: `if logger.enabled(DEBUG): logger.log(...)`
+        backend = self._backend
+        return level >= (backend.level if backend is not None else default_level)
+
+    def log(self, event, level=INFO):
+        backend = self._backend
+        if backend is None:
+            if level < default_level:
+                return
+            backend = self.backend
+        if level >= backend.level:
+            backend.submit(level, event)
 
-    def log(self, event):
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open(self.full_path, 'a') as f:
-            f.write(f"[{timestamp}] {event}\n")
+    def flush(self):
+        self.backend.flush()
 
 # Global logger instance
-system_logger = Logger()
\ No newline at end of file
+system_logger = Logger()
@@ -1,27 +1,16 @@
-import os
-from user_management import UserManager
+import shell
+from event_log import event_log
+from user_management import get_user_manager
 
 if __name__ == "__main__":
     print("Welcome to the Virtual Operating System!")
-    print("Initializing modules...")
 
-    # Initialize user manager
-    user_manager = UserManager()
-    
     # Authentication
-    if not user_manager.login(input("Username: "), input("Password: ")):
+    username = input("Username: ")
+    if not get_user_manager().login(username, input("Password: ")):
         print("Access denied!")
         exit()
+    event_log.current_user = username
 
-    # Importing modules
-    import process_management
-    import memory_management
-    import file_management
-    import shell
-    import logger
-
-    # Initialize system logger
-    system_logger = logger.Logger()
-
-    print("Initialization complete. Starting shell...")
-    shell.start_shell()
\ No newline at end of file
+    print("Starting shell...")
+    shell.start_shell()
@@ -1,97 +1,668 @@
+import bisect
+import functools
+import math
+import re
+import threading
+import time
+from array import array
 import logger
+import singletons
+from event_log import event_log
+from page_replacement import make_policy
+from swap import SwapDevice
 
-system_logger = logger.Logger()
+system_logger = logger.system_logger
+
+# NumPy pays off only for large memories, and importing it costs more than
+# the rest of startup; it is loaded the first time a PageArray needs it
+NUMPY_MIN_PAGES = 65536
+_numpy = None
+
+def load_numpy():
+    # The numpy module, or None if it is not installed
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+NO_OWNER = -1
 
 class Page:
-    def __init__(self, page_id, size):
+    def __init__(self, page_id, size, allocated=False, owner=None, data=None, last_accessed=0):
         self.page_id = page_id
         self.size = size
-        self.allocated = False
-        self.data = None
-        self.last_accessed = 0  # For LRU
+        self.allocated = allocated
+        self.owner = owner
+        self.data = data
+        self.last_accessed = last_accessed  # For LRU
 
     def __str__(self):
         status = "Allocated" if self.allocated else "Free"
-        return f"Page ID: {self.page_id}, Size: {self.size}MB, Status: {status}"
+        owner = f", Owner: {self.owner}" if self.owner is not None else ""
+        return f"Page ID: {self.page_id}, Size: {self.size}MB, Status: {status}{owner}"
+
+class Allocation:
+    __slots__ = ("handle", "pid", "size", "start", "num_pages")
+
+    def __init__(self, handle, pid, size, start, num_pages):
+        self.handle = handle
+        self.pid = pid
+        self.size = size
+        self.start = start
+        self.num_pages = num_pages
+
+    def __str__(self):
+        return (f"Handle: {self.handle}, PID: {self.pid}, Size: {self.size}MB, "
+                f"Pages: {self.start}-{self.start + self.num_pages - 1}")
+
+class BuddyAllocator:
+    # Binary buddy allocator over page frames. Free blocks are kept per order
+    # (block = 2**order pages, aligned to its size) and a bytearray marks free
+    # pages. Allocations take a block of the next power of two and hand the
+    # unused tail straight back, so only the requested pages are consumed.
+    def __init__(self, num_pages):
+        self.num_pages = num_pages
+        self.max_order = max(num_pages.bit_length() - 1, 0)
+        self.free_lists = [set() for _ in range(self.max_order + 1)]
+        self.free_map = bytearray(b"\x01") * num_pages  # 1 = free
+        self.free_pages = num_pages
+        for start, order in self._aligned_blocks(0, num_pages):
+            self.free_lists[order].add(start)
+
+    def _aligned_blocks(self, start, end):
+        # Split [start, end) into the largest size-aligned power-of-two blocks
+        while start < end:
+            size = start & -start if start else 1 << self.max_order
+            while size > end - start:
+                size >>= 1
+            yield start, size.bit_length() - 1
+            start += size
+
+    def _free_block(self, start, order):
+        # Coalesce with free buddies as far up as possible
+        while order < self.max_order:
+            buddy = start ^ (1 << order)
+            if buddy not in self.free_lists[order]:
+                break
+            self.free_lists[order].remove(buddy)
+            start = min(start, buddy)
+            order += 1
+        self.free_lists[order].add(start)
+
+    def largest_free_block(self):
+        for order in range(self.max_order, -1, -1):
+            if self.free_lists[order]:
+                return 1 << order
+        return 0
+
+    def alloc(self, count):
+        order = (count - 1).bit_length()
+        if count <= 0 or order > self.max_order:
+            return None
+        for k in range(order, self.max_order + 1):
+            if self.free_lists[k]:
+                break
+        else:
+            return None
+        start = self.free_lists[k].pop()
+        while k > order:
+            k -= 1
+            self.free_lists[k].add(start + (1 << k))
+        for tail, tail_order in self._aligned_blocks(start + count, start + (1 << order)):
+            self.free_lists[tail_order].add(tail)
+        self.free_map[start:start + count] = bytes(count)
+        self.free_pages -= count
+        return start
+
+    def _find_free_block(self, page):
+        for order in range(self.max_order + 1):
+            block = page & ~((1 << order) - 1)
+            if block in self.free_lists[order]:
+                return block, order
+        raise ValueError(f"Page {page} is not free")
+
+    def claim(self, start, count):
+        # Allocate an exact, already free range (used when relocating pages)
+        end = start + count
+        page = start
+        while page < end:
+            block, order = self._find_free_block(page)
+            block_end = block + (1 << order)
+            taken_end = min(end, block_end)
+            self.free_lists[order].remove(block)
+            for piece, piece_order in self._aligned_blocks(block, page):
+                self.free_lists[piece_order].add(piece)
+            for piece, piece_order in self._aligned_blocks(taken_end, block_end):
+                self.free_lists[piece_order].add(piece)
+            page = taken_end
+        self.free_map[start:end] = bytes(count)
+        self.free_pages -= count
+
+    def free(self, start, count):
+        for block, order in self._aligned_blocks(start, start + count):
+            self._free_block(block, order)
+        self.free_map[start:start + count] = b"\x01" * count
+        self.free_pages += count
+
+class PageArray:
+    # Column-oriented page state: the allocated flags are the allocator's free
+    # map, owners and last-access stamps are NumPy arrays (or array.array when
+    # NumPy is missing) and page data is kept sparsely. Indexing returns a Page
+    # snapshot, so millions of pages never exist as Python objects.
+    def __init__(self, num_pages, page_size, free_map):
+        self.num_pages = num_pages
+        self.page_size = page_size
+        self.free_map = free_map
+        self.np = np = load_numpy() if num_pages >= NUMPY_MIN_PAGES else None
+        if np is not None:
+            self.owner = np.full(num_pages, NO_OWNER, dtype=np.int64)
+            self.last_accessed = np.zeros(num_pages, dtype=np.int64)
+        else:
+            self.owner = array('q', [NO_OWNER]) * num_pages
+            self.last_accessed = array('q', [0]) * num_pages
+        self.data = {}  # {frame: data}
+
+    def __len__(self):
+        return self.num_pages
+
+    def __getitem__(self, frame):
+        if frame < 0:
+            frame += self.num_pages
+        if not 0 <= frame < self.num_pages:
+            raise IndexError("page index out of range")
+        owner = int(self.owner[frame])
+        return Page(frame, self.page_size, not self.free_map[frame],
+                    None if owner == NO_OWNER else owner,
+                    self.data.get(frame), int(self.last_accessed[frame]))
+
+    def __iter__(self):
+        for frame in range(self.num_pages):
+            yield self[frame]
+
+    def set_owner(self, start, end, pid):
+        np = self.np
+        value = NO_OWNER if pid is None else pid
+        if np is not None:
+            self.owner[start:end] = value
+        else:
+            self.owner[start:end] = array('q', [value]) * (end - start)
+
+    def stamp(self, start, end, first_stamp):
+        # Consecutive access stamps, as if the pages were touched in order
+        np = self.np
+        if np is not None:
+            self.last_accessed[start:end] = np.arange(first_stamp, first_stamp + end - start)
+        else:
+            self.last_accessed[start:end] = array('q', range(first_stamp, first_stamp + end - start))
+
+    def move(self, src, dst, count):
+        # Relocate page state; the two ranges must not overlap
+        self.owner[dst:dst + count] = self.owner[src:src + count]
+        self.last_accessed[dst:dst + count] = self.last_accessed[src:src + count]
+        if self.data:
+            for offset in range(count):
+                if src + offset in self.data:
+                    self.data[dst + offset] = self.data.pop(src + offset)
+        self.set_owner(src, src + count, None)
+
+    def clear(self, start, end):
+        self.set_owner(start, end, None)
+        if self.data:
+            for frame in range(start, end):
+                self.data.pop(frame, None)
+
+    def free_runs(self):
+        # (start, length) arrays of maximal runs of free pages
+        np = self.np
+        if np is not None:
+            free = np.frombuffer(self.free_map, dtype=np.int8)
+            edges = np.diff(np.concatenate(([0], free, [0])))
+            starts = np.flatnonzero(edges == 1)
+            return starts, np.flatnonzero(edges == -1) - starts
+        runs = [(m.start(), m.end() - m.start()) for m in re.finditer(b"\x01+", self.free_map)]
+        return [r[0] for r in runs], [r[1] for r in runs]
+
+    def fragmentation(self):
+        np = self.np
+        starts, lengths = self.free_runs()
+        free_pages = int(lengths.sum()) if np is not None else sum(lengths)
+        largest = int(max(lengths)) if len(lengths) else 0
+        # Histogram of free-run lengths in power-of-two buckets: 1, 2-3, 4-7, ...
+        if np is not None:
+            buckets = np.bincount(np.log2(lengths).astype(np.int64)) if len(lengths) else []
+            histogram = {1 << i: int(n) for i, n in enumerate(buckets) if n}
+        else:
+            histogram = {}
+            for length in lengths:
+                bucket = 1 << (length.bit_length() - 1)
+                histogram[bucket] = histogram.get(bucket, 0) + 1
+            histogram = dict(sorted(histogram.items()))
+        return {
+            "total_pages": self.num_pages,
+            "free_pages": free_pages,
+            "free_runs": len(lengths),
+            "largest_free_run": largest,
+            "fragmentation": 1 - largest / free_pages if free_pages else 0.0,
+            "run_histogram": histogram,
+        }
+
+    def segments(self):
+        # Runs of pages sharing the same allocated flag and owner
+        np = self.np
+        if np is not None:
+            allocated = np.frombuffer(self.free_map, dtype=np.uint8) == 0
+            change = np.flatnonzero((allocated[1:] != allocated[:-1]) | (self.owner[1:] != self.owner[:-1])) + 1
+            bounds = np.concatenate(([0], change, [self.num_pages]))
+            for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                owner = int(self.owner[start])
+                yield start, end, not self.free_map[start], None if owner == NO_OWNER else owner
+            return
+        start = 0
+        for frame in range(1, self.num_pages + 1):
+            if (frame == self.num_pages or self.free_map[frame] != self.free_map[start]
+                    or self.owner[frame] != self.owner[start]):
+                owner = self.owner[start]
+                yield start, frame, not self.free_map[start], None if owner == NO_OWNER else owner
+                start = frame
+
+class Compactor:
+    # Incremental compaction: slides allocations and demand-paged frames down
+    # into the lowest free run that fits, a bounded number of pages per step,
+    # so a pass can be spread over many calls or a background thread.
+    def __init__(self, manager):
+        self.manager = manager
+        self.work = []
+        self.cursor = 0
+        self.pages_moved = 0
+        self.units_moved = 0
+        self.passes = 0
+        self.seconds = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _begin_pass(self):
+        manager = self.manager
+        units = [(a.start, "alloc", handle) for handle, a in manager.allocations.items()]
+        units.extend((frame, "page", vpn) for frame, vpn in manager.frame_map.items())
+        units.sort()
+        self.work = units
+        self.cursor = 0
+
+    def _locate(self, kind, key):
+        # Current (start, count) of a unit, or None if it is gone
+        manager = self.manager
+        if kind == "alloc":
+            allocation = manager.allocations.get(key)
+            return (allocation.start, allocation.num_pages) if allocation else None
+        frame = manager.page_table.get(key)
+        return (frame, 1) if frame is not None and manager.frame_map.get(frame) == key else None
+
+    def _move(self, kind, key, start, dest, count):
+        manager = self.manager
+        manager.allocator.claim(dest, count)
+        manager.pages.move(start, dest, count)
+        manager.allocator.free(start, count)
+        if kind == "alloc":
+            manager.allocations[key].start = dest
+        else:
+            del manager.frame_map[start]
+            manager.frame_map[dest] = key
+            manager.page_table[key] = dest
+
+    def step(self, budget=None):
+        # Move up to `budget` pages (None = finish the pass). A unit larger
+        # than the budget is still moved when it is the first of the step.
+        # A unit that cannot move costs one page of budget, so a step is
+        # bounded even when nothing fits.
+        started = time.perf_counter()
+        moved = units = spent = 0
+        with self.manager.lock:
+            free_map = self.manager.allocator.free_map
+            low = free_map.find(b"\x01")  # lowest free frame; only rises during a step
+            if self.cursor >= len(self.work):
+                if low < 0 or free_map.rfind(b"\x00") < low:
+                    self.work = []  # already compact: skip building a pass
+                else:
+                    self._begin_pass()
+            work = self.work
+            while self.cursor < len(work):
+                if low < 0:
+                    self.cursor = len(work)  # nothing free, nothing can move
+                    break
+                if work[self.cursor][0] <= low:
+                    # Units are sorted by start: none up to the lowest free
+                    # frame can move down
+                    self.cursor = bisect.bisect_left(work, (low + 1,), self.cursor)
+                    continue
+                _, kind, key = work[self.cursor]
+                location = self._locate(kind, key)
+                if location is None:
+                    self.cursor += 1
+                    continue
+                start, count = location
+                if budget is not None and spent and spent + (count if low < start else 1) > budget:
+                    break
+                self.cursor += 1
+                dest = free_map.find(b"\x01" * count, low, start) if low < start else -1
+                if dest < 0:
+                    spent += 1
+                    continue
+                self._move(kind, key, start, dest, count)
+                moved += count
+                spent += count
+                units += 1
+                if dest == low:
+                    low = free_map.find(b"\x01", low + count)
+            done = self.cursor >= len(self.work)
+            if done:
+                self.passes += 1
+        elapsed = time.perf_counter() - started
+        self.pages_moved += moved
+        self.units_moved += units
+        self.seconds += elapsed
+        return {"pages_moved": moved, "units_moved": units, "seconds": elapsed, "pass_complete": done}
+
+    def _run(self, budget, interval):
+        while not self._stop.is_set():
+            report = self.step(budget)
+            if report["pass_complete"] and not report["pages_moved"]:
+                break  # Nothing left to move
+            self._stop.wait(interval)
+        system_logger.log(f"Background compaction stopped: {self.stats()}")
+
+    def start(self, budget=256, interval=0.05):
+        if self.running:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(budget, interval), daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._thread is None:
+            return False
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return True
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        return {
+            "pages_moved": self.pages_moved,
+            "units_moved": self.units_moved,
+            "passes": self.passes,
+            "seconds": round(self.seconds, 6),
+            "running": self.running,
+        }
+
+def _synchronized(method):
+    # Serialise with the background compactor
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class MemoryManager:
-    def __init__(self, total_memory=1024, page_size=128):
+    # Sizes are in MB; page_size may be fractional (4 / 1024 for 4 KB pages).
+    # With swap_path set, swapped pages go to a memory-mapped swap file
+    # instead of an in-process dict.
+    def __init__(self, total_memory=1024, page_size=128, replacement_policy="lru",
+                 swap_path=None, swap_slots=None, swap_slot_size=4096):
         self.total_memory = total_memory
         self.page_size = page_size
-        self.pages = [Page(i, page_size) for i in range(total_memory // page_size)]
-        self.disk = {}  # Simulate disk storage
+        num_pages = int(total_memory // page_size)
+        self.allocator = BuddyAllocator(num_pages)
+        self.pages = PageArray(num_pages, page_size, self.allocator.free_map)
+        self.allocations = {}  # {handle: Allocation}
+        self.owner_allocations = {}  # {pid: {handle: None}}, oldest first
+        self.owner_pages = {}  # {pid: pages held}
+        self.next_handle = 1
+        if swap_path:
+            self.disk = SwapDevice(swap_path, swap_slots or 4 * num_pages, swap_slot_size)
+        else:
+            self.disk = {}  # Simulate disk storage
         self.page_table = {}  # Virtual to physical mapping
-        self.lru_cache = []
+        self.frame_map = {}  # {frame: virtual page} for demand-paged frames
+        self.replacer = make_policy(replacement_policy, len(self.pages))
         self.access_counter = 0
+        self.lock = threading.RLock()
+        self.compactor = Compactor(self)
 
-    def allocate_memory(self, size):
-        pages_needed = (size + self.page_size - 1) // self.page_size
-        free_pages = [page for page in self.pages if not page.allocated]
-
-        if len(free_pages) >= pages_needed:
-            for i in range(pages_needed):
-                free_pages[i].allocated = True
-                free_pages[i].last_accessed = self.access_counter
-                self.access_counter += 1
-                self.lru_cache.append(free_pages[i].page_id)
-            system_logger.log(f"Allocated {size}MB using {pages_needed} pages")
-            return True
-        else:
-            print("Memory allocation failed. Not enough free pages available.")
+    def _pages_for(self, size):
+        return math.ceil(size / self.page_size)
+
+    @_synchronized
+    def allocate_memory(self, size, pid=None):
+        pages_needed = self._pages_for(size)
+        if pages_needed <= 0:
+            print("Memory allocation failed. Size must be positive.")
+            return False
+        start = self.allocator.alloc(pages_needed)
+        if start is None and self.allocator.free_pages + len(self.replacer) >= pages_needed:
+            # Demand-paged frames are a cache; swap pages out to make room
+            while start is None and len(self.replacer):
+                frame = self._evict()
+                self.pages.clear(frame, frame + 1)
+                self.allocator.free(frame, 1)
+                start = self.allocator.alloc(pages_needed)
+        if start is None:
+            if self.allocator.free_pages >= pages_needed:
+                print("Memory allocation failed. Free memory is too fragmented.")
+            else:
+                print("Memory allocation failed. Not enough free pages available.")
+            return False
+
+        self.pages.set_owner(start, start + pages_needed, pid)
+        self.pages.stamp(start, start + pages_needed, self.access_counter)
+        self.access_counter += pages_needed
+
+        handle = self.next_handle
+        self.next_handle += 1
+        self.allocations[handle] = Allocation(handle, pid, size, start, pages_needed)
+        self.owner_allocations.setdefault(pid, {})[handle] = None
+        self.owner_pages[pid] = self.owner_pages.get(pid, 0) + pages_needed
+        if system_logger.enabled(logger.INFO):
+            system_logger.log(f"Allocated {size}MB using {pages_needed} pages (handle {handle}, PID {pid})")
+        event_log.record("memory_allocated", pid=pid, handle=handle, size=size, pages=pages_needed)
+        return handle
+
+    def _release(self, allocation, count):
+        # Give back the last `count` pages of an allocation
+        end = allocation.start + allocation.num_pages
+        self.allocator.free(end - count, count)
+        self.pages.clear(end - count, end)
+        allocation.num_pages -= count
+        allocation.size = min(allocation.size, allocation.num_pages * self.page_size)
+        self.owner_pages[allocation.pid] -= count
+        if allocation.num_pages == 0:
+            del self.allocations[allocation.handle]
+            handles = self.owner_allocations[allocation.pid]
+            del handles[allocation.handle]
+            if not handles:
+                del self.owner_allocations[allocation.pid]
+                del self.owner_pages[allocation.pid]
+
+    @_synchronized
+    def free_allocation(self, handle):
+        allocation = self.allocations.get(handle)
+        if allocation is None:
+            print(f"Error: Allocation handle {handle} not found.")
             return False
+        size = allocation.size
+        self._release(allocation, allocation.num_pages)
+        if system_logger.enabled(logger.INFO):
+            system_logger.log(f"Freed allocation {handle} ({size}MB, PID {allocation.pid})")
+        event_log.record("memory_freed", pid=allocation.pid, handle=handle, size=size)
+        return True
 
-    def free_memory(self, size):
-        pages_to_free = (size + self.page_size - 1) // self.page_size
-        allocated_pages = [page for page in self.pages if page.allocated]
+    @_synchronized
+    def free_memory(self, size, pid=None):
+        # Release pages owned by pid, newest allocations first
+        pages_to_free = self._pages_for(size)
+        if pages_to_free <= 0 or self.owner_pages.get(pid, 0) < pages_to_free:
+            print("Error: Cannot free more memory than allocated.")
+            return False
+
+        remaining = pages_to_free
+        handles = self.owner_allocations[pid]
+        while remaining:
+            allocation = self.allocations[next(reversed(handles))]
+            count = min(remaining, allocation.num_pages)
+            self._release(allocation, count)
+            remaining -= count
+        if system_logger.enabled(logger.INFO):
+            system_logger.log(f"Freed {size}MB using {pages_to_free} pages (PID {pid})")
+        event_log.record("memory_freed", pid=pid, size=size, pages=pages_to_free)
+        return True
+
+    @_synchronized
+    def free_process_memory(self, pid):
+        handles = list(self.owner_allocations.get(pid, ()))
+        for handle in handles:
+            self._release(self.allocations[handle], self.allocations[handle].num_pages)
+        if handles:
+            system_logger.log(f"Freed {len(handles)} allocations of PID {pid}")
+            event_log.record("memory_freed", pid=pid, allocations=len(handles))
+        return len(handles)
+
+    def list_allocations(self, pid=None):
+        allocations = (self.allocations.values() if pid is None else
+                       [self.allocations[h] for h in self.owner_allocations.get(pid, ())])
+        if not allocations:
+            print("No active allocations.")
+        for allocation in allocations:
+            print(allocation)
 
-        if len(allocated_pages) >= pages_to_free:
-            for i in range(pages_to_free):
-                allocated_pages[i].allocated = False
-                if allocated_pages[i].page_id in self.lru_cache:
-                    self.lru_cache.remove(allocated_pages[i].page_id)
-            system_logger.log(f"Freed {size}MB using {pages_to_free} pages")
+    @_synchronized
+    def handle_page_fault(self, page_id, write=False, pid=None):
+        # Reference virtual page page_id, loading it into a frame if needed
+        replacer = self.replacer
+        pages = self.pages
+        if replacer.reference(page_id, write):
+            pages.last_accessed[self.page_table[page_id]] = self.access_counter
+            self.access_counter += 1
             return True
+
+        frame = self.allocator.alloc(1)
+        if frame is None:
+            if not len(replacer):
+                print("Page fault failed. All frames are held by allocations.")
+                return False
+            frame = self._evict(page_id)
+        pages.owner[frame] = NO_OWNER if pid is None else pid
+        data = self.disk.get(page_id)  # Swap in
+        if data is not None:
+            pages.data[frame] = data
         else:
-            print("Error: Cannot free more memory than allocated.")
+            pages.data.pop(frame, None)
+        pages.last_accessed[frame] = self.access_counter
+        self.access_counter += 1
+        self.page_table[page_id] = frame
+        self.frame_map[frame] = page_id
+        replacer.insert(page_id, write)
+        if system_logger.enabled(logger.DEBUG):
+            system_logger.log(f"Page fault handled for page {page_id}", logger.DEBUG)
+        return True
+
+    def _evict(self, incoming=None):
+        # Swap out the replacer's victim and return its frame, still reserved
+        victim, dirty = self.replacer.evict(incoming)
+        frame = self.page_table.pop(victim)
+        if dirty or victim not in self.disk:
+            self.disk[victim] = self.pages.data.get(frame)  # Swap out
+        del self.frame_map[frame]
+        return frame
+
+    @_synchronized
+    def release_page(self, page_id):
+        # Drop a demand-paged virtual page and return its frame
+        self.disk.pop(page_id, None)
+        frame = self.page_table.pop(page_id, None)
+        if frame is None:
             return False
+        self.replacer.remove(page_id)
+        del self.frame_map[frame]
+        self.pages.clear(frame, frame + 1)
+        self.allocator.free(frame, 1)
+        return True
+
+    @_synchronized
+    def set_replacement_policy(self, name):
+        replacer = make_policy(name, len(self.pages))
+        # Carry the resident set over, oldest access first
+        stamps = self.pages.last_accessed
+        for page_id in sorted(self.page_table, key=lambda v: stamps[self.page_table[v]]):
+            replacer.insert(page_id, page_id in self.replacer.dirty)
+        self.replacer = replacer
+        system_logger.log(f"Page replacement policy set to {name}")
 
-    def handle_page_fault(self, page_id):
-        if page_id in self.disk:
-            # Find a page to replace using LRU
-            if len(self.lru_cache) >= len(self.pages):
-                oldest = self.lru_cache.pop(0)
-                oldest_page = next(p for p in self.pages if p.page_id == oldest)
-                self.disk[oldest] = oldest_page.data  # Swap out
-                oldest_page.data = self.disk[page_id]  # Swap in
-                oldest_page.last_accessed = self.access_counter
-                self.access_counter += 1
-                self.lru_cache.append(page_id)
-                system_logger.log(f"Page fault handled for page {page_id}")
-                return True
+    def replacement_stats(self):
+        return self.replacer.stats()
+
+    def swap_stats(self):
+        if isinstance(self.disk, SwapDevice):
+            return self.disk.stats()
+        return {"path": None, "slots_used": len(self.disk)}
+
+    def close(self):
+        self.compactor.stop()
+        if isinstance(self.disk, SwapDevice):
+            self.disk.close()
+
+    def display_replacement_stats(self):
+        stats = self.replacement_stats()
+        print(f"Policy: {stats['policy']}, Resident pages: {stats['resident']}")
+        print(f"Hits: {stats['hits']}, Misses: {stats['misses']}, Hit ratio: {stats['hit_ratio']:.2%}")
+        print(f"Evictions: {stats['evictions']}, Write-backs: {stats['writebacks']}")
+
+    def compact(self, budget=None):
+        report = self.compactor.step(budget)
+        system_logger.log(f"Memory compaction step: {report['pages_moved']} pages moved "
+                          f"in {report['seconds'] * 1000:.2f}ms")
+        return report
+
+    def start_background_compaction(self, budget=256, interval=0.05):
+        if self.compactor.start(budget, interval):
+            system_logger.log("Background compaction started")
+            return True
         return False
 
+    def stop_background_compaction(self):
+        return self.compactor.stop()
+
+    def fragmentation_report(self):
+        return self.pages.fragmentation()
+
     def defragment(self):
-        free_pages = [p for p in self.pages if not p.allocated]
-        contiguous_free = 0
-        max_contiguous = 0
-        current_block = 0
-        
-        for page in self.pages:
-            if not page.allocated:
-                current_block += 1
-                contiguous_free += self.page_size
-            else:
-                max_contiguous = max(max_contiguous, current_block)
-                current_block = 0
-                
-        max_contiguous = max(max_contiguous, current_block)
-        print(f"Contiguous free memory: {contiguous_free}MB")
-        print(f"Largest contiguous block: {max_contiguous * self.page_size}MB")
+        report = self.fragmentation_report()
+        print(f"Contiguous free memory: {report['free_pages'] * self.page_size}MB")
+        print(f"Largest contiguous block: {report['largest_free_run'] * self.page_size}MB")
+        print(f"Free runs: {report['free_runs']}, Fragmentation: {report['fragmentation']:.1%}")
+        histogram = ", ".join(f"{size}+: {count}" for size, count in report["run_histogram"].items())
+        if histogram:
+            print(f"Free-run lengths (pages): {histogram}")
         system_logger.log("Memory defragmentation analysis completed")
 
-    def display_memory(self):
+    def display_memory(self, max_pages=64):
         print("Memory Status:")
-        for page in self.pages:
-            print(page)
+        if len(self.pages) <= max_pages:
+            for page in self.pages:
+                print(page)
+            return
+        # Too many pages to list one by one: summarise runs instead
+        for start, end, allocated, owner in self.pages.segments():
+            status = "Allocated" if allocated else "Free"
+            owner = f", Owner: {owner}" if owner is not None else ""
+            print(f"Pages {start}-{end - 1}: {(end - start) * self.page_size}MB, Status: {status}{owner}")
 
-memory_manager = MemoryManager()
\ No newline at end of file
+# Shared instance, built on first use
+get_memory_manager, __getattr__ = singletons.lazy(__name__, "memory_manager", MemoryManager)
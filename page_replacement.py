@@ -0,0 +1,284 @@
+# page_replacement.py - O(1) page replacement policies for MemoryManager
+from collections import OrderedDict
+
+# Every policy tracks the set of resident virtual pages and is driven by
+# MemoryManager in three steps:
+#   reference(key, write) - True on a hit; a miss only updates statistics
+#   evict(incoming)       - pick and drop a victim, returns (key, was_dirty)
+#   insert(key, write)    - make a faulted page resident (caller freed a frame)
+# remove(key) drops a page without counting an eviction (e.g. memory freed).
+
+class ReplacementPolicy:
+    name = "base"
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.dirty = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    def reference(self, key, write=False):
+        if key in self:
+            self.hits += 1
+            self._touch(key)
+            if write:
+                self.dirty.add(key)
+            return True
+        self.misses += 1
+        self._miss(key)
+        return False
+
+    def insert(self, key, write=False):
+        self._insert(key)
+        if write:
+            self.dirty.add(key)
+
+    def evict(self, incoming=None):
+        key = self._evict(incoming)
+        self.evictions += 1
+        if key in self.dirty:
+            self.dirty.discard(key)
+            self.writebacks += 1
+            return key, True
+        return key, False
+
+    def remove(self, key):
+        if key in self:
+            self._remove(key)
+        self.dirty.discard(key)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "policy": self.name,
+            "resident": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "writebacks": self.writebacks,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def _miss(self, key):
+        pass
+
+class LRUPolicy(ReplacementPolicy):
+    name = "lru"
+
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self.order = OrderedDict()  # least recently used first
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, key):
+        return key in self.order
+
+    def keys(self):
+        return list(self.order)
+
+    def _touch(self, key):
+        self.order.move_to_end(key)
+
+    def _insert(self, key):
+        self.order[key] = None
+
+    def _evict(self, incoming):
+        return self.order.popitem(last=False)[0]
+
+    def _remove(self, key):
+        del self.order[key]
+
+class ClockPolicy(ReplacementPolicy):
+    # Second-chance: a hand sweeps a ring of frames, clearing reference bits
+    # until it finds a page that was not used since the last pass.
+    name = "clock"
+
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self.slots = []  # key per slot, None for a hole
+        self.ref = bytearray()
+        self.index = {}  # {key: slot}
+        self.holes = []
+        self.hand = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        return list(self.index)
+
+    def _touch(self, key):
+        self.ref[self.index[key]] = 1
+
+    def _insert(self, key):
+        if self.holes:
+            slot = self.holes.pop()
+            self.slots[slot] = key
+        else:
+            slot = len(self.slots)
+            self.slots.append(key)
+            self.ref.append(0)
+        self.index[key] = slot
+        self.ref[slot] = 1
+
+    def _evict(self, incoming):
+        slots, ref = self.slots, self.ref
+        size = len(slots)
+        hand = self.hand
+        while slots[hand] is None or ref[hand]:
+            ref[hand] = 0
+            hand = (hand + 1) % size
+        key = slots[hand]
+        slots[hand] = None
+        self.holes.append(hand)
+        del self.index[key]
+        self.hand = (hand + 1) % size
+        return key
+
+    def _remove(self, key):
+        slot = self.index.pop(key)
+        self.slots[slot] = None
+        self.ref[slot] = 0
+        self.holes.append(slot)
+
+class LFUPolicy(ReplacementPolicy):
+    # Frequency buckets give O(1) hits and evictions; ties go to the least
+    # recently used page within the lowest frequency.
+    name = "lfu"
+
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self.freq = {}  # {key: count}
+        self.buckets = {}  # {count: OrderedDict of keys}
+        self.min_freq = 0
+
+    def __len__(self):
+        return len(self.freq)
+
+    def __contains__(self, key):
+        return key in self.freq
+
+    def keys(self):
+        return list(self.freq)
+
+    def _unlink(self, key, count):
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+
+    def _touch(self, key):
+        count = self.freq[key]
+        self._unlink(key, count)
+        if count == self.min_freq and count not in self.buckets:
+            self.min_freq = count + 1
+        self.freq[key] = count + 1
+        self.buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def _insert(self, key):
+        self.freq[key] = 1
+        self.buckets.setdefault(1, OrderedDict())[key] = None
+        self.min_freq = 1
+
+    def _evict(self, incoming):
+        bucket = self.buckets[self.min_freq]
+        key = bucket.popitem(last=False)[0]
+        if not bucket:
+            del self.buckets[self.min_freq]
+            self.min_freq = min(self.buckets) if self.buckets else 0
+        del self.freq[key]
+        return key
+
+    def _remove(self, key):
+        count = self.freq.pop(key)
+        self._unlink(key, count)
+        if count == self.min_freq and count not in self.buckets:
+            self.min_freq = min(self.buckets) if self.buckets else 0
+
+class ARCPolicy(ReplacementPolicy):
+    # Adaptive Replacement Cache (Megiddo & Modha). T1/T2 hold resident pages
+    # seen once / more than once; B1/B2 remember recent evictions from each
+    # and steer the target size p of T1.
+    name = "arc"
+
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self.t1 = OrderedDict()
+        self.t2 = OrderedDict()
+        self.b1 = OrderedDict()
+        self.b2 = OrderedDict()
+        self.p = 0
+
+    def __len__(self):
+        return len(self.t1) + len(self.t2)
+
+    def __contains__(self, key):
+        return key in self.t1 or key in self.t2
+
+    def keys(self):
+        return list(self.t1) + list(self.t2)
+
+    def _touch(self, key):
+        if key in self.t1:
+            del self.t1[key]
+            self.t2[key] = None
+        else:
+            self.t2.move_to_end(key)
+
+    def _miss(self, key):
+        if key in self.b1:
+            self.p = min(self.capacity, self.p + max(len(self.b2) // len(self.b1), 1))
+        elif key in self.b2:
+            self.p = max(0, self.p - max(len(self.b1) // len(self.b2), 1))
+
+    def _evict(self, incoming):
+        t1_len = len(self.t1)
+        if self.t1 and (t1_len > self.p or (incoming in self.b2 and t1_len == self.p) or not self.t2):
+            key = self.t1.popitem(last=False)[0]
+            self.b1[key] = None
+        else:
+            key = self.t2.popitem(last=False)[0]
+            self.b2[key] = None
+        return key
+
+    def _insert(self, key):
+        if key in self.b1:
+            del self.b1[key]
+            self.t2[key] = None
+            return
+        if key in self.b2:
+            del self.b2[key]
+            self.t2[key] = None
+            return
+        # Keep the ghost directories within ARC's 2c bound
+        c = self.capacity
+        if len(self.t1) + len(self.b1) >= c and self.b1:
+            self.b1.popitem(last=False)
+        elif len(self) + len(self.b1) + len(self.b2) >= 2 * c and self.b2:
+            self.b2.popitem(last=False)
+        self.t1[key] = None
+
+    def _remove(self, key):
+        if key in self.t1:
+            del self.t1[key]
+        else:
+            del self.t2[key]
+
+POLICIES = {
+    "lru": LRUPolicy,
+    "clock": ClockPolicy,
+    "lfu": LFUPolicy,
+    "arc": ARCPolicy,
+}
+
+def make_policy(name, capacity):
+    if name not in POLICIES:
+        raise ValueError(f"Unknown replacement policy: {name}")
+    return POLICIES[name](capacity)
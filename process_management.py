@@ -1,98 +1,528 @@
+import enum
+import functools
+import heapq
+import itertools
+import threading
+from array import array
 import logger
+import singletons
+from event_log import event_log
 
-system_logger = logger.Logger()
+system_logger = logger.system_logger
+
+class ProcessState(enum.IntEnum):
+    TERMINATED = 0
+    READY = 1
+    RUNNING = 2
+    BLOCKED = 3
+
+    @classmethod
+    def parse(cls, value):
+        if isinstance(value, str):
+            try:
+                return cls[value.upper()]
+            except KeyError:
+                raise ValueError(f"Unknown process state: {value}")
+        return cls(value)
+
+    def __str__(self):
+        return self.name.capitalize()
+
+    def __format__(self, spec):
+        return format(str(self), spec)
 
 class Process:
-    def __init__(self, pid, name, priority=0, state="Ready", parent_pid=None):
+    __slots__ = ("pid", "name", "priority", "state", "parent_pid")
+
+    def __init__(self, pid, name, priority=0, state=ProcessState.READY, parent_pid=None):
         self.pid = pid
         self.name = name
         self.priority = priority
-        self.state = state
+        self.state = ProcessState.parse(state)
         self.parent_pid = parent_pid
 
     def __str__(self):
         return f"PID: {self.pid}, Name: {self.name}, Priority: {self.priority}, State: {self.state}"
 
-class ProcessManager:
+# Process tables hold the per-PID columns for ProcessManager. Both backends
+# share one interface so the manager never touches Process attributes directly.
+
+class ObjectProcessTable:
+    # One Process object per entry; get() returns the live object
+    def __init__(self):
+        self.rows = {}  # {pid: Process}
+        self.state_counts = [0] * len(ProcessState)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, pid):
+        return pid in self.rows
+
+    def add(self, pid, name, priority, state, parent_pid):
+        process = Process(pid, name, priority, state, parent_pid)
+        self.rows[pid] = process
+        self.state_counts[process.state] += 1
+        return process
+
+    def remove(self, pid):
+        process = self.rows.pop(pid, None)
+        if process is not None:
+            self.state_counts[process.state] -= 1
+        return process
+
+    def get(self, pid):
+        return self.rows.get(pid)
+
+    def priority(self, pid):
+        return self.rows[pid].priority
+
+    def state(self, pid):
+        process = self.rows.get(pid)
+        return process.state if process is not None else ProcessState.TERMINATED
+
+    def set_state(self, pid, state):
+        process = self.rows[pid]
+        self.state_counts[process.state] -= 1
+        self.state_counts[state] += 1
+        process.state = state
+
+    def parent(self, pid):
+        return self.rows[pid].parent_pid
+
+    def set_parent(self, pid, parent_pid):
+        self.rows[pid].parent_pid = parent_pid
+
+    def count(self, state=None):
+        return len(self.rows) if state is None else self.state_counts[state]
+
+    def pids(self, state=None):
+        if state is None:
+            return list(self.rows)
+        return [pid for pid, p in self.rows.items() if p.state == state]
+
+class CompactProcessTable:
+    # Struct-of-arrays storage: row = pid - 1, pids are never reused. The pid
+    # column is implicit in the row index. get() returns a Process snapshot.
     def __init__(self):
-        self.process_list = []
-        self.ready_queue = []
-        self.blocked_queue = []
-        self.running_process = None
+        self.names = []
+        self.priority_col = array('i')
+        self.state_col = array('b')
+        self.parent_col = array('q')  # 0 = no parent
+        self.state_counts = [0] * len(ProcessState)
+
+    def __len__(self):
+        return len(self.state_col) - self.state_counts[ProcessState.TERMINATED]
+
+    def __contains__(self, pid):
+        return self._row(pid) >= 0
+
+    def _row(self, pid):
+        row = pid - 1
+        if 0 <= row < len(self.state_col) and self.state_col[row]:
+            return row
+        return -1
+
+    def add(self, pid, name, priority, state, parent_pid):
+        row = pid - 1
+        if row < 0:
+            raise ValueError(f"Invalid PID: {pid}")
+        while len(self.state_col) < row:
+            # Gap in the PID sequence: pad with terminated rows
+            self.names.append(None)
+            self.priority_col.append(0)
+            self.state_col.append(ProcessState.TERMINATED)
+            self.parent_col.append(0)
+            self.state_counts[ProcessState.TERMINATED] += 1
+        state = ProcessState.parse(state)
+        if row == len(self.state_col):
+            self.names.append(name)
+            self.priority_col.append(priority)
+            self.state_col.append(state)
+            self.parent_col.append(parent_pid or 0)
+        elif self.state_col[row]:
+            raise ValueError(f"PID {pid} already in use")
+        else:
+            self.state_counts[ProcessState.TERMINATED] -= 1
+            self.names[row] = name
+            self.priority_col[row] = priority
+            self.state_col[row] = state
+            self.parent_col[row] = parent_pid or 0
+        self.state_counts[state] += 1
+        return self.get(pid)
+
+    def remove(self, pid):
+        row = self._row(pid)
+        if row < 0:
+            return None
+        process = self.get(pid)
+        self.state_counts[self.state_col[row]] -= 1
+        self.state_counts[ProcessState.TERMINATED] += 1
+        self.state_col[row] = ProcessState.TERMINATED
+        self.names[row] = None
+        return process
+
+    def get(self, pid):
+        row = self._row(pid)
+        if row < 0:
+            return None
+        return Process(pid, self.names[row], self.priority_col[row],
+                       ProcessState(self.state_col[row]), self.parent_col[row] or None)
+
+    def priority(self, pid):
+        return self.priority_col[pid - 1]
+
+    def state(self, pid):
+        row = self._row(pid)
+        return ProcessState(self.state_col[row]) if row >= 0 else ProcessState.TERMINATED
+
+    def set_state(self, pid, state):
+        row = pid - 1
+        self.state_counts[self.state_col[row]] -= 1
+        self.state_counts[state] += 1
+        self.state_col[row] = state
+
+    def parent(self, pid):
+        return self.parent_col[pid - 1] or None
+
+    def set_parent(self, pid, parent_pid):
+        self.parent_col[pid - 1] = parent_pid or 0
+
+    def count(self, state=None):
+        return len(self) if state is None else self.state_counts[state]
+
+    def pids(self, state=None):
+        # Scans the packed state column in C, never materialising Process objects
+        rows = range(1, len(self.state_col) + 1)
+        if state is None:
+            return list(itertools.compress(rows, self.state_col))
+        return list(itertools.compress(rows, map(int(state).__eq__, self.state_col)))
+
+def _synchronized(method):
+    # Serialise callers on different threads, e.g. the shell and the event
+    # bus waking processes whose mailboxes received messages
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class ProcessManager:
+    def __init__(self, compact=False):
+        self.table = CompactProcessTable() if compact else ObjectProcessTable()
+        self.blocked_queue = {}  # {pid: None}, kept in blocking order
+        self.running_pid = None
         self.pid_counter = 1
+        self.children = {}  # {parent_pid: {child_pid: None}}
+        self.init_pid = None  # Adopts orphans when set
+        self.terminate_hooks = []  # callables(pid) run after a process is terminated
+        self.lock = threading.RLock()
+
+        # Ready heap of [-priority, seq, pid]. Removed entries are
+        # tombstoned (pid set to None) and skipped when popped.
+        self._ready_heap = []
+        self._ready_entries = {}  # {pid: heap entry}
+        self._ready_seq = itertools.count()
+
+    @property
+    def running_process(self):
+        return self.table.get(self.running_pid) if self.running_pid is not None else None
+
+    @property
+    def process_list(self):
+        return [self.table.get(pid) for pid in self.table.pids()]
+
+    @property
+    def ready_queue(self):
+        # Snapshot in scheduling order; only used for display
+        entries = sorted(e for e in self._ready_heap if e[2] is not None)
+        return [self.table.get(e[2]) for e in entries]
+
+    def _push_ready(self, pid):
+        entry = [-self.table.priority(pid), next(self._ready_seq), pid]
+        self._ready_entries[pid] = entry
+        heapq.heappush(self._ready_heap, entry)
+
+    def _remove_ready(self, pid):
+        entry = self._ready_entries.pop(pid, None)
+        if entry is not None:
+            entry[2] = None
+            # Rebuild once tombstones dominate so the heap stays O(live)
+            if len(self._ready_heap) > 64 and len(self._ready_heap) > 2 * len(self._ready_entries):
+                self._ready_heap = [e for e in self._ready_heap if e[2] is not None]
+                heapq.heapify(self._ready_heap)
 
+    def _pop_ready(self):
+        while self._ready_heap:
+            pid = heapq.heappop(self._ready_heap)[2]
+            if pid is not None:
+                del self._ready_entries[pid]
+                return pid
+        return None
+
+    def get_process(self, pid):
+        return self.table.get(pid)
+
+    @_synchronized
     def create_process(self, process_name, priority=0, parent_pid=None):
-        process = Process(self.pid_counter, process_name, priority, "Ready", parent_pid)
-        self.process_list.append(process)
-        self.ready_queue.append(process)
-        system_logger.log(f"Process created: {process}")
+        if parent_pid is not None and parent_pid not in self.table:
+            print(f"Parent process with PID {parent_pid} not found.")
+            return None
+        pid = self.pid_counter
+        process = self.table.add(pid, process_name, priority, ProcessState.READY, parent_pid)
+        if parent_pid is not None:
+            self.children.setdefault(parent_pid, {})[pid] = None
+        self._push_ready(pid)
+        if system_logger.enabled(logger.INFO):
+            system_logger.log(f"Process created: {process}")
+        event_log.record("process_created", pid=pid, name=process_name, priority=priority, parent=parent_pid)
         self.pid_counter += 1
-        self.schedule_process()
-        return process.pid
+        self._schedule()
+        return pid
+
+    def _terminate(self, pid):
+        process = self.table.remove(pid)
+        self._remove_ready(pid)
+        self.blocked_queue.pop(pid, None)
+        siblings = self.children.get(process.parent_pid)
+        if siblings is not None:
+            del siblings[pid]
+            if not siblings:
+                del self.children[process.parent_pid]
+        if self.init_pid == pid:
+            self.init_pid = None
+        running = self.running_pid == pid
+        if running:
+            self.running_pid = None
+        if system_logger.enabled(logger.INFO):
+            system_logger.log(f"Running process terminated: {process}" if running
+                              else f"Process terminated: {process}")
+        event_log.record("process_terminated", pid=pid)
+        for hook in self.terminate_hooks:
+            hook(pid)
 
+    @_synchronized
     def terminate_process(self, pid):
-        for process in self.process_list:
-            if process.pid == pid:
-                self.process_list.remove(process)
-                if process in self.ready_queue:
-                    self.ready_queue.remove(process)
-                if process in self.blocked_queue:
-                    self.blocked_queue.remove(process)
-                if self.running_process == process:
-                    self.running_process = None
-                    system_logger.log(f"Running process terminated: {process}")
-                    self.schedule_process()
-                else:
-                    system_logger.log(f"Process terminated: {process}")
-                return
-        print(f"Process with PID {pid} not found.")
+        if pid not in self.table:
+            print(f"Process with PID {pid} not found.")
+            return
+        self._terminate(pid)
+        self._reparent_orphans(pid)
+        self._schedule()
+
+    def _block(self, pid, reason=None):
+        self._remove_ready(pid)
+        self.table.set_state(pid, ProcessState.BLOCKED)
+        self.blocked_queue[pid] = None
+        if self.running_pid == pid:
+            self.running_pid = None
+        if system_logger.enabled(logger.INFO):
+            system_logger.log(f"Process blocked ({reason}): {self.table.get(pid)}" if reason
+                              else f"Process blocked: {self.table.get(pid)}")
+        if reason:
+            event_log.record("process_blocked", pid=pid, reason=reason)
+        else:
+            event_log.record("process_blocked", pid=pid)
 
+    def _unblock(self, pid):
+        del self.blocked_queue[pid]
+        self.table.set_state(pid, ProcessState.READY)
+        self._push_ready(pid)
+        if system_logger.enabled(logger.INFO):
+            system_logger.log(f"Process unblocked: {self.table.get(pid)}")
+        event_log.record("process_unblocked", pid=pid)
+
+    @_synchronized
     def block_process(self, pid):
-        for process in self.process_list:
-            if process.pid == pid and process.state == "Running":
-                process.state = "Blocked"
-                self.blocked_queue.append(process)
-                self.running_process = None
-                system_logger.log(f"Process blocked: {process}")
-                self.schedule_process()
-                return
+        if pid in self.table and pid == self.running_pid:
+            self._block(pid)
+            self._schedule()
+            return
         print(f"Process with PID {pid} not running or not found.")
 
+    @_synchronized
     def unblock_process(self, pid):
-        for process in self.blocked_queue:
-            if process.pid == pid:
-                process.state = "Ready"
-                self.blocked_queue.remove(process)
-                self.ready_queue.append(process)
-                system_logger.log(f"Process unblocked: {process}")
-                self.schedule_process()
-                return
+        if pid in self.blocked_queue:
+            self._unblock(pid)
+            self._schedule()
+            return
         print(f"Process with PID {pid} not blocked or not found.")
 
-    def list_processes(self):
-        if not self.process_list:
+    @_synchronized
+    def block_on(self, pid, reason):
+        # Park a process, running or ready, until wake(pid); used for
+        # waits such as an empty mailbox. False if it cannot be parked.
+        if pid not in self.table or pid in self.blocked_queue:
+            return False
+        self._block(pid, reason)
+        self._schedule()
+        return True
+
+    @_synchronized
+    def wake(self, pid):
+        # Counterpart of block_on; quietly does nothing if pid is not blocked
+        if pid not in self.blocked_queue:
+            return False
+        self._unblock(pid)
+        self._schedule()
+        return True
+
+    # Process tree. Every operation below walks only the affected subtree.
+
+    def get_children(self, pid):
+        return list(self.children.get(pid, ()))
+
+    def iter_subtree(self, pid):
+        # Pre-order walk: a parent is yielded before its descendants
+        if pid not in self.table:
+            return
+        stack = [pid]
+        while stack:
+            current = stack.pop()
+            yield current
+            kids = self.children.get(current)
+            if kids:
+                stack.extend(reversed(kids))
+
+    @_synchronized
+    def set_init_process(self, pid):
+        if pid not in self.table:
+            print(f"Process with PID {pid} not found.")
+            return False
+        self.init_pid = pid
+        system_logger.log(f"Init process set: {self.table.get(pid)}")
+        return True
+
+    @_synchronized
+    def reparent_orphans(self, pid, new_parent=None):
+        # Hand pid's children to new_parent (default: the init process)
+        return self._reparent_orphans(pid, new_parent)
+
+    def _reparent_orphans(self, pid, new_parent=None):
+        kids = self.children.pop(pid, None)
+        if not kids:
+            return 0
+        if new_parent is None:
+            new_parent = self.init_pid
+        if new_parent is not None and new_parent not in self.table:
+            new_parent = None
+        # Refuse to adopt into one of the orphans' own subtrees (would form a cycle)
+        ancestor = new_parent
+        while ancestor is not None:
+            if ancestor in kids:
+                new_parent = None
+                break
+            ancestor = self.table.parent(ancestor)
+        for child in kids:
+            self.table.set_parent(child, new_parent)
+        if new_parent is not None:
+            self.children.setdefault(new_parent, {}).update(kids)
+        system_logger.log(f"Re-parented {len(kids)} children of PID {pid} to {new_parent}")
+        return len(kids)
+
+    @_synchronized
+    def kill_subtree(self, pid):
+        if pid not in self.table:
+            print(f"Process with PID {pid} not found.")
+            return 0
+        subtree = list(self.iter_subtree(pid))
+        # Children first, so each _terminate only unlinks from a live parent
+        for member in reversed(subtree):
+            self._terminate(member)
+        system_logger.log(f"Process tree {pid} killed: {len(subtree)} processes")
+        self._schedule()
+        return len(subtree)
+
+    @_synchronized
+    def block_group(self, pid):
+        if pid not in self.table:
+            print(f"Process with PID {pid} not found.")
+            return 0
+        blocked = 0
+        for member in self.iter_subtree(pid):
+            if member not in self.blocked_queue:
+                self._block(member)
+                blocked += 1
+        self._schedule()
+        return blocked
+
+    @_synchronized
+    def unblock_group(self, pid):
+        if pid not in self.table:
+            print(f"Process with PID {pid} not found.")
+            return 0
+        unblocked = 0
+        for member in self.iter_subtree(pid):
+            if member in self.blocked_queue:
+                self._unblock(member)
+                unblocked += 1
+        self._schedule()
+        return unblocked
+
+    @_synchronized
+    def display_tree(self, pid=None):
+        roots = [pid] if pid is not None else [
+            p for p in self.table.pids() if self.table.parent(p) is None]
+        if not roots:
             print("No active processes.")
+            return
+        for root in roots:
+            if root not in self.table:
+                print(f"Process with PID {root} not found.")
+                continue
+            stack = [(root, 0)]
+            while stack:
+                current, depth = stack.pop()
+                print(f"{'  ' * depth}{self.table.get(current)}")
+                kids = self.children.get(current)
+                if kids:
+                    stack.extend((child, depth + 1) for child in reversed(kids))
+
+    def count_processes(self):
+        return {str(state): self.table.count(state) for state in ProcessState if state}
+
+    @_synchronized
+    def list_processes(self, state=None):
+        if not len(self.table):
+            print("No active processes.")
+            return
+        if state is not None:
+            state = ProcessState.parse(state)
+            pids = self.table.pids(state)
+            print(f"{state} Processes ({len(pids)}):")
+            for pid in pids:
+                print(f"  {self.table.get(pid)}")
+            return
+
+        print("Running Process:")
+        if self.running_pid is not None:
+            print(f"  {self.running_process}")
         else:
-            print("Running Process:")
-            if self.running_process:
-                print(f"  {self.running_process}")
-            else:
-                print("  None")
-                
-            print("\nReady Queue:")
-            for process in self.ready_queue:
-                print(f"  {process}")
-                
-            print("\nBlocked Queue:")
-            for process in self.blocked_queue:
-                print(f"  {process}")
+            print("  None")
+
+        print("\nReady Queue:")
+        for process in self.ready_queue:
+            print(f"  {process}")
 
+        print("\nBlocked Queue:")
+        for pid in self.blocked_queue:
+            print(f"  {self.table.get(pid)}")
+
+        counts = ", ".join(f"{name}: {n}" for name, n in self.count_processes().items())
+        print(f"\nTotals: {counts}")
+
+    @_synchronized
     def schedule_process(self):
-        if not self.running_process and self.ready_queue:
-            # Sort by priority (higher first)
-            self.ready_queue.sort(key=lambda p: p.priority, reverse=True)
-            self.running_process = self.ready_queue.pop(0)
-            self.running_process.state = "Running"
-            system_logger.log(f"Process scheduled: {self.running_process}")
-
-process_manager = ProcessManager()
\ No newline at end of file
+        self._schedule()
+
+    def _schedule(self):
+        if self.running_pid is None and self._ready_entries:
+            # Highest priority first, FIFO among equal priorities
+            self.running_pid = self._pop_ready()
+            self.table.set_state(self.running_pid, ProcessState.RUNNING)
+            if system_logger.enabled(logger.INFO):
+                system_logger.log(f"Process scheduled: {self.running_process}")
+            event_log.record("process_scheduled", pid=self.running_pid)
+
+# Shared instance, built on first use
+get_process_manager, __getattr__ = singletons.lazy(__name__, "process_manager", ProcessManager)
@@ -0,0 +1,325 @@
+# scheduler.py - discrete-event CPU scheduling simulation
+import collections
+import heapq
+import itertools
+import time
+import logger
+
+system_logger = logger.system_logger
+
+class Job:
+    # One simulated process plus its CPU burst bookkeeping
+    __slots__ = ("process", "pid", "priority", "arrival", "burst", "remaining",
+                 "first_run", "finish", "level", "vruntime", "weight")
+
+    def __init__(self, process, burst, arrival=0):
+        self.process = process
+        self.pid = process.pid
+        self.priority = process.priority
+        self.arrival = arrival
+        self.burst = burst
+        self.remaining = burst
+        self.first_run = -1
+        self.finish = -1
+        self.level = 0
+        self.vruntime = 0
+        self.weight = 1024
+
+# Scheduling policies share a small interface used by Simulation.run:
+#   add(job, now)            - a job becomes ready
+#   pick(now)                - remove and return the next job to dispatch
+#   time_slice(job)          - max run time for this dispatch (None = to completion)
+#   requeue(job, ran, now)   - a preempted job goes back to the ready set
+#   preempt_on_arrival       - cut a slice short when a new job arrives
+#   reset()                  - drop all state before a run
+
+class RoundRobin:
+    name = "rr"
+    preempt_on_arrival = False
+
+    def __init__(self, quantum=4):
+        self.quantum = quantum
+        self.reset()
+
+    def reset(self):
+        self.queue = collections.deque()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def add(self, job, now):
+        self.queue.append(job)
+
+    def pick(self, now):
+        return self.queue.popleft()
+
+    def time_slice(self, job):
+        return self.quantum
+
+    def requeue(self, job, ran, now):
+        self.queue.append(job)
+
+class MLFQ:
+    name = "mlfq"
+    preempt_on_arrival = False
+
+    def __init__(self, quanta=(2, 4, 8, 16), boost_interval=None):
+        self.quanta = tuple(quanta)
+        self.boost_interval = boost_interval
+        self.reset()
+
+    def reset(self):
+        self.levels = [collections.deque() for _ in self.quanta]
+        self.count = 0
+        self.next_boost = self.boost_interval
+
+    def __len__(self):
+        return self.count
+
+    def add(self, job, now):
+        job.level = 0
+        self.levels[0].append(job)
+        self.count += 1
+
+    def _boost(self, now):
+        # Periodic priority boost so long jobs are not starved
+        top = self.levels[0]
+        for queue in self.levels[1:]:
+            for job in queue:
+                job.level = 0
+            top.extend(queue)
+            queue.clear()
+        while self.next_boost <= now:
+            self.next_boost += self.boost_interval
+
+    def pick(self, now):
+        if self.next_boost is not None and now >= self.next_boost:
+            self._boost(now)
+        for queue in self.levels:
+            if queue:
+                self.count -= 1
+                return queue.popleft()
+        return None
+
+    def time_slice(self, job):
+        return self.quanta[job.level]
+
+    def requeue(self, job, ran, now):
+        # Used its whole quantum: demote one level
+        if ran >= self.quanta[job.level] and job.level < len(self.quanta) - 1:
+            job.level += 1
+        self.levels[job.level].append(job)
+        self.count += 1
+
+class CFS:
+    # Completely-fair style: always run the smallest virtual runtime. A heap
+    # gives the same leftmost-node access as the kernel's red-black tree.
+    name = "cfs"
+    preempt_on_arrival = False
+
+    def __init__(self, target_latency=24, min_granularity=1):
+        self.target_latency = target_latency
+        self.min_granularity = min_granularity
+        self.reset()
+
+    def reset(self):
+        self.heap = []
+        self.seq = itertools.count()
+        self.min_vruntime = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, job, now):
+        # Higher priority gets a larger share, like a lower nice value
+        job.weight = 1024 * 1.25 ** job.priority
+        if job.vruntime < self.min_vruntime:
+            job.vruntime = self.min_vruntime
+        heapq.heappush(self.heap, (job.vruntime, next(self.seq), job))
+
+    def pick(self, now):
+        vruntime, _, job = heapq.heappop(self.heap)
+        if vruntime > self.min_vruntime:
+            self.min_vruntime = vruntime
+        return job
+
+    def time_slice(self, job):
+        return max(self.min_granularity, self.target_latency / (len(self.heap) + 1))
+
+    def requeue(self, job, ran, now):
+        job.vruntime += ran * 1024 / job.weight
+        heapq.heappush(self.heap, (job.vruntime, next(self.seq), job))
+
+class SJF:
+    # Shortest job first; preemptive=True gives shortest remaining time first
+    name = "sjf"
+
+    def __init__(self, preemptive=False):
+        self.preempt_on_arrival = preemptive
+        self.reset()
+
+    def reset(self):
+        self.heap = []
+        self.seq = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, job, now):
+        heapq.heappush(self.heap, (job.remaining, next(self.seq), job))
+
+    def pick(self, now):
+        return heapq.heappop(self.heap)[2]
+
+    def time_slice(self, job):
+        return None
+
+    def requeue(self, job, ran, now):
+        heapq.heappush(self.heap, (job.remaining, next(self.seq), job))
+
+POLICIES = {
+    "rr": RoundRobin,
+    "mlfq": MLFQ,
+    "cfs": CFS,
+    "sjf": SJF,
+}
+
+def make_policy(name, **kwargs):
+    if name not in POLICIES:
+        raise ValueError(f"Unknown scheduling policy: {name}")
+    return POLICIES[name](**kwargs)
+
+class SimulationReport:
+    def __init__(self, policy_name, jobs, makespan, events, context_switches, wall_time):
+        self.policy_name = policy_name
+        self.makespan = makespan
+        self.events = events
+        self.context_switches = context_switches
+        self.wall_time = wall_time
+        self.per_process = []
+        for job in jobs:
+            turnaround = job.finish - job.arrival
+            self.per_process.append({
+                "pid": job.pid,
+                "name": job.process.name,
+                "arrival": job.arrival,
+                "burst": job.burst,
+                "finish": job.finish,
+                "turnaround": turnaround,
+                "wait": turnaround - job.burst,
+                "response": job.first_run - job.arrival,
+            })
+
+    def _average(self, key):
+        if not self.per_process:
+            return 0
+        return sum(p[key] for p in self.per_process) / len(self.per_process)
+
+    @property
+    def avg_turnaround(self):
+        return self._average("turnaround")
+
+    @property
+    def avg_wait(self):
+        return self._average("wait")
+
+    @property
+    def avg_response(self):
+        return self._average("response")
+
+    @property
+    def throughput(self):
+        # Completed processes per unit of virtual time
+        return len(self.per_process) / self.makespan if self.makespan else 0
+
+    @property
+    def events_per_second(self):
+        return self.events / self.wall_time if self.wall_time else 0
+
+    def summary(self):
+        return (f"Policy: {self.policy_name}, Processes: {len(self.per_process)}, "
+                f"Makespan: {self.makespan}, Throughput: {self.throughput:.4f}/tick, "
+                f"Avg turnaround: {self.avg_turnaround:.2f}, Avg wait: {self.avg_wait:.2f}, "
+                f"Avg response: {self.avg_response:.2f}, Events: {self.events} "
+                f"({self.events_per_second:,.0f}/s)")
+
+    def display(self):
+        print(self.summary())
+        for p in self.per_process:
+            print(f"  PID: {p['pid']}, Name: {p['name']}, Turnaround: {p['turnaround']}, "
+                  f"Wait: {p['wait']}, Response: {p['response']}")
+
+class Simulation:
+    def __init__(self, policy="rr", context_switch=0, **policy_args):
+        self.policy = make_policy(policy, **policy_args) if isinstance(policy, str) else policy
+        self.context_switch = context_switch
+        self.jobs = []
+
+    def add_process(self, process, burst, arrival=0):
+        if burst <= 0:
+            raise ValueError("CPU burst must be positive")
+        self.jobs.append(Job(process, burst, arrival))
+
+    def add_processes(self, processes, bursts, arrivals=None):
+        for i, process in enumerate(processes):
+            self.add_process(process, bursts[i], arrivals[i] if arrivals else 0)
+
+    def run(self):
+        # Runs on fresh copies of the jobs and a reset policy, so the
+        # simulation can be run again, e.g. after swapping self.policy
+        runs = [Job(job.process, job.burst, job.arrival) for job in self.jobs]
+        jobs = sorted(runs, key=lambda j: j.arrival)
+        policy = self.policy
+        policy.reset()
+        add, pick, time_slice, requeue = policy.add, policy.pick, policy.time_slice, policy.requeue
+        preempt_on_arrival = policy.preempt_on_arrival
+        context_switch = self.context_switch
+        total = len(jobs)
+        now = jobs[0].arrival if jobs else 0
+        nxt = 0
+        done = 0
+        events = 0
+        switches = 0
+        started = time.perf_counter()
+
+        while done < total:
+            while nxt < total and jobs[nxt].arrival <= now:
+                add(jobs[nxt], now)
+                nxt += 1
+                events += 1
+            if not len(policy):
+                # CPU idle: jump the clock to the next arrival
+                now = jobs[nxt].arrival
+                continue
+
+            job = pick(now)
+            if job.first_run < 0:
+                job.first_run = now
+            run = job.remaining
+            quantum = time_slice(job)
+            if quantum is not None and quantum < run:
+                run = quantum
+            if preempt_on_arrival and nxt < total and jobs[nxt].arrival - now < run:
+                run = jobs[nxt].arrival - now
+            now += run
+            job.remaining -= run
+            events += 1
+
+            if job.remaining <= 0:
+                job.finish = now
+                done += 1
+            else:
+                # Arrivals during the slice queue ahead of the preempted job
+                while nxt < total and jobs[nxt].arrival <= now:
+                    add(jobs[nxt], now)
+                    nxt += 1
+                    events += 1
+                requeue(job, run, now)
+            if context_switch and done < total:
+                now += context_switch
+                switches += 1
+
+        wall_time = time.perf_counter() - started
+        report = SimulationReport(policy.name, runs, now, events, switches, wall_time)
+        system_logger.log(f"Scheduling simulation finished: {report.summary()}")
+        return report
@@ -1,9 +1,12 @@
 # shell.py - Windows-compatible version
+import re
 import sys
-from process_management import process_manager
-from memory_management import memory_manager
-from file_management import file_manager
+import time
+import file_management
+import memory_management
+import process_management
 from ipc import IPC
+from event_log import event_log, format_event
 import logger
 
 # Windows-friendly input handling
@@ -15,10 +18,13 @@ try:
             readline.parse_and_bind("tab: complete")
             COMMAND_LIST = [
                 'create_process', 'terminate_process', 'list_processes',
-                'block_process', 'unblock_process',
-                'allocate_memory', 'free_memory', 'defragment',
+                'block_process', 'unblock_process', 'process_tree',
+                'kill_tree', 'block_group', 'unblock_group', 'set_init',
+                'allocate_memory', 'free_memory', 'free_handle', 'list_allocations',
+                'defragment', 'compact', 'compact_bg', 'access_page', 'page_stats', 'set_policy',
                 'create_file', 'delete_file', 'read_file', 'write_file',
-                'create_dir', 'list_dir', 'exit', 'help'
+                'create_dir', 'list_dir', 'find', 'send', 'receive', 'subscribe',
+                'unsubscribe', 'publish', 'bus_stats', 'events', 'exit', 'help'
             ]
             readline.set_completer(lambda text, state: [cmd for cmd in COMMAND_LIST if cmd.startswith(text)][state])
         except:
@@ -29,9 +35,19 @@ except ImportError:
     readline = None
     print("Note: Advanced input features disabled")
 
-system_logger = logger.Logger()
+system_logger = logger.system_logger
+
+LIST_PAGE_SIZE = 50
+READ_MODE = re.compile(r"^(.+?) (?:(head|tail)(?: (\d+))?|(range) (\d+) (\d+))$")
+PUBLISH_TIMEOUT = 2  # seconds to wait for room in "block" subscribers
 
 def start_shell():
+    # The shared managers are built here rather than when shell is imported
+    process_manager = process_management.get_process_manager()
+    memory_manager = memory_management.get_memory_manager()
+    file_manager = file_management.get_file_manager()
+    ipc = IPC(process_manager=process_manager)
+    bus = None  # event bus thread, started by the first bus command
     print("Virtual OS Shell Started. Type 'exit' to quit or 'help' for commands.")
     
     while True:
@@ -44,6 +60,9 @@ def start_shell():
                 continue
 
             if command == "exit":
+                if bus is not None:
+                    bus.close()
+                ipc.close()
                 system_logger.log("Shell session ended")
                 print("Exiting Virtual OS Shell.")
                 break
@@ -51,23 +70,47 @@ def start_shell():
             elif command == "help":
                 print("\nAvailable commands:")
                 print("Process Management:")
-                print("  create_process <name> [priority] - Create new process")
+                print("  create_process <name> [priority] [parent_pid] - Create new process")
                 print("  terminate_process <pid> - Terminate process")
-                print("  list_processes - Show all processes")
+                print("  list_processes [state] - Show all processes or only one state")
                 print("  block_process <pid> - Block a running process")
-                print("  unblock_process <pid> - Unblock a process\n")
+                print("  unblock_process <pid> - Unblock a process")
+                print("  process_tree [pid] - Show the process hierarchy")
+                print("  kill_tree <pid> - Terminate a process and all its descendants")
+                print("  block_group <pid> / unblock_group <pid> - Block or unblock a subtree")
+                print("  set_init <pid> - Set the process that adopts orphans\n")
                 print("Memory Management:")
-                print("  allocate_memory <size> - Allocate memory (MB)")
-                print("  free_memory <size> - Free memory (MB)")
-                print("  defragment - Show memory fragmentation\n")
+                print("  allocate_memory <size> [pid] - Allocate memory (MB), prints a handle")
+                print("  free_memory <size> [pid] - Free memory (MB) owned by pid")
+                print("  free_handle <handle> - Free one allocation")
+                print("  list_allocations [pid] - Show live allocations")
+                print("  defragment - Show memory fragmentation")
+                print("  compact [pages] - Relocate allocations to merge free memory (optional page budget)")
+                print("  compact_bg start [pages] | stop | status - Background compaction")
+                print("  access_page <page> [w] - Reference a virtual page (w = write)")
+                print("  page_stats - Show page replacement statistics")
+                print("  set_policy <lru|clock|lfu|arc> - Change page replacement policy\n")
                 print("File Management:")
                 print("  create_file <name> - Create new file")
                 print("  delete_file <name> - Delete file")
                 print("  read_file <name> - Read file contents")
-                print("  write_file <name> <content> - Write to file")
+                print("  read_file <name> head [n] | tail [n] - First or last n lines (default 10)")
+                print("  read_file <name> range <offset> <length> - Read a byte range")
+                print("  write_file [-e] <name> <content> - Write to file (-e encrypts it)")
                 print("  create_dir <name> - Create directory")
-                print("  list_dir [path] - List directory contents\n")
+                print("  list_dir [path] [page] - List directory contents with size and modified time")
+                print("  find <pattern> - Find files under data/ (e.g. find **/*.txt)\n")
+                print("IPC:")
+                print("  send <from_pid> <to_pid> <message> - Queue a message (a full mailbox blocks the sender)")
+                print("  receive <pid> [max] - Take queued messages (an empty mailbox blocks the process)")
+                print("  subscribe <pid> <pattern> [block|drop|drop_oldest] [size] - Forward bus topics to pid")
+                print("      patterns: dot-separated, * = one segment, # = any number (e.g. proc.*.exit, net.#)")
+                print("  unsubscribe <pid> <pattern> - Stop forwarding a pattern")
+                print("  publish <topic> <message> - Publish to every matching subscriber")
+                print("  bus_stats - Show subscriptions and mailbox statistics\n")
                 print("System:")
+                print("  events [pid=N] [type=T] [user=U] [since=T] [until=T] [limit=N] - Latest matching events (limit=0: all)")
+                print("      times: HH:MM[:SS], YYYY-MM-DDTHH:MM[:SS] or epoch seconds")
                 print("  exit - Quit the shell")
                 print("  help - Show this help\n")
 
@@ -75,12 +118,14 @@ def start_shell():
             elif command.startswith("create_process"):
                 parts = command.split()
                 if len(parts) < 2:
-                    print("Usage: create_process <name> [priority]")
+                    print("Usage: create_process <name> [priority] [parent_pid]")
                 else:
                     name = parts[1]
                     priority = int(parts[2]) if len(parts) > 2 else 0
-                    pid = process_manager.create_process(name, priority)
-                    print(f"Process '{name}' created with PID {pid}")
+                    parent_pid = int(parts[3]) if len(parts) > 3 else None
+                    pid = process_manager.create_process(name, priority, parent_pid)
+                    if pid is not None:
+                        print(f"Process '{name}' created with PID {pid}")
 
             elif command.startswith("terminate_process"):
                 parts = command.split()
@@ -89,8 +134,12 @@ def start_shell():
                 else:
                     process_manager.terminate_process(int(parts[1]))
 
-            elif command == "list_processes":
-                process_manager.list_processes()
+            elif command.startswith("list_processes"):
+                parts = command.split()
+                if len(parts) > 2:
+                    print("Usage: list_processes [ready|running|blocked]")
+                else:
+                    process_manager.list_processes(parts[1] if len(parts) > 1 else None)
 
             elif command.startswith("block_process"):
                 parts = command.split()
@@ -106,32 +155,123 @@ def start_shell():
                 else:
                     process_manager.unblock_process(int(parts[1]))
 
+            elif command.startswith("kill_tree"):
+                parts = command.split()
+                if len(parts) != 2:
+                    print("Usage: kill_tree <pid>")
+                else:
+                    killed = process_manager.kill_subtree(int(parts[1]))
+                    if killed:
+                        print(f"Terminated {killed} processes.")
+
+            elif command.startswith("block_group"):
+                parts = command.split()
+                if len(parts) != 2:
+                    print("Usage: block_group <pid>")
+                else:
+                    print(f"Blocked {process_manager.block_group(int(parts[1]))} processes.")
+
+            elif command.startswith("unblock_group"):
+                parts = command.split()
+                if len(parts) != 2:
+                    print("Usage: unblock_group <pid>")
+                else:
+                    print(f"Unblocked {process_manager.unblock_group(int(parts[1]))} processes.")
+
+            elif command.startswith("set_init"):
+                parts = command.split()
+                if len(parts) != 2:
+                    print("Usage: set_init <pid>")
+                elif process_manager.set_init_process(int(parts[1])):
+                    print(f"PID {parts[1]} will adopt orphaned processes.")
+
+            elif command.startswith("process_tree"):
+                parts = command.split()
+                process_manager.display_tree(int(parts[1]) if len(parts) > 1 else None)
+
             # Memory Management
             elif command.startswith("allocate_memory"):
                 parts = command.split()
-                if len(parts) != 2:
-                    print("Usage: allocate_memory <size>")
+                if len(parts) not in (2, 3):
+                    print("Usage: allocate_memory <size> [pid]")
                 else:
                     size = int(parts[1])
-                    if memory_manager.allocate_memory(size):
-                        print(f"Allocated {size}MB memory.")
+                    pid = int(parts[2]) if len(parts) > 2 else None
+                    handle = memory_manager.allocate_memory(size, pid)
+                    if handle:
+                        print(f"Allocated {size}MB memory (handle {handle}).")
                     else:
                         print("Memory allocation failed.")
 
             elif command.startswith("free_memory"):
                 parts = command.split()
-                if len(parts) != 2:
-                    print("Usage: free_memory <size>")
+                if len(parts) not in (2, 3):
+                    print("Usage: free_memory <size> [pid]")
                 else:
                     size = int(parts[1])
-                    if memory_manager.free_memory(size):
+                    pid = int(parts[2]) if len(parts) > 2 else None
+                    if memory_manager.free_memory(size, pid):
                         print(f"Freed {size}MB memory.")
                     else:
                         print("Memory free failed.")
 
+            elif command.startswith("free_handle"):
+                parts = command.split()
+                if len(parts) != 2:
+                    print("Usage: free_handle <handle>")
+                elif memory_manager.free_allocation(int(parts[1])):
+                    print(f"Freed allocation {parts[1]}.")
+
+            elif command.startswith("list_allocations"):
+                parts = command.split()
+                memory_manager.list_allocations(int(parts[1]) if len(parts) > 1 else None)
+
             elif command == "defragment":
                 memory_manager.defragment()
 
+            elif command.startswith("compact_bg"):
+                parts = command.split()
+                action = parts[1] if len(parts) > 1 else "status"
+                if action == "start":
+                    budget = int(parts[2]) if len(parts) > 2 else 256
+                    if memory_manager.start_background_compaction(budget):
+                        print("Background compaction started.")
+                    else:
+                        print("Background compaction is already running.")
+                elif action == "stop":
+                    memory_manager.stop_background_compaction()
+                    print("Background compaction stopped.")
+                else:
+                    print(memory_manager.compactor.stats())
+
+            elif command.startswith("compact"):
+                parts = command.split()
+                budget = int(parts[1]) if len(parts) > 1 else None
+                report = memory_manager.compact(budget)
+                state = "complete" if report["pass_complete"] else "in progress"
+                print(f"Moved {report['pages_moved']} pages in {report['seconds'] * 1000:.2f}ms "
+                      f"(pass {state}).")
+
+            elif command.startswith("access_page"):
+                parts = command.split()
+                if len(parts) not in (2, 3):
+                    print("Usage: access_page <page> [w]")
+                else:
+                    write = len(parts) > 2 and parts[2] == "w"
+                    if memory_manager.handle_page_fault(int(parts[1]), write):
+                        print(f"Page {parts[1]} is resident.")
+
+            elif command == "page_stats":
+                memory_manager.display_replacement_stats()
+
+            elif command.startswith("set_policy"):
+                parts = command.split()
+                if len(parts) != 2:
+                    print("Usage: set_policy <lru|clock|lfu|arc>")
+                else:
+                    memory_manager.set_replacement_policy(parts[1])
+                    print(f"Page replacement policy set to {parts[1]}.")
+
             # File Management
             elif command.startswith("create_file"):
                 parts = command.split(" ", 1)
@@ -157,22 +297,41 @@ def start_shell():
 
             elif command.startswith("read_file"):
                 parts = command.split(" ", 1)
+                ranged = READ_MODE.match(parts[1]) if len(parts) > 1 else None
                 if len(parts) < 2:
-                    print("Usage: read_file <filename>")
+                    print("Usage: read_file <filename> [head [lines] | tail [lines] | range <offset> <length>]")
+                elif ranged:
+                    filename, mode = ranged.group(1), ranged.group(2) or ranged.group(4)
+                    view = file_manager.open_view(filename)
+                    if view is not None:
+                        with view:
+                            if mode == "range":
+                                data = view.read(int(ranged.group(5)), int(ranged.group(6)))
+                            else:
+                                lines = int(ranged.group(3)) if ranged.group(3) else 10
+                                data = view.head(lines) if mode == "head" else view.tail(lines)
+                            # Only the requested slice is copied and decoded
+                            text = bytes(data).decode("utf-8", errors="replace")
+                            sys.stdout.write(text if text.endswith("\n") or not text else text + "\n")
+                            print(f"[{len(data)} of {view.size} bytes]")
                 else:
                     filename = parts[1]
-                    content = file_manager.read_file(filename)
-                    if content is not None:
-                        print("File content:\n" + content)
+                    chunks = file_manager.iter_read(filename)
+                    if chunks is not None:
+                        print("File content:")
+                        for chunk in chunks:
+                            sys.stdout.write(chunk)
+                        print()
 
             elif command.startswith("write_file"):
-                parts = command.split(" ", 2)
+                encrypt = command.startswith("write_file -e ")
+                parts = command.replace(" -e ", " ", 1).split(" ", 2) if encrypt else command.split(" ", 2)
                 if len(parts) < 3:
-                    print("Usage: write_file <filename> <content>")
+                    print("Usage: write_file [-e] <filename> <content>")
                 else:
                     filename = parts[1]
                     content = parts[2]
-                    if file_manager.write_file(filename, content):
+                    if file_manager.write_file(filename, content, encrypt=encrypt):
                         print(f"Written to file '{filename}'.")
                     else:
                         print(f"Failed to write to file '{filename}'.")
@@ -190,11 +349,130 @@ def start_shell():
 
             elif command.startswith("list_dir"):
                 parts = command.split(" ", 1)
-                path = parts[1] if len(parts) > 1 else "."
-                contents = file_manager.list_directory(path)
-                print(f"Contents of '{path}':")
-                for item in contents:
-                    print(" -", item)
+                path = parts[1].strip() if len(parts) > 1 else "."
+                page = 0
+                head, _, last = path.rpartition(" ")
+                if last.isdigit():
+                    path, page = head or ".", int(last) - 1
+                result = file_manager.list_page(path, max(page, 0), LIST_PAGE_SIZE)
+                if result is not None:
+                    entries, total = result
+                    pages = max(1, -(-total // LIST_PAGE_SIZE))
+                    print(f"Contents of '{path}' (page {page + 1} of {pages}, {total} entries):")
+                    for entry in entries:
+                        modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.mtime))
+                        size = "-" if entry.kind == "dir" else entry.size
+                        print(f" {entry.kind:<5} {size:>12} {modified}  {entry.name}")
+                    if page + 1 < pages:
+                        print(f"Next page: list_dir {path} {page + 2}")
+
+            elif command.startswith("find"):
+                parts = command.split(" ", 1)
+                if len(parts) < 2:
+                    print("Usage: find <pattern>  (e.g. find **/*.txt)")
+                else:
+                    count = 0
+                    for match in file_manager.glob(parts[1].strip()):
+                        print(" -", match)
+                        count += 1
+                    print(f"{count} matches")
+
+            # IPC
+            elif command.startswith("send"):
+                parts = command.split(maxsplit=3)
+                if len(parts) != 4:
+                    print("Usage: send <from_pid> <to_pid> <message>")
+                else:
+                    sender, receiver = int(parts[1]), int(parts[2])
+                    if ipc.send(sender, receiver, parts[3], block=True, timeout=0):
+                        print(f"Message queued for PID {receiver}")
+                    else:
+                        print(f"Mailbox of PID {receiver} is full")
+
+            elif command.startswith("receive"):
+                parts = command.split()
+                if len(parts) not in (2, 3):
+                    print("Usage: receive <pid> [max]")
+                else:
+                    pid = int(parts[1])
+                    messages = ipc.receive(pid, int(parts[2]) if len(parts) > 2 else None,
+                                           block=True, timeout=0)
+                    for sender, message in messages:
+                        print(f" - from {sender}: {message}")
+                    print(f"{len(messages)} messages" if messages else f"No messages for PID {pid}")
+
+            elif command.startswith("subscribe"):
+                parts = command.split()
+                if len(parts) not in (3, 4, 5):
+                    print("Usage: subscribe <pid> <pattern> [block|drop|drop_oldest] [size]")
+                else:
+                    if bus is None:
+                        import event_bus
+                        bus = event_bus.BusThread()
+                    policy = parts[3] if len(parts) > 3 else None
+                    size = int(parts[4]) if len(parts) > 4 else None
+                    if bus.forward(parts[2], ipc, int(parts[1]), size, policy):
+                        print(f"PID {parts[1]} subscribed to '{parts[2]}'")
+
+            elif command.startswith("unsubscribe"):
+                parts = command.split()
+                if len(parts) != 3:
+                    print("Usage: unsubscribe <pid> <pattern>")
+                elif bus is None or not bus.unsubscribe(int(parts[1]), parts[2]):
+                    print(f"PID {parts[1]} is not subscribed to '{parts[2]}'")
+                else:
+                    print(f"PID {parts[1]} unsubscribed from '{parts[2]}'")
+
+            elif command.startswith("publish"):
+                parts = command.split(maxsplit=2)
+                if len(parts) != 3:
+                    print("Usage: publish <topic> <message>")
+                elif bus is None:
+                    print("No subscribers")
+                else:
+                    count = bus.publish(parts[1], parts[2], PUBLISH_TIMEOUT)
+                    if count is not None:
+                        print(f"Published to {count} subscribers")
+
+            elif command == "bus_stats":
+                if bus is not None:
+                    print(bus.stats())
+                    for subscription in bus.subscription_stats():
+                        print(" - {pid} <- {pattern} ({policy}): {queued}/{maxsize} queued, "
+                              "{delivered} delivered, {dropped} dropped".format(**subscription))
+                for pid, mailbox in sorted(ipc.stats().items()):
+                    print(" - mailbox {}: {queued}/{capacity} queued, {sent} sent, {received} received, "
+                          "{rejected} refused".format(pid, **mailbox))
+
+            # System
+            elif command.startswith("events"):
+                filters = {"limit": "50"}
+                for part in command.split()[1:]:
+                    key, _, value = part.partition("=")
+                    filters[key] = value
+                unknown = set(filters) - {"pid", "type", "user", "since", "until", "limit"}
+                if unknown:
+                    print("Usage: events [pid=N] [type=T] [user=U] [since=T] [until=T] [limit=N]")
+                else:
+                    # The latest `limit` matches, shown oldest first; limit=0
+                    # streams every match from the start of the log
+                    limit = int(filters["limit"]) or None
+                    events = event_log.query(
+                        since=filters.get("since"),
+                        until=filters.get("until"),
+                        pid=int(filters["pid"]) if "pid" in filters else None,
+                        event_type=filters.get("type"),
+                        user=filters.get("user"),
+                        limit=limit,
+                        newest_first=limit is not None,
+                    )
+                    if limit is not None:
+                        events = reversed(list(events))
+                    count = 0
+                    for event in events:
+                        print(format_event(event))
+                        count += 1
+                    print(f"{count} events")
 
             else:
                 print(f"Command not recognized: {command}. Type 'help' for available commands.")
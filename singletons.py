@@ -0,0 +1,31 @@
+# singletons.py - shared module-level instances, built on first use
+import sys
+import threading
+
+_lock = threading.RLock()
+
+def lazy(module_name, attr, factory):
+    # Returns (getter, module __getattr__) for a module attribute that is
+    # created by factory() the first time it is read, so importing the module
+    # has no side effects. Usage, at the end of a module:
+    #   get_thing, __getattr__ = singletons.lazy(__name__, "thing", Thing)
+    # `module.thing`, `from module import thing` and get_thing() all return
+    # the same instance; after the first call it is a plain module attribute.
+    module = sys.modules[module_name]
+
+    def get():
+        value = module.__dict__.get(attr)
+        if value is None:
+            with _lock:
+                value = module.__dict__.get(attr)
+                if value is None:
+                    value = factory()
+                    setattr(module, attr, value)
+        return value
+
+    def __getattr__(name):
+        if name == attr:
+            return get()
+        raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+
+    return get, __getattr__
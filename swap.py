@@ -0,0 +1,162 @@
+# swap.py - memory-mapped swap device for MemoryManager.disk
+import mmap
+import os
+import pickle
+import struct
+from collections.abc import MutableMapping
+
+import logger
+
+system_logger = logger.system_logger
+
+_SLOT_HEADER = struct.Struct("<BI")  # payload kind, payload length
+_KIND_NONE, _KIND_BYTES, _KIND_STR, _KIND_PICKLE = range(4)
+
+class SwapDevice(MutableMapping):
+    # A swap file split into fixed-size page slots and mapped into memory.
+    # Swapping a page out or in is a copy into / out of the mapping; dirty
+    # slots are msync'ed to disk in batches. The file is created sparse, so
+    # the swap area can be far larger than host RAM. Behaves like a dict of
+    # {virtual page: data}, which is what MemoryManager.disk expects.
+    # Pages keep their slot while resident (a clean page is not written
+    # back), so when every slot is taken the device doubles, up to
+    # max_slots (None: no limit).
+    def __init__(self, path, slots=4096, slot_size=4096, batch_size=256, max_slots=None):
+        if slot_size <= _SLOT_HEADER.size:
+            raise ValueError("Swap slot size is too small")
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.batch_size = batch_size
+        self.max_slots = max_slots
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "w+b")
+        self._file.truncate(slots * slot_size)
+        self._map = mmap.mmap(self._file.fileno(), slots * slot_size)
+        self.slot_map = bytearray(slots)  # 1 = slot in use
+        self._free_slots = []  # released slots, reused first
+        self._next_slot = 0  # slots at or above this were never used
+        self._index = {}  # {page: slot}
+        self._dirty = set()  # slots written since the last flush
+        self.writes = 0
+        self.reads = 0
+        self.flushes = 0
+        system_logger.log(f"Swap device opened: {path} ({slots} slots of {slot_size} bytes)")
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __contains__(self, page):
+        return page in self._index
+
+    def _encode(self, data):
+        if data is None:
+            return _KIND_NONE, b""
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return _KIND_BYTES, data
+        if isinstance(data, str):
+            return _KIND_STR, data.encode()
+        return _KIND_PICKLE, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __setitem__(self, page, data):
+        kind, payload = self._encode(data)
+        if len(payload) > self.slot_size - _SLOT_HEADER.size:
+            raise ValueError(f"Page {page} does not fit in a {self.slot_size}-byte swap slot")
+        slot = self._index.get(page)
+        if slot is None:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                if self._next_slot == self.slots:
+                    self._grow()
+                slot = self._next_slot
+                self._next_slot += 1
+            self.slot_map[slot] = 1
+            self._index[page] = slot
+        offset = slot * self.slot_size
+        _SLOT_HEADER.pack_into(self._map, offset, kind, len(payload))
+        start = offset + _SLOT_HEADER.size
+        self._map[start:start + len(payload)] = payload
+        self.writes += 1
+        self._dirty.add(slot)
+        if len(self._dirty) >= self.batch_size:
+            self.flush()
+
+    def __getitem__(self, page):
+        slot = self._index[page]
+        offset = slot * self.slot_size
+        kind, length = _SLOT_HEADER.unpack_from(self._map, offset)
+        start = offset + _SLOT_HEADER.size
+        self.reads += 1
+        if kind == _KIND_NONE:
+            return None
+        payload = self._map[start:start + length]
+        if kind == _KIND_BYTES:
+            return payload
+        if kind == _KIND_STR:
+            return payload.decode()
+        return pickle.loads(payload)
+
+    def __delitem__(self, page):
+        slot = self._index.pop(page)
+        self.slot_map[slot] = 0
+        self._dirty.discard(slot)
+        self._free_slots.append(slot)
+
+    def _grow(self):
+        slots = self.slots * 2 if self.max_slots is None else min(self.slots * 2, self.max_slots)
+        if slots <= self.slots:
+            raise MemoryError("Swap device is full")
+        self.flush()
+        self._map.resize(slots * self.slot_size)  # extends the (sparse) file too
+        self.slot_map.extend(bytes(slots - self.slots))
+        system_logger.log(f"Swap device grown: {self.path} ({self.slots} -> {slots} slots)")
+        self.slots = slots
+
+    def flush(self):
+        # msync the dirty slots, merging neighbours into page-aligned ranges
+        if not self._dirty:
+            return
+        granularity = mmap.PAGESIZE
+        ranges = []
+        for slot in sorted(self._dirty):
+            start = (slot * self.slot_size) // granularity * granularity
+            end = (slot + 1) * self.slot_size
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], end)
+            else:
+                ranges.append([start, end])
+        for start, end in ranges:
+            self._map.flush(start, end - start)
+        self._dirty.clear()
+        self.flushes += 1
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "slots_used": len(self._index),
+            "slots_total": self.slots,
+            "slot_size": self.slot_size,
+            "writes": self.writes,
+            "reads": self.reads,
+            "flushes": self.flushes,
+            "dirty_slots": len(self._dirty),
+        }
+
+    def close(self):
+        if self._map.closed:
+            return
+        self.flush()
+        self._map.close()
+        self._file.close()
+        system_logger.log(f"Swap device closed: {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,254 @@
+# trace_replay.py - replay page-reference traces through MemoryManager
+#
+# Usage:
+#   python trace_replay.py --trace refs.txt --policies lru,arc --frames 256,1024
+#   python trace_replay.py --synthetic zipf --length 1000000 --pages 50000 --workers 4
+#   python trace_replay.py --synthetic loop --length 100000 --write-trace loop.bin
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from memory_management import MemoryManager
+
+WRITE_FLAG = 1 << 63  # Binary traces: little-endian uint64, top bit = write
+CHUNK_RECORDS = 1 << 16
+
+# Trace readers yield (page, is_write) pairs and never hold the whole file
+
+def read_text_trace(path):
+    # One reference per line: "42", "42 w", "W 42" or "R 42"; '#' starts a comment
+    with open(path) as f:
+        for line in f:
+            parts = line.split("#", 1)[0].split()
+            if not parts:
+                continue
+            if parts[0] in ("R", "W", "r", "w"):
+                yield int(parts[1]), parts[0] in ("W", "w")
+            else:
+                yield int(parts[0]), len(parts) > 1 and parts[1] in ("W", "w")
+
+def read_binary_trace(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_RECORDS * 8)
+            if not chunk:
+                break
+            records = array("Q")
+            records.frombytes(chunk[:len(chunk) - len(chunk) % 8])
+            if sys.byteorder != "little":
+                records.byteswap()
+            for record in records:
+                yield record & ~WRITE_FLAG, bool(record & WRITE_FLAG)
+
+def write_binary_trace(path, references):
+    count = 0
+    with open(path, "wb") as f:
+        for batch in _batched(references, CHUNK_RECORDS):
+            records = array("Q", (page | WRITE_FLAG if write else page for page, write in batch))
+            if sys.byteorder != "little":
+                records.byteswap()
+            f.write(records.tobytes())
+            count += len(records)
+    return count
+
+def write_text_trace(path, references):
+    count = 0
+    with open(path, "w") as f:
+        for page, write in references:
+            f.write(f"{page} w\n" if write else f"{page}\n")
+            count += 1
+    return count
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+# Synthetic workloads
+
+def _with_writes(pages, write_ratio, rng):
+    if not write_ratio:
+        return ((page, False) for page in pages)
+    return ((page, rng.random() < write_ratio) for page in pages)
+
+def sequential_trace(length, pages, write_ratio=0.0, seed=0):
+    # Scan pages 0..pages-1 over and over
+    rng = random.Random(seed)
+    return _with_writes((i % pages for i in range(length)), write_ratio, rng)
+
+def looping_trace(length, loop_size, pages=None, write_ratio=0.0, seed=0):
+    # Repeated loop over loop_size pages starting at a random offset
+    rng = random.Random(seed)
+    base = rng.randrange(max((pages or loop_size) - loop_size, 0) + 1)
+    return _with_writes((base + i % loop_size for i in range(length)), write_ratio, rng)
+
+def zipf_trace(length, pages, alpha=1.0, write_ratio=0.0, seed=0):
+    # Popularity ~ 1 / rank**alpha, with ranks scattered over the page range
+    rng = random.Random(seed)
+    cumulative = list(itertools.accumulate(1 / rank ** alpha for rank in range(1, pages + 1)))
+    placement = list(range(pages))
+    rng.shuffle(placement)
+
+    def generate():
+        remaining = length
+        while remaining:
+            batch = min(remaining, CHUNK_RECORDS)
+            for rank in rng.choices(placement, cum_weights=cumulative, k=batch):
+                yield rank
+            remaining -= batch
+    return _with_writes(generate(), write_ratio, rng)
+
+SYNTHETIC = {
+    "sequential": sequential_trace,
+    "loop": looping_trace,
+    "zipf": zipf_trace,
+}
+
+def open_trace(spec):
+    # spec is a picklable tuple so each worker process can reopen the trace
+    kind = spec[0]
+    if kind == "text":
+        return read_text_trace(spec[1])
+    if kind == "binary":
+        return read_binary_trace(spec[1])
+    if kind == "synthetic":
+        _, name, kwargs = spec
+        return SYNTHETIC[name](**kwargs)
+    raise ValueError(f"Unknown trace kind: {kind}")
+
+def replay(spec, policy, frames, reserve=0, limit=None, swap_dir=None, swap_slots=None):
+    # One simulation: `frames` page frames, of which `reserve` are pinned by an
+    # ordinary allocation, the rest are demand-paged by the trace
+    swap_path = None
+    if swap_dir:
+        swap_path = os.path.join(swap_dir, f"swap-{policy}-{frames}-{os.getpid()}.img")
+    manager = MemoryManager(total_memory=frames, page_size=1, replacement_policy=policy,
+                            swap_path=swap_path, swap_slots=swap_slots or _swap_slots(spec),
+                            swap_slot_size=64)
+    try:
+        if reserve and not manager.allocate_memory(reserve, pid=0):
+            raise ValueError(f"Cannot reserve {reserve} of {frames} frames")
+        references = open_trace(spec)
+        if limit is not None:
+            references = itertools.islice(references, limit)
+
+        fault = manager.handle_page_fault
+        count = 0
+        started = time.perf_counter()
+        for page, write in references:
+            fault(page, write)
+            count += 1
+        elapsed = time.perf_counter() - started
+    finally:
+        manager.close()
+        if swap_path:
+            os.remove(swap_path)
+
+    stats = manager.replacement_stats()
+    return {
+        "policy": policy,
+        "frames": frames,
+        "references": count,
+        "faults": stats["misses"],
+        "fault_rate": stats["misses"] / count if count else 0.0,
+        "hit_ratio": stats["hit_ratio"],
+        "evictions": stats["evictions"],
+        "writebacks": stats["writebacks"],
+        "seconds": elapsed,
+        "events_per_second": count / elapsed if elapsed else 0.0,
+    }
+
+def _swap_slots(spec):
+    # Enough slots for every distinct page a synthetic trace can touch;
+    # for trace files the swap device starts smaller and grows
+    if spec[0] == "synthetic":
+        kwargs = spec[2]
+        return kwargs.get("pages") or kwargs.get("loop_size")
+    return None
+
+def compare(spec, policies, frame_counts, workers=None, reserve=0, limit=None,
+            swap_dir=None, swap_slots=None):
+    # Run every (policy, frames) pair, in parallel across a process pool
+    jobs = [(spec, policy, frames, reserve, limit, swap_dir, swap_slots)
+            for frames in frame_counts for policy in policies]
+    if workers == 1 or len(jobs) == 1:
+        return [replay(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(replay, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+def print_results(results):
+    print(f"{'policy':<8}{'frames':>10}{'refs':>12}{'faults':>12}{'fault rate':>12}"
+          f"{'hit ratio':>11}{'writebacks':>12}{'events/s':>14}")
+    for r in results:
+        print(f"{r['policy']:<8}{r['frames']:>10,}{r['references']:>12,}{r['faults']:>12,}"
+              f"{r['fault_rate']:>12.4f}{r['hit_ratio']:>11.4f}{r['writebacks']:>12,}"
+              f"{r['events_per_second']:>14,.0f}")
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Replay page-reference traces through MemoryManager")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--trace", help="trace file to replay")
+    source.add_argument("--synthetic", choices=sorted(SYNTHETIC), help="generate a synthetic trace")
+    parser.add_argument("--format", choices=["auto", "text", "binary"], default="auto")
+    parser.add_argument("--length", type=int, default=1_000_000, help="synthetic references")
+    parser.add_argument("--pages", type=int, default=100_000, help="synthetic page range")
+    parser.add_argument("--loop-size", type=int, default=5_000, help="loop workload size")
+    parser.add_argument("--alpha", type=float, default=1.0, help="zipf skew")
+    parser.add_argument("--write-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--policies", default="lru,clock,lfu,arc")
+    parser.add_argument("--frames", default="1024,4096,16384")
+    parser.add_argument("--reserve", type=int, default=0, help="frames pinned by an allocation")
+    parser.add_argument("--limit", type=int, help="stop after this many references")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--swap-dir", help="swap to memory-mapped files in this directory")
+    parser.add_argument("--swap-slots", type=int,
+                        help="initial slots per swap file, grown when full (default: synthetic page range, else 4x frames)")
+    parser.add_argument("--write-trace", help="save the synthetic trace (.txt = text, else binary) and exit")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.trace:
+        fmt = args.format
+        if fmt == "auto":
+            fmt = "text" if args.trace.endswith((".txt", ".trace")) else "binary"
+        spec = (fmt, args.trace)
+    else:
+        kwargs = {"length": args.length, "write_ratio": args.write_ratio, "seed": args.seed}
+        if args.synthetic == "loop":
+            kwargs.update(loop_size=args.loop_size, pages=args.pages)
+        elif args.synthetic == "zipf":
+            kwargs.update(pages=args.pages, alpha=args.alpha)
+        else:
+            kwargs.update(pages=args.pages)
+        spec = ("synthetic", args.synthetic, kwargs)
+
+    if args.write_trace:
+        writer = write_text_trace if args.write_trace.endswith(".txt") else write_binary_trace
+        count = writer(args.write_trace, open_trace(spec))
+        print(f"Wrote {count:,} references to {args.write_trace}")
+        return
+
+    policies = [p.strip() for p in args.policies.split(",") if p.strip()]
+    frame_counts = [int(f) for f in args.frames.split(",") if f.strip()]
+    started = time.perf_counter()
+    results = compare(spec, policies, frame_counts, args.workers, args.reserve, args.limit,
+                      args.swap_dir, args.swap_slots)
+    print_results(results)
+    total = sum(r["references"] for r in results)
+    elapsed = time.perf_counter() - started
+    print(f"\n{len(results)} runs, {total:,} references in {elapsed:.2f}s "
+          f"({total / elapsed:,.0f} references/s overall)")
+
+if __name__ == "__main__":
+    main()
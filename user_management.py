@@ -1,45 +1,226 @@
 # user_management.py
+import collections
 import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import threading
+import time
 import logger
+import singletons
+from event_log import event_log
+
+# Accounts live in a SQLite table keyed by username, opened on first use, so
+# lookups stay fast with 100k+ users and nothing is loaded up front. A new
+# store is seeded with DEFAULT_USERS. Passwords are salted PBKDF2-HMAC-SHA256
+# hashes computed on a thread pool (OpenSSL releases the GIL), so concurrent
+# logins hash in parallel instead of queueing behind each other.
+# start_session() returns a token that validate_session() checks in O(1)
+# against an in-memory table; each use extends a session by session_ttl.
+DEFAULT_USERS = {"admin": "admin123", "user": "password123"}
+_DUMMY_SALT = b"\0" * 16
 
 class UserManager:
-    def __init__(self, logger=None):  # Make logger optional
-        self.users = {
-            "admin": self._hash_password("admin123"),
-            "user": self._hash_password("password123")
-        }
-        self.current_user = None
+    def __init__(self, logger=None, db_path="users.db", iterations=200_000, hash_workers=None,
+                 session_ttl=3600, max_sessions=100_000):  # Make logger optional
         self.logger = logger
+        self.db_path = db_path
+        self.iterations = iterations
+        self.hash_workers = hash_workers or os.cpu_count() or 1
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        self.current_user = None
+        self._db = None
+        self._pool = None
+        self._lock = threading.RLock()
+        self._sessions = collections.OrderedDict()  # {token: (username, expires)}, soonest expiry first
+        self._user_sessions = {}  # {username: {token: None}}
+
+    def _conn(self):
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    directory = os.path.dirname(self.db_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+                    db.execute("PRAGMA journal_mode=WAL")
+                    db.execute("""CREATE TABLE IF NOT EXISTS users (
+                        username TEXT PRIMARY KEY, salt BLOB NOT NULL, hash BLOB NOT NULL,
+                        iterations INTEGER NOT NULL, created REAL NOT NULL)""")
+                    self._db = db
+                    if db.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None:
+                        self.create_users(DEFAULT_USERS)
+        return self._db
+
+    def _hash(self, password, salt, iterations):
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+    def _hash_async(self, password, salt, iterations):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._pool = ThreadPoolExecutor(self.hash_workers, thread_name_prefix="password-hash")
+        return self._pool.submit(self._hash, password, salt, iterations)
 
-    def _hash_password(self, password):
-        return hashlib.sha256(password.encode()).hexdigest()
+    def _verify(self, username, password):
+        db = self._conn()
+        with self._lock:
+            row = db.execute("SELECT salt, hash, iterations FROM users WHERE username = ?",
+                             (username,)).fetchone()
+        if row is None:
+            # Hash anyway, so unknown users take as long as wrong passwords
+            self._hash_async(password, _DUMMY_SALT, self.iterations).result()
+            return False
+        salt, expected, iterations = row
+        return hmac.compare_digest(self._hash_async(password, salt, iterations).result(), expected)
 
     def login(self, username, password):
-        if username in self.users:
-            if self.users[username] == self._hash_password(password):
-                self.current_user = username
-                if self.logger:
-                    self.logger.log(f"User logged in: {username}")
-                return True
+        if self._verify(username, password):
+            self.current_user = username
+            if self.logger:
+                self.logger.log(f"User logged in: {username}")
+            event_log.record("user_login", user=username)
+            return True
         if self.logger:
             self.logger.log(f"Failed login attempt for: {username}")
+        event_log.record("user_login_failed", user=username)
         return False
 
+    # Sessions
+
+    def start_session(self, username, password):
+        # Log in and return a new session token, or None
+        if not self.login(username, password):
+            return None
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            while len(self._sessions) >= self.max_sessions:
+                self._drop_session(next(iter(self._sessions)))
+            self._sessions[token] = (username, now + self.session_ttl)
+            self._user_sessions.setdefault(username, {})[token] = None
+        return token
+
+    def validate_session(self, token):
+        # Username of a live session, extending it by session_ttl, or None
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            now = time.monotonic()
+            if entry[1] <= now:
+                self._drop_session(token)
+                return None
+            self._sessions[token] = (entry[0], now + self.session_ttl)
+            self._sessions.move_to_end(token)
+            return entry[0]
+
+    def end_session(self, token):
+        with self._lock:
+            if token not in self._sessions:
+                return False
+            username = self._drop_session(token)
+        if self.logger:
+            self.logger.log(f"User logged out: {username}")
+        return True
+
+    def _expire(self, now):
+        # Every session gets the same TTL, so the oldest entries expire first
+        while self._sessions:
+            token, (_, expires) = next(iter(self._sessions.items()))
+            if expires > now:
+                break
+            self._drop_session(token)
+
+    def _drop_session(self, token):
+        username, _ = self._sessions.pop(token)
+        tokens = self._user_sessions[username]
+        del tokens[token]
+        if not tokens:
+            del self._user_sessions[username]
+        return username
+
+    def _end_user_sessions(self, username):
+        with self._lock:
+            for token in list(self._user_sessions.get(username, ())):
+                self._drop_session(token)
+
+    # Accounts
+
+    def create_users(self, accounts):
+        # Add {username: password} in one transaction, hashing in parallel;
+        # existing usernames are skipped. Returns the number created.
+        salts = {username: secrets.token_bytes(16) for username in accounts}
+        futures = [(username, self._hash_async(password, salts[username], self.iterations))
+                   for username, password in accounts.items()]
+        now = time.time()
+        rows = [(username, salts[username], future.result(), self.iterations, now)
+                for username, future in futures]
+        db = self._conn()
+        with self._lock:
+            before = db.total_changes
+            db.execute("BEGIN")
+            try:
+                db.executemany("INSERT OR IGNORE INTO users (username, salt, hash, iterations, created) "
+                               "VALUES (?, ?, ?, ?, ?)", rows)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return db.total_changes - before
+
     def create_user(self, username, password):
-        if username not in self.users:
-            self.users[username] = self._hash_password(password)
+        if self.create_users({username: password}):
             if self.logger:
                 self.logger.log(f"User created: {username}")
             return True
         return False
 
     def change_password(self, username, old_password, new_password):
-        if self.login(username, old_password):
-            self.users[username] = self._hash_password(new_password)
+        # Verified without logging a login; existing sessions are ended
+        if not self._verify(username, old_password):
             if self.logger:
-                self.logger.log(f"Password changed for: {username}")
-            return True
-        return False
+                self.logger.log(f"Failed password change for: {username}")
+            return False
+        salt = secrets.token_bytes(16)
+        digest = self._hash_async(new_password, salt, self.iterations).result()
+        db = self._conn()
+        with self._lock:
+            db.execute("UPDATE users SET salt = ?, hash = ?, iterations = ? WHERE username = ?",
+                       (salt, digest, self.iterations, username))
+        self._end_user_sessions(username)
+        if self.logger:
+            self.logger.log(f"Password changed for: {username}")
+        return True
+
+    def user_exists(self, username):
+        db = self._conn()
+        with self._lock:
+            return db.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone() is not None
+
+    def stats(self):
+        db = self._conn()
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "db_path": self.db_path,
+                "users": db.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+                "sessions": len(self._sessions),
+                "hash_workers": self.hash_workers,
+                "iterations": self.iterations,
+            }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
 
-# Default instance without logger for backward compatibility
-user_manager = UserManager()
\ No newline at end of file
+# Default instance without logger for backward compatibility, built on first use
+get_user_manager, __getattr__ = singletons.lazy(__name__, "user_manager", UserManager)
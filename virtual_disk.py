@@ -0,0 +1,660 @@
+# virtual_disk.py - single-image filesystem backend for FileManager
+import atexit
+import collections
+import errno
+import io
+import os
+import re
+import struct
+import threading
+import time
+
+from file_management import FileEntry
+
+# The whole filesystem lives in one preallocated image file, laid out in
+# blocks like a small ext2:
+#   0              superblock
+#   inode bitmap   one bit per inode (0 is never used, 1 is the root)
+#   block bitmap   one bit per block, metadata blocks included
+#   inode table    64-byte inodes: 8 direct block pointers, one indirect
+#                  and one double-indirect block
+#   data blocks    file contents, directory slots and indirect blocks
+# Directories are arrays of 64-byte slots (inode, name length, name), so a
+# name is at most 59 bytes of UTF-8. Blocks are read and written through a
+# write-back LRU cache; bitmaps are kept in memory. Nothing is journaled:
+# flush() (also run at exit and by close()) makes the image consistent.
+DISK_MAGIC = b"VDSK"
+DISK_VERSION = 1
+_SUPER = struct.Struct(">4sB3xIIIIIIIII")
+_INODE = struct.Struct(">HHQQI10I")  # kind, reserved, size, mtime_ns, generation, pointers
+_SLOT = struct.Struct(">IB59s")
+_PTR = struct.Struct(">I")
+INODE_SIZE = _INODE.size
+SLOT_SIZE = _SLOT.size
+DIRECT = 8
+ROOT = 1
+KIND_FREE, KIND_FILE, KIND_DIR = 0, 1, 2
+_SIZE, _MTIME, _GEN, _PTRS, _INDIRECT, _DOUBLE = 2, 3, 4, 5, 13, 14
+_NOT_FULL = re.compile(rb"[^\xff]")
+
+class BlockCache:
+    # Write-back LRU cache of image blocks. Dirty blocks reach the image when
+    # they are evicted (the oldest eighth of the cache at a time, written in
+    # block order so neighbours go out in one write) or on flush().
+    def __init__(self, f, block_size, capacity=4096):
+        self.f = f
+        self.block_size = block_size
+        self.capacity = max(16, capacity)
+        self.blocks = collections.OrderedDict()  # {block: bytearray}
+        self.dirty = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    def get(self, block):
+        data = self.blocks.get(block)
+        if data is not None:
+            self.blocks.move_to_end(block)
+            self.hits += 1
+            return data
+        self.misses += 1
+        self.f.seek(block * self.block_size)
+        data = bytearray(self.f.read(self.block_size))
+        if len(data) < self.block_size:
+            data.extend(bytes(self.block_size - len(data)))
+        self._insert(block, data)
+        return data
+
+    def new(self, block):
+        # A freshly allocated block starts zeroed; the image is not read
+        data = bytearray(self.block_size)
+        self.blocks.pop(block, None)
+        self._insert(block, data)
+        self.dirty.add(block)
+        return data
+
+    def write(self, block, offset, data):
+        self.get(block)[offset:offset + len(data)] = data
+        self.dirty.add(block)
+
+    def discard(self, block):
+        # A freed block: its contents no longer matter
+        self.blocks.pop(block, None)
+        self.dirty.discard(block)
+
+    def _insert(self, block, data):
+        self.blocks[block] = data
+        if len(self.blocks) > self.capacity:
+            victims = []
+            for _ in range(self.capacity // 8):
+                victim, contents = self.blocks.popitem(last=False)
+                self.evictions += 1
+                if victim in self.dirty:
+                    self.dirty.discard(victim)
+                    victims.append((victim, contents))
+            self._write(victims)
+
+    def _write(self, items):
+        items.sort(key=lambda item: item[0])
+        run_start, run = None, []
+        for block, data in items:
+            if run and block != run_start + len(run):
+                self._write_run(run_start, run)
+                run = []
+            if not run:
+                run_start = block
+            run.append(data)
+        if run:
+            self._write_run(run_start, run)
+
+    def _write_run(self, start, run):
+        self.f.seek(start * self.block_size)
+        self.f.write(b"".join(run))
+        self.writebacks += len(run)
+
+    def flush(self):
+        self._write([(block, self.blocks[block]) for block in self.dirty])
+        self.dirty.clear()
+
+class _Directory:
+    # Cached contents of one directory inode
+    __slots__ = ("names", "free", "slots")
+
+    def __init__(self):
+        self.names = {}  # {name: (inode, slot)}
+        self.free = []
+        self.slots = 0
+
+class _DiskReader(io.RawIOBase):
+    # Seekable reader for one inode; the inode outlives an unlink or
+    # overwrite until the reader is closed, as on a real filesystem
+    def __init__(self, disk, ino):
+        self.disk = disk
+        self.ino = ino
+        self.pos = 0
+        disk._readers[ino] += 1
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            with self.disk.lock:
+                offset += self.disk._inode(self.ino)[_SIZE]
+        self.pos = max(0, offset)
+        return self.pos
+
+    def readinto(self, buffer):
+        with self.disk.lock:
+            data = self.disk._read_at(self.disk._inode(self.ino), self.pos, len(buffer))
+        count = len(data)
+        buffer[:count] = data
+        self.pos += count
+        return count
+
+    def close(self):
+        if not self.closed:
+            self.disk._close_reader(self.ino)
+        super().close()
+
+class _DiskWriter:
+    # Writes go straight into a new, unlinked inode; close() links it under
+    # its name (replacing any previous file) and an exception inside `with`
+    # frees it instead
+    def __init__(self, disk, path):
+        self.disk = disk
+        self.path = path
+        self.ino = disk._alloc_inode(KIND_FILE)
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data):
+        with self.disk.lock:
+            self.disk._write_at(self.ino, self.disk._inode(self.ino), self.pos, data)
+        self.pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            with self.disk.lock:
+                offset += self.disk._inode(self.ino)[_SIZE]
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.disk._commit(self.path, self.ino)
+
+    def discard(self):
+        if not self.closed:
+            self.closed = True
+            with self.disk.lock:
+                self.disk._free_inode(self.ino)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+class VirtualDisk:
+    def __init__(self, image, size=256 * 1024 * 1024, block_size=4096, inode_count=None,
+                 cache_blocks=4096):
+        # Mounts image, formatting a new one of `size` bytes if it does not
+        # exist. inode_count defaults to one inode per block.
+        self.image = image
+        self.lock = threading.RLock()
+        if not os.path.exists(image):
+            self._format(image, size, block_size, inode_count)
+        self._file = open(image, "r+b", buffering=0)
+        self._mount()
+        self.cache = BlockCache(self._file, self.block_size, cache_blocks)
+        self._dirs = collections.OrderedDict()  # {inode: _Directory}, LRU
+        self._dir_cache_size = 1024
+        self._readers = collections.Counter()
+        self._orphans = set()
+        atexit.register(self.flush)
+
+    # Layout
+
+    @staticmethod
+    def _layout(block_size, blocks, inodes):
+        bits = block_size * 8
+        inode_bitmap = 1
+        block_bitmap = inode_bitmap + -(-inodes // bits)
+        inode_table = block_bitmap + -(-blocks // bits)
+        data = inode_table + -(-inodes * INODE_SIZE // block_size)
+        return inode_bitmap, block_bitmap, inode_table, data
+
+    @staticmethod
+    def _bitmap(count, used):
+        # Bits past `count` in the last byte are set so they are never handed out
+        bitmap = bytearray(-(-count // 8))
+        for i in list(range(used)) + list(range(count, len(bitmap) * 8)):
+            bitmap[i >> 3] |= 1 << (i & 7)
+        return bitmap
+
+    def _format(self, image, size, block_size, inode_count):
+        if block_size < 512 or block_size & (block_size - 1):
+            raise ValueError("block_size must be a power of two, at least 512")
+        blocks = size // block_size
+        inodes = inode_count or blocks
+        inode_bitmap, block_bitmap, inode_table, data = self._layout(block_size, blocks, inodes)
+        if data >= blocks:
+            raise ValueError(f"Image of {size} bytes is too small for its metadata")
+        inode_bits = self._bitmap(inodes, ROOT + 1)
+        block_bits = self._bitmap(blocks, data)
+        with open(image, "wb") as f:
+            f.truncate(blocks * block_size)
+            if hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(f.fileno(), 0, blocks * block_size)
+                except OSError:
+                    pass  # sparse image on filesystems without fallocate
+            f.write(_SUPER.pack(DISK_MAGIC, DISK_VERSION, block_size, blocks, inodes, inode_bitmap,
+                                block_bitmap, inode_table, data, blocks - data, inodes - ROOT - 1))
+            f.seek(inode_bitmap * block_size)
+            f.write(inode_bits)
+            f.seek(block_bitmap * block_size)
+            f.write(block_bits)
+            f.seek(inode_table * block_size + ROOT * INODE_SIZE)
+            f.write(_INODE.pack(KIND_DIR, 0, 0, time.time_ns(), 1, *[0] * 10))
+
+    def _mount(self):
+        header = self._file.read(_SUPER.size)
+        if len(header) < _SUPER.size or header[:4] != DISK_MAGIC:
+            raise ValueError(f"{self.image} is not a virtual disk image")
+        (_, version, self.block_size, self.blocks, self.inodes, self.inode_bitmap_start,
+         self.block_bitmap_start, self.inode_table_start, self.data_start, self.free_blocks,
+         self.free_inodes) = _SUPER.unpack(header)
+        if version != DISK_VERSION:
+            raise ValueError(f"Unsupported disk image version: {version}")
+        self.ptrs_per_block = self.block_size // _PTR.size
+        self._file.seek(self.inode_bitmap_start * self.block_size)
+        self.inode_bits = bytearray(self._file.read(-(-self.inodes // 8)))
+        self._file.seek(self.block_bitmap_start * self.block_size)
+        self.block_bits = bytearray(self._file.read(-(-self.blocks // 8)))
+        self._inode_hint = 0
+        self._block_hint = self.data_start >> 3
+        self._dirty_bitmaps = set()  # {(start block, bitmap block)}
+
+    # Allocation
+
+    def _take_bit(self, bitmap, hint):
+        match = _NOT_FULL.search(bitmap, hint) or _NOT_FULL.search(bitmap, 0, hint)
+        if match is None:
+            return None
+        i = match.start()
+        byte = bitmap[i]
+        bit = (~byte & (byte + 1)).bit_length() - 1
+        bitmap[i] = byte | (1 << bit)
+        return i * 8 + bit
+
+    def _mark_bitmap(self, start, i):
+        self._dirty_bitmaps.add((start, (i >> 3) // self.block_size))
+
+    def _new_block(self):
+        block = self._take_bit(self.block_bits, self._block_hint)
+        if block is None:
+            raise OSError(errno.ENOSPC, "No space left on virtual disk")
+        self._block_hint = block >> 3
+        self._mark_bitmap(self.block_bitmap_start, block)
+        self.free_blocks -= 1
+        self.cache.new(block)
+        return block
+
+    def _free_block(self, block):
+        self.block_bits[block >> 3] &= ~(1 << (block & 7))
+        self._block_hint = min(self._block_hint, block >> 3)
+        self._mark_bitmap(self.block_bitmap_start, block)
+        self.free_blocks += 1
+        self.cache.discard(block)
+
+    def _alloc_inode(self, kind):
+        with self.lock:
+            ino = self._take_bit(self.inode_bits, self._inode_hint)
+            if ino is None:
+                raise OSError(errno.ENOSPC, "No free inodes on virtual disk")
+            self._inode_hint = ino >> 3
+            self._mark_bitmap(self.inode_bitmap_start, ino)
+            self.free_inodes -= 1
+            generation = self._inode(ino)[_GEN] + 1
+            self._put_inode(ino, [kind, 0, 0, time.time_ns(), generation] + [0] * 10)
+            return ino
+
+    def _free_inode(self, ino):
+        node = self._inode(ino)
+        self._free_blocks(node)
+        self._put_inode(ino, [KIND_FREE, 0, 0, 0, node[_GEN]] + [0] * 10)
+        self.inode_bits[ino >> 3] &= ~(1 << (ino & 7))
+        self._inode_hint = min(self._inode_hint, ino >> 3)
+        self._mark_bitmap(self.inode_bitmap_start, ino)
+        self.free_inodes += 1
+        self._dirs.pop(ino, None)
+
+    def _release(self, ino):
+        # Free an unlinked inode now, or when its last reader closes
+        if self._readers[ino]:
+            self._orphans.add(ino)
+        else:
+            self._free_inode(ino)
+
+    def _close_reader(self, ino):
+        with self.lock:
+            self._readers[ino] -= 1
+            if not self._readers[ino]:
+                del self._readers[ino]
+                if ino in self._orphans:
+                    self._orphans.discard(ino)
+                    self._free_inode(ino)
+
+    # Inodes and block mapping
+
+    def _inode_location(self, ino):
+        offset = ino * INODE_SIZE
+        return self.inode_table_start + offset // self.block_size, offset % self.block_size
+
+    def _inode(self, ino):
+        block, offset = self._inode_location(ino)
+        return list(_INODE.unpack_from(self.cache.get(block), offset))
+
+    def _put_inode(self, ino, node):
+        block, offset = self._inode_location(ino)
+        self.cache.write(block, offset, _INODE.pack(*node))
+
+    def _pointer(self, block, i, allocate):
+        value = _PTR.unpack_from(self.cache.get(block), i * _PTR.size)[0]
+        if not value and allocate:
+            value = self._new_block()
+            self.cache.write(block, i * _PTR.size, _PTR.pack(value))
+        return value
+
+    def _bmap(self, node, index, allocate):
+        # Image block holding block `index` of a file, or 0 for a hole.
+        # Allocating may change node's pointers; the caller stores node.
+        ptrs = self.ptrs_per_block
+        if index < DIRECT:
+            if not node[_PTRS + index] and allocate:
+                node[_PTRS + index] = self._new_block()
+            return node[_PTRS + index]
+        index -= DIRECT
+        if index < ptrs:
+            slot, path = _INDIRECT, (index,)
+        else:
+            index -= ptrs
+            if index >= ptrs * ptrs:
+                raise OSError(errno.EFBIG, "File too large for virtual disk")
+            slot, path = _DOUBLE, divmod(index, ptrs)
+        if not node[slot]:
+            if not allocate:
+                return 0
+            node[slot] = self._new_block()
+        block = node[slot]
+        for i in path:
+            block = self._pointer(block, i, allocate)
+            if not block:
+                return 0
+        return block
+
+    def _free_blocks(self, node):
+        count = self.ptrs_per_block
+        for block in node[_PTRS:_PTRS + DIRECT]:
+            if block:
+                self._free_block(block)
+        indirect = [node[_INDIRECT]] if node[_INDIRECT] else []
+        if node[_DOUBLE]:
+            outer = struct.unpack(f">{count}I", self.cache.get(node[_DOUBLE]))
+            indirect.extend(block for block in outer if block)
+            self._free_block(node[_DOUBLE])
+        for table in indirect:
+            for block in struct.unpack(f">{count}I", self.cache.get(table)):
+                if block:
+                    self._free_block(block)
+            self._free_block(table)
+
+    def _read_at(self, node, offset, length):
+        end = min(node[_SIZE], offset + length)
+        size = self.block_size
+        parts = []
+        while offset < end:
+            index, within = divmod(offset, size)
+            count = min(size - within, end - offset)
+            block = self._bmap(node, index, False)
+            parts.append(bytes(self.cache.get(block)[within:within + count]) if block else bytes(count))
+            offset += count
+        return b"".join(parts)
+
+    def _write_at(self, ino, node, offset, data):
+        data = memoryview(data).cast("B")
+        size = self.block_size
+        done = 0
+        while done < len(data):
+            index, within = divmod(offset + done, size)
+            count = min(size - within, len(data) - done)
+            self.cache.write(self._bmap(node, index, True), within, data[done:done + count])
+            done += count
+        node[_SIZE] = max(node[_SIZE], offset + done)
+        node[_MTIME] = time.time_ns()
+        self._put_inode(ino, node)
+
+    # Directories
+
+    def _directory(self, ino):
+        # Cached slots of a directory inode, or None if ino is not a directory
+        directory = self._dirs.get(ino)
+        if directory is not None:
+            self._dirs.move_to_end(ino)
+            return directory
+        node = self._inode(ino)
+        if node[0] != KIND_DIR:
+            return None
+        directory = _Directory()
+        raw = self._read_at(node, 0, node[_SIZE])
+        for slot, (child, length, name) in enumerate(_SLOT.iter_unpack(raw)):
+            if child:
+                directory.names[name[:length].decode()] = (child, slot)
+            else:
+                directory.free.append(slot)
+        directory.slots = len(raw) // SLOT_SIZE
+        self._dirs[ino] = directory
+        if len(self._dirs) > self._dir_cache_size:
+            self._dirs.popitem(last=False)
+        return directory
+
+    def _set_slot(self, dir_ino, slot, child, name):
+        encoded = name.encode()
+        self._write_at(dir_ino, self._inode(dir_ino), slot * SLOT_SIZE,
+                       _SLOT.pack(child, len(encoded), encoded))
+
+    def _link(self, dir_ino, directory, name, child):
+        if len(name.encode()) > _SLOT.size - 5:
+            raise OSError(errno.ENAMETOOLONG, f"File name too long: '{name}'")
+        if directory.free:
+            slot = directory.free.pop()
+        else:
+            slot = directory.slots
+            directory.slots += 1
+        self._set_slot(dir_ino, slot, child, name)
+        directory.names[name] = (child, slot)
+
+    def _resolve(self, path):
+        # Inode number of path, or 0 if it does not exist
+        ino = ROOT
+        for part in path.split("/") if path else ():
+            directory = self._directory(ino)
+            entry = directory.names.get(part) if directory is not None else None
+            if entry is None:
+                return 0
+            ino = entry[0]
+        return ino
+
+    def _parent(self, path):
+        # (inode, cached directory, name) of path's parent directory
+        parent, _, name = path.rpartition("/")
+        if not name:
+            # "" is the root directory, which has no parent to link into
+            raise IsADirectoryError(f"Is a directory: '{path}'")
+        ino = self._resolve(parent)
+        directory = self._directory(ino) if ino else None
+        if directory is None:
+            raise FileNotFoundError(f"No such directory: '{parent}'")
+        return ino, directory, name
+
+    def _commit(self, path, ino):
+        with self.lock:
+            try:
+                dir_ino, directory, name = self._parent(path)
+                entry = directory.names.get(name)
+                if entry and self._inode(entry[0])[0] == KIND_DIR:
+                    raise IsADirectoryError(f"Is a directory: '{path}'")
+                if entry:
+                    self._set_slot(dir_ino, entry[1], ino, name)
+                    directory.names[name] = (ino, entry[1])
+                    self._release(entry[0])
+                else:
+                    self._link(dir_ino, directory, name, ino)
+            except BaseException:
+                self._free_inode(ino)
+                raise
+
+    # FileManager storage interface
+
+    def open_read(self, path):
+        with self.lock:
+            ino = self._resolve(path)
+            if not ino or self._inode(ino)[0] != KIND_FILE:
+                raise FileNotFoundError(f"No such file: '{path}'")
+            return io.BufferedReader(_DiskReader(self, ino), 64 * 1024)
+
+    def open_write(self, path):
+        with self.lock:
+            self._parent(path)
+            return _DiskWriter(self, path)
+
+    def isfile(self, path):
+        with self.lock:
+            ino = self._resolve(path)
+            return bool(ino) and self._inode(ino)[0] == KIND_FILE
+
+    def isdir(self, path):
+        with self.lock:
+            ino = self._resolve(path)
+            return bool(ino) and self._inode(ino)[0] == KIND_DIR
+
+    def makedirs(self, path):
+        with self.lock:
+            ino = ROOT
+            for part in path.split("/") if path else ():
+                directory = self._directory(ino)
+                if directory is None:
+                    raise NotADirectoryError(f"Not a directory: '{path}'")
+                entry = directory.names.get(part)
+                if entry:
+                    ino = entry[0]
+                else:
+                    child = self._alloc_inode(KIND_DIR)
+                    self._link(ino, directory, part, child)
+                    ino = child
+            if self._directory(ino) is None:
+                raise FileExistsError(f"File exists: '{path}'")
+
+    def remove(self, path):
+        with self.lock:
+            dir_ino, directory, name = self._parent(path)
+            entry = directory.names.get(name)
+            if entry is None:
+                raise FileNotFoundError(f"No such file: '{path}'")
+            if self._inode(entry[0])[0] == KIND_DIR:
+                raise IsADirectoryError(f"Is a directory: '{path}'")
+            self._set_slot(dir_ino, entry[1], 0, "")
+            del directory.names[name]
+            directory.free.append(entry[1])
+            self._release(entry[0])
+
+    def scandir(self, path):
+        with self.lock:
+            ino = self._resolve(path)
+            directory = self._directory(ino) if ino else None
+            if directory is None:
+                raise FileNotFoundError(f"No such directory: '{path}'")
+            entries = []
+            for name, (child, _) in directory.names.items():
+                node = self._inode(child)
+                kind = "dir" if node[0] == KIND_DIR else "file"
+                entries.append(FileEntry(name, f"{path}/{name}" if path else name, kind,
+                                         node[_SIZE] if kind == "file" else 0, node[_MTIME] / 1e9))
+            return entries
+
+    def stat_key(self, path):
+        with self.lock:
+            ino = self._resolve(path)
+            if not ino:
+                raise FileNotFoundError(f"No such file: '{path}'")
+            node = self._inode(ino)
+            return (node[_MTIME], node[_SIZE], ino, node[_GEN])
+
+    def stats(self):
+        with self.lock:
+            return {
+                "backend": "vdisk",
+                "image": self.image,
+                "block_size": self.block_size,
+                "blocks": self.blocks,
+                "blocks_used": self.blocks - self.free_blocks,
+                "inodes": self.inodes,
+                "inodes_used": self.inodes - self.free_inodes,
+                "cache_blocks": len(self.cache.blocks),
+                "cache_capacity": self.cache.capacity,
+                "dirty_blocks": len(self.cache.dirty),
+                "cache_hits": self.cache.hits,
+                "cache_misses": self.cache.misses,
+                "cache_evictions": self.cache.evictions,
+                "blocks_written": self.cache.writebacks,
+            }
+
+    # Persistence
+
+    def flush(self):
+        # Write dirty blocks, bitmaps and the superblock back to the image
+        with self.lock:
+            if self._file.closed:
+                return
+            self.cache.flush()
+            for start, index in sorted(self._dirty_bitmaps):
+                bitmap = self.inode_bits if start == self.inode_bitmap_start else self.block_bits
+                self._file.seek((start + index) * self.block_size)
+                self._file.write(bitmap[index * self.block_size:(index + 1) * self.block_size])
+            self._dirty_bitmaps.clear()
+            self._file.seek(0)
+            self._file.write(_SUPER.pack(DISK_MAGIC, DISK_VERSION, self.block_size, self.blocks,
+                                         self.inodes, self.inode_bitmap_start, self.block_bitmap_start,
+                                         self.inode_table_start, self.data_start, self.free_blocks,
+                                         self.free_inodes))
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self._file.close()
+        atexit.unregister(self.flush)